@@ -0,0 +1,113 @@
+import numpy as np
+
+
+class BandedDTW:
+    def __init__(self, band=300, chunk_rows=4096):
+        """ Sakoe-Chiba banded DTW. band is the half width (in frames) of
+        the band around the (rescaled) diagonal, time and memory are
+        O(N * band). Local costs are computed chunk_rows rows at a time. """
+        self.band = band
+        self.chunk_rows = chunk_rows
+
+    def cost(self, X, Y):
+        """ Input : frames of features X [n, d], their band in Y [n, W, d]
+        Output : L1 distances [n, W] """
+        return np.abs(Y - X[:, None]).sum(-1)
+
+    def band_costs(self, X, Y, lo, W, start):
+        end = min(start + self.chunk_rows, X.shape[0])
+        columns = lo[start:end, None] + np.arange(W)
+        return self.cost(X[start:end], Y[columns])
+
+    def get_band(self, N, M):
+        """ Output : first column of the band of each row, band width """
+        W = min(2 * self.band + 1, M)
+        center = np.round(np.arange(N) * (M - 1) / max(N - 1, 1)).astype(int)
+        lo = np.clip(center - self.band, 0, M - W)
+        return lo, W
+
+    def align(self, X, Y):
+        """ Input : features X [N, d] (reference) and Y [M, d] (target)
+        Output : warping path (i, j) arrays from (0, 0) to (N-1, M-1) """
+
+        X = np.asarray(X, dtype=np.float64).reshape(X.shape[0], -1)
+        Y = np.asarray(Y, dtype=np.float64).reshape(Y.shape[0], -1)
+        N, M = X.shape[0], Y.shape[0]
+        lo, W = self.get_band(N, M)
+        if N > 1 and np.max(np.diff(lo)) >= W:
+            raise ValueError("band too narrow for lengths {} and {}".format(
+                N, M))
+
+        # 0 : diagonal, 1 : vertical (i-1, j), 2 : horizontal (i, j-1)
+        moves = np.empty((N, W), dtype=np.uint8)
+        inf = np.full(W + 1, np.inf)
+
+        costs = self.band_costs(X, Y, lo, W, 0)
+        cumulated = np.cumsum(costs, 1)
+        D = cumulated[0]
+        moves[0] = 2
+
+        for i in range(1, N):
+            if i % self.chunk_rows == 0:
+                costs = self.band_costs(X, Y, lo, W, i)
+                cumulated = np.cumsum(costs, 1)
+            c = costs[i % self.chunk_rows]
+            C = cumulated[i % self.chunk_rows]
+
+            # previous row in the current band coordinates, inf outside
+            shift = lo[i] - lo[i - 1]
+            prev = inf.copy()
+            prev[1:W + 1 - shift] = D[shift:]
+            if shift > 0:
+                prev[0] = D[shift - 1]
+            diagonal, vertical = prev[:W], prev[1:]
+
+            a = np.minimum(diagonal, vertical)
+
+            # D[j] = c[j] + min(a[j], D[j-1]) unrolled as a prefix minimum
+            D = C + np.minimum.accumulate(a - C + c)
+
+            move = (vertical < diagonal).astype(np.uint8)
+            horizontal = np.zeros(W, dtype=bool)
+            horizontal[1:] = D[:-1] < a[1:]
+            move[horizontal] = 2
+            moves[i] = move
+
+        return self.backtrack(moves, lo, M)
+
+    def backtrack(self, moves, lo, M):
+        N = moves.shape[0]
+        path_i = np.empty(N + M, dtype=np.int64)
+        path_j = np.empty(N + M, dtype=np.int64)
+
+        i, j, k = N - 1, M - 1, 0
+        while True:
+            path_i[k], path_j[k] = i, j
+            k += 1
+            if i == 0 and j == 0:
+                break
+            move = moves[i, j - lo[i]] if i > 0 else 2
+            if move == 0:
+                i, j = i - 1, j - 1
+            elif move == 1:
+                i -= 1
+            else:
+                j -= 1
+
+        return path_i[:k][::-1], path_j[:k][::-1]
+
+    def warp(self, path, x, M):
+        """ Input : path, reference signal x [N, ...], target length M
+        Output : x on the target timeline, each target frame taking its
+        first aligned reference frame """
+        path_i, path_j = path
+        first = np.searchsorted(path_j, np.arange(M))
+        return np.asarray(x)[path_i[first]]
+
+    def warp_frames(self, path, frames):
+        """ Input : path, reference frame indexes (onsets...)
+        Output : first target frame aligned with each of them """
+        path_i, path_j = path
+        frames = np.asarray(frames, dtype=np.int64)
+        k = np.minimum(np.searchsorted(path_i, frames), path_i.shape[0] - 1)
+        return path_j[k]
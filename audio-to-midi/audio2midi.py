@@ -39,9 +39,13 @@ class Audio2MidiConverter:
         dv = confidence_pad - conf_delay
         return dv[:-1]
 
-    def get_loudness_changes(self, loudness, threshold):
+    def get_loudness_dv(self, loudness):
+        """ Output : loudness variations, normalized by the largest one """
         dl = self.compute_dv(loudness)
-        dln = dl/np.max(np.abs(dl))
+        return dl/np.max(np.abs(dl))
+
+    def get_loudness_changes(self, loudness, threshold):
+        dln = self.get_loudness_dv(loudness)
         positiv = dln > threshold
         negativ = dln < -threshold
         return negativ, positiv
@@ -62,125 +66,193 @@ class Audio2MidiConverter:
 
 
 
-    def get_note_with_pitch_loudness(self, note, frequency, loudness):
-        note_w_pitch = {"on": None, "off": None, "pitch": None, "loudness": None}
-        note_w_pitch["on"] = note["on"]
-        note_w_pitch["off"] = note["off"]
-        note_w_pitch["pitch"] = int(li.core.hz_to_midi(np.mean(frequency[note["on"]: note["off"]])))
-        note_w_pitch["loudness"] = int(np.mean(loudness[note["on"]: note["off"]])) # TODO : Change for normalisation of loudness
-        return note_w_pitch
-
-    
+    def get_notes_pitch_loudness(self, on, off, frequency, loudness):
+        """ Input : note boundaries (int arrays), frame contours
+        Output : mean midi pitch and loudness of each note (int arrays) """
 
+        # segment sums over [on, off[ with a single reduceat
+        bounds = np.stack([on, off], -1).reshape(-1)
+        lengths = off - on
+        if bounds.shape[0] == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
 
-    def get_window(self, comp, index,  h_window_length):
-        a = index - h_window_length
-        b = index + h_window_length
-        if a<0: a = 0 
-        if b>=comp.shape[0]: b =comp.shape[0]-1
-        a, b = int(a), int(b)
-        return comp[a:b]
+        freq_sums = np.add.reduceat(frequency, bounds)[::2]
+        loud_sums = np.add.reduceat(loudness, bounds)[::2]
 
-        
+        pitch = li.core.hz_to_midi(freq_sums / lengths).astype(int)
+        loudness = (loud_sums / lengths).astype(int) # TODO : Change for normalisation of loudness
+        return pitch, loudness
 
     def local_AND(self, support, comp, h_window_length):
-        onsets = np.zeros(support.shape[0])
+        """ onsets[i] = support[i] and comp has at least one positive value
+        in [i - h_window_length, i + h_window_length[ """
 
+        n = support.shape[0]
+        h = int(h_window_length)
+        cumsum = np.concatenate(([0], np.cumsum(comp, dtype=float)))
 
-        for i in range(support.shape[0]):
-            if support[i]: # need to check comp
-                window = self.get_window(comp, i, h_window_length)
-                onsets[i] = np.sum(window) > 0 # There is at least one other offset detected in the window
-        return onsets
+        i = np.arange(n)
+        a = np.clip(i - h, 0, None)
+        b = np.clip(i + h, None, n - 1)
+        window_sum = cumsum[np.maximum(a, b)] - cumsum[a]
 
+        onsets = np.logical_and(support, window_sum > 0)
+        return onsets.astype(float)
 
     def join_notes(self, notes, time, min_duration = 0.1):
+        """ Input : notes (on, off, pitch, loudness) arrays
+        Each note is merged with the next one when they have the same pitch
+        and are really close (the last note is dropped) """
 
-        joined_notes = []
+        on, off, pitch, loudness = notes
+        if on.shape[0] < 2:
+            return on[:0], off[:0], pitch[:0], loudness[:0]
 
-        for i in range(len(notes)-1):
-            note, next_note = notes[i], notes[i+1]
-            if note["pitch"]==next_note["pitch"] and time[next_note["on"]]-time[note["off"]]<=min_duration: # notes of the same pitch and really close 
-                new_note = {"on": None, "off": None, "pitch": None, "loudness": None}
-                new_note["on"] = note["on"]
-                new_note["off"] = next_note["off"] # notes are joined
-                new_note["pitch"] = note["pitch"]
-                new_note["loudness"] = (note["loudness"] + next_note["loudness"])//2
-                joined_notes.append(new_note)
-            else:
-                joined_notes.append(note)
+        join = np.logical_and(pitch[:-1] == pitch[1:], time[on[1:]] - time[off[:-1]] <= min_duration)
 
-        return joined_notes
+        joined_off = np.where(join, off[1:], off[:-1]) # notes are joined
+        joined_loudness = np.where(join, (loudness[:-1] + loudness[1:]) // 2, loudness[:-1])
 
+        return on[:-1], joined_off, pitch[:-1], joined_loudness
 
+    def segment_notes(self, all_onsets, neg_changes):
+        """ Input : onsets and note off changes (frame arrays)
+        Output : on, off frame indexes of each note
+        A note starts on every onset and ends on the next onset or
+        note off change """
 
-    def process(self, sampling_rate = 48000, block_size = 480, threshold_confidence = 0.15, threshold_loudness = 0.20, min_note_length = 0.01,  verbose = False):
-        self.sampling_rate = sampling_rate
-        self.min_note_length = min_note_length
+        events = np.flatnonzero(np.logical_or(all_onsets, neg_changes))
+        is_onset = all_onsets[events] != 0
 
+        # a note is closed by any event following an onset
+        closing = is_onset[:-1]
+        return events[:-1][closing], events[1:][closing]
 
+    def get_onsets_from_times(self, time, onset_times):
+        """ Input : frame times, onset times (s)
+        Output : onset vector, 1 on frames whose segment [time[i], time[i+1][
+        contains an onset """
 
-        ext = Extractor()
-        time, frequency, confidence, loudness = ext.get_time_f0_confidence_loudness("", self.filename, sampling_rate, block_size, write=True)
-        loudness = self.dB2midi(loudness)
+        all_onsets = np.zeros_like(time)
+        i = np.searchsorted(time, onset_times, side="right") - 1
+        i = i[np.logical_and(i >= 0, i < time.shape[0] - 1)]
+        all_onsets[i] = 1
+        return all_onsets
 
-        neg_conf_changes, pos_conf_changes = self.get_confidence_changes(confidence, threshold_confidence)
-        midi_pitch_changes = self.get_midi_pitch_changes(frequency)
-        neg_loud_changes, pos_loud_changes = self.get_loudness_changes(loudness, threshold_loudness)
+    def get_notes(self, time, frequency, loudness, all_onsets, neg_changes, min_note_length, join_gap = 0.1):
+        """ Output : notes as (on, off, pitch, loudness) arrays """
+        on, off = self.segment_notes(all_onsets, neg_changes)
 
-        
+        # remove short notes
+        keep = off - on >= min_note_length
+        on, off = on[keep], off[keep]
+
+        # add pitch information
+        pitch, velocity = self.get_notes_pitch_loudness(on, off, frequency, loudness)
 
-        conf_onsets = np.logical_or(pos_conf_changes, neg_conf_changes)
-        loud_onsets = np.logical_or(pos_loud_changes, neg_loud_changes)
-        pitch_onsets = midi_pitch_changes
+        #join successive notes of same pitch (carefully)
+        return self.join_notes((on, off, pitch, velocity), time, join_gap)
 
+    def notes2sequence(self, time, notes):
+        # writing note in sequence
+        sequence =  music_pb2.NoteSequence()
 
+        for on, off, pitch, velocity in zip(*notes):
+            sequence.notes.add(pitch = int(pitch), start_time = time[on], end_time = time[off], velocity = int(velocity))
+
+        return sequence
+
+    def get_onsets(self, confidence, loudness, threshold_confidence, threshold_loudness):
+        """ Input : confidence, midi loudness
+        Output : onsets and note off changes detected from confidence and
+        loudness variations """
+
+        return self.get_onsets_from_dv(self.compute_dv(confidence), self.get_loudness_dv(loudness), threshold_confidence, threshold_loudness)
+
+    def get_h_window_length(self):
+        """ Output : half length of the windows of get_onsets local_AND """
+        t_h_window_length = 0.005 # in s
+        return np.ceil(t_h_window_length * self.sampling_rate) # in samples
+
+    def get_onsets_from_dv(self, confidence_dv, loudness_dv, threshold_confidence, threshold_loudness):
+        """ Input : confidence and normalized loudness variations (see
+        compute_dv and get_loudness_dv)
+        Output : onsets and note off changes, as get_onsets """
+
+        neg_conf_changes, pos_conf_changes = confidence_dv < -threshold_confidence, confidence_dv > threshold_confidence
+        neg_loud_changes, pos_loud_changes = loudness_dv < -threshold_loudness, loudness_dv > threshold_loudness
 
         # all_onsets = np.logical_or(pos_conf_changes, neg_conf_changes) # May be change to AND
         # all_onsets = np.logical_or(all_onsets, midi_pitch_changes) # May be change to OR 
         # all_onsets = np.logical_or(all_onsets, loud_onsets)   
 
-        t_h_window_length = 0.005 # in s
-        h_window_length = np.ceil(t_h_window_length * self.sampling_rate) # in samples
+        h_window_length = self.get_h_window_length()
 
         neg_changes = self.local_AND(neg_conf_changes, neg_loud_changes, h_window_length)
         pos_changes = self.local_AND(pos_conf_changes, pos_loud_changes, h_window_length)
 
         all_onsets = self.local_AND(pos_changes, neg_changes, h_window_length)
 
+        return all_onsets, neg_changes
 
+    def get_onsets_madmom(self, time, confidence, act, threshold_confidence, threshold_madmom):
+        """ Input : confidence, madmom onset activation function
+        Output : onsets picked from the activation and note off changes
+        detected from confidence variations """
 
-        # Notes creation
+        neg_changes, _ = self.get_confidence_changes(confidence, threshold_confidence)
+        all_onsets = self.pick_onsets_madmom(time, act, threshold_madmom)
 
+        return all_onsets, neg_changes
 
-        notes = []
-        current_note = {"on": None, "off": None}
-        t_length = all_onsets.shape[0]
+    def pick_onsets_madmom(self, time, act, threshold_madmom):
+        """ Output : onset vector picked from the madmom activation """
 
-        for t in range(t_length):
-            if all_onsets[t]:
-                if current_note["on"] is not None:
-                    current_note["off"] = t
-                    notes.append(current_note)
-                    current_note = {"on": None, "off": None}
-                current_note["on"] = t
+        proc = onsets.OnsetPeakPickingProcessor(threshold = threshold_madmom, fps=100)
+        onset_times = proc(act)
 
-            elif neg_changes[t]:
-                if current_note["on"] is not None:
-                    current_note["off"] = t
-                    notes.append(current_note)
-                    current_note = {"on": None, "off": None}
+        # create vector:
+        return self.get_onsets_from_times(time, onset_times)
 
+    def pick_peaks(self, act, threshold, h_window_length):
+        """ Input : onset function (one value per frame)
+        Output : onset vector, 1 on frames above threshold that are the
+        maximum of the window [i - h_window_length, i + h_window_length]
+        (the first one wins on plateaus) """
 
+        h = int(h_window_length)
+        padded = np.concatenate([np.full(h, -np.inf), act, np.full(h, -np.inf)])
+        windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * h + 1)
 
+        is_peak = np.logical_and(act >= threshold, act >= windows.max(1))
+        if h > 0:
+            is_peak = np.logical_and(is_peak, act > windows[:, :h].max(1))
 
+        return is_peak.astype(float)
 
+    def get_onsets_flux(self, confidence, flux, threshold_confidence, threshold_flux, fps):
+        """ Input : confidence, spectral flux onset function (frame aligned)
+        Output : onsets picked from the onset function and note off changes
+        detected from confidence variations """
 
+        neg_changes, _ = self.get_confidence_changes(confidence, threshold_confidence)
 
-        # remove short notes
+        t_h_window_length = 0.03 # in s, as madmom's combine
+        all_onsets = self.pick_peaks(flux, threshold_flux, np.ceil(t_h_window_length * fps))
 
+        return all_onsets, neg_changes
 
+    def process(self, sampling_rate = 48000, block_size = 480, threshold_confidence = 0.15, threshold_loudness = 0.20, min_note_length = 0.01, join_gap = 0.1, verbose = False):
+        self.sampling_rate = sampling_rate
+        self.min_note_length = min_note_length
+
+
+
+        ext = Extractor()
+        time, frequency, confidence, loudness = ext.get_time_f0_confidence_loudness("", self.filename, sampling_rate, block_size, write=True)
+        loudness = self.dB2midi(loudness)
 
+        all_onsets, neg_changes = self.get_onsets(confidence, loudness, threshold_confidence, threshold_loudness)
 
         if verbose:
             span = time.shape[0]//8
@@ -205,74 +277,31 @@ class Audio2MidiConverter:
             plt.legend()
             plt.show()
 
-        notes = [note for note in notes if note["off"] - note["on"] >= min_note_length]
-
-        # add pitch information
-        notes_with_pitch_loudness = [self.get_note_with_pitch_loudness(note, frequency, loudness) for note in notes]
-
-        #join successive notes of same pitch (carefully) 
-        notes = self.join_notes(notes_with_pitch_loudness, time)
+        notes = self.get_notes(time, frequency, loudness, all_onsets, neg_changes, min_note_length, join_gap)
+        return self.notes2sequence(time, notes)
 
 
-        # writing note in sequence
-        sequence =  music_pb2.NoteSequence()
 
-        for note in notes:
-            sequence.notes.add(pitch = note["pitch"], start_time = time[note["on"]], end_time = time[note["off"]], velocity = note["loudness"])                        
-            
-        return sequence
-
-        
-        
-    def process_madmom(self, sampling_rate = 48000, block_size = 480, threshold_confidence = 0.15, threshold_madmom = 0.20, min_note_length = 0.01,  verbose = False):
+    def process_madmom(self, sampling_rate = 48000, block_size = 480, threshold_confidence = 0.15, threshold_madmom = 0.20, min_note_length = 0.01, join_gap = 0.1, onset_function = "madmom", verbose = False):
+        """ onset_function : "madmom" (RNN onset activation) or "flux"
+        (spectral flux sharing the loudness STFT, cheaper) """
         self.sampling_rate = sampling_rate
         self.min_note_length = min_note_length
 
 
 
         ext = Extractor()
-        time, frequency, confidence, loudness = ext.get_time_f0_confidence_loudness(self.filename, sampling_rate, block_size, write=True)
-        neg_changes, _ = self.get_confidence_changes(confidence, threshold_confidence)
-        loudness = self.dB2midi(loudness)
-
-
-        proc = onsets.OnsetPeakPickingProcessor(threshold = threshold_madmom, fps=100)
-        act = onsets.RNNOnsetProcessor()(self.filename)
-
-        onset_times = proc(act)
-        # create vector:
-        all_onsets = np.zeros_like(time)
-        i_onset = 0 
-        for i in range(time.shape[0]-1):
-            onset = onset_times[i_onset]
-            if time[i]<= onset and onset<time[i+1]: # onset in segment
-                all_onsets[i] = 1 # add onset
-                if i_onset+1 < len(onset_times):
-                    i_onset += 1 # we need to set next onset (if there is one)
-            
-    
-        # Notes creation
-
-
-        notes = []
-        current_note = {"on": None, "off": None}
-        t_length = all_onsets.shape[0]
-
-        for t in range(t_length):
-            if all_onsets[t]:
-                if current_note["on"] is not None:
-                    current_note["off"] = t
-                    notes.append(current_note)
-                    current_note = {"on": None, "off": None}
-                current_note["on"] = t
-
-            elif neg_changes[t]:
-                if current_note["on"] is not None:
-                    current_note["off"] = t
-                    notes.append(current_note)
-                    current_note = {"on": None, "off": None}
+        if onset_function == "flux":
+            time, frequency, confidence, loudness, flux = ext.get_time_f0_confidence_loudness_onsets("", self.filename, sampling_rate, block_size)
+            loudness = self.dB2midi(loudness)
 
+            all_onsets, neg_changes = self.get_onsets_flux(confidence, flux, threshold_confidence, threshold_madmom, sampling_rate / block_size)
+        else:
+            time, frequency, confidence, loudness = ext.get_time_f0_confidence_loudness("", self.filename, sampling_rate, block_size, write=True)
+            loudness = self.dB2midi(loudness)
 
+            act = onsets.RNNOnsetProcessor()(self.filename)
+            all_onsets, neg_changes = self.get_onsets_madmom(time, confidence, act, threshold_confidence, threshold_madmom)
 
         if verbose:
             span = time.shape[0]//8
@@ -317,30 +346,11 @@ class Audio2MidiConverter:
 
 
 
-        # remove short notes
+        notes = self.get_notes(time, frequency, loudness, all_onsets, neg_changes, min_note_length, join_gap)
+        return self.notes2sequence(time, notes)
 
-        notes = [note for note in notes if note["off"] - note["on"] >= min_note_length]
 
-        # add pitch information
-        notes_with_pitch_loudness = [self.get_note_with_pitch_loudness(note, frequency, loudness) for note in notes]
-        notes = self.join_notes(notes_with_pitch_loudness, time)
 
-        # writing note in sequence
-        sequence =  music_pb2.NoteSequence()
-        
-        for note in notes:
-            sequence.notes.add(pitch = note["pitch"], start_time = time[note["on"]], end_time = time[note["off"]], velocity = note["loudness"])                        
-            
-        return sequence 
-
-
-
-
-
-
-
-
-    
 
 
 
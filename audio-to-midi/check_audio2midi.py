@@ -0,0 +1,125 @@
+import numpy as np
+import librosa as li
+
+from audio2midi import Audio2MidiConverter
+
+# Reference (frame by frame) implementations the vectorized
+# Audio2MidiConverter methods are checked against.
+
+
+def local_AND(support, comp, h_window_length):
+    onsets = np.zeros(support.shape[0])
+    for i in range(support.shape[0]):
+        if support[i]:
+            a = max(i - h_window_length, 0)
+            b = min(i + h_window_length, comp.shape[0] - 1)
+            onsets[i] = np.sum(comp[int(a):int(b)]) > 0
+    return onsets
+
+
+def segment_notes(all_onsets, neg_changes):
+    notes = []
+    current_note = {"on": None, "off": None}
+    for t in range(all_onsets.shape[0]):
+        if all_onsets[t]:
+            if current_note["on"] is not None:
+                current_note["off"] = t
+                notes.append(current_note)
+                current_note = {"on": None, "off": None}
+            current_note["on"] = t
+
+        elif neg_changes[t]:
+            if current_note["on"] is not None:
+                current_note["off"] = t
+                notes.append(current_note)
+                current_note = {"on": None, "off": None}
+    return notes
+
+
+def notes_pitch_loudness(notes, frequency, loudness):
+    return [{
+        "on": note["on"],
+        "off": note["off"],
+        "pitch": int(li.core.hz_to_midi(np.mean(frequency[note["on"]:note["off"]]))),
+        "loudness": int(np.mean(loudness[note["on"]:note["off"]]))
+    } for note in notes]
+
+
+def join_notes(notes, time, min_duration=0.1):
+    joined_notes = []
+    for i in range(len(notes) - 1):
+        note, next_note = notes[i], notes[i + 1]
+        if note["pitch"] == next_note["pitch"] and time[next_note["on"]] - time[note["off"]] <= min_duration:
+            joined_notes.append({
+                "on": note["on"],
+                "off": next_note["off"],
+                "pitch": note["pitch"],
+                "loudness": (note["loudness"] + next_note["loudness"]) // 2
+            })
+        else:
+            joined_notes.append(note)
+    return joined_notes
+
+
+def onsets_from_times(time, onset_times):
+    all_onsets = np.zeros_like(time)
+    i_onset = 0
+    for i in range(time.shape[0] - 1):
+        onset = onset_times[i_onset]
+        if time[i] <= onset and onset < time[i + 1]:
+            all_onsets[i] = 1
+            if i_onset + 1 < len(onset_times):
+                i_onset += 1
+    return all_onsets
+
+
+def pick_peaks(act, threshold, h_window_length):
+    onsets = np.zeros(act.shape[0])
+    for i in range(act.shape[0]):
+        left = act[max(i - h_window_length, 0):i]
+        right = act[i + 1:i + h_window_length + 1]
+        if act[i] >= threshold and np.all(act[i] > left) and np.all(
+                act[i] >= right):
+            onsets[i] = 1
+    return onsets
+
+
+if __name__ == "__main__":
+
+    a2m = Audio2MidiConverter("")
+    rng = np.random.default_rng(0)
+
+    for trial in range(100):
+        n = rng.integers(10, 3000)
+        h = rng.integers(1, 20)
+        time = np.arange(n) / 100
+        frequency = 440 * 2**(rng.integers(-12, 12, n) / 12)
+        loudness = rng.uniform(0, 127, n)
+
+        support = rng.random(n) < .1
+        comp = rng.random(n) < .05
+        assert np.array_equal(local_AND(support, comp, h),
+                              a2m.local_AND(support, comp, h))
+
+        all_onsets = (rng.random(n) < .05).astype(float)
+        neg_changes = rng.random(n) < .05
+
+        ref = segment_notes(all_onsets, neg_changes)
+        on, off = a2m.segment_notes(all_onsets, neg_changes)
+        assert [(note["on"], note["off"]) for note in ref] == list(zip(on, off))
+
+        ref = join_notes(notes_pitch_loudness(ref, frequency, loudness), time)
+        pitch, velocity = a2m.get_notes_pitch_loudness(on, off, frequency, loudness)
+        notes = a2m.join_notes((on, off, pitch, velocity), time)
+        assert [tuple(note.values()) for note in ref] == list(zip(*notes))
+
+        # well separated onsets (the reference loop skips onsets sharing a frame)
+        onset_times = np.sort(rng.choice(n - 1, 1 + n // 20, replace=False)) / 100 + .005
+        assert np.array_equal(onsets_from_times(time, onset_times),
+                              a2m.get_onsets_from_times(time, onset_times))
+
+        act = np.round(rng.random(n), 1)
+        assert np.array_equal(pick_peaks(act, .3, h),
+                              a2m.pick_peaks(act, .3, h))
+
+    print("Vectorized Audio2MidiConverter matches the reference implementation")
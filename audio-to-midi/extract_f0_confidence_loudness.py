@@ -50,16 +50,20 @@ class Extractor:
                     "loudness": str(loudness[t])
                 })
 
-    def extract_loudness(self, signal, sampling_rate, block_size, n_fft=2048):
-        S = li.stft(
-            signal,
-            n_fft=n_fft,
-            hop_length=block_size,
-            win_length=n_fft,
-            center=True,
-        )
-        S = np.log(abs(S) + 1e-7)
-        f = li.fft_frequencies(sampling_rate, n_fft)
+    def extract_stft(self, signal, block_size, n_fft=2048):
+        return abs(
+            li.stft(
+                signal,
+                n_fft=n_fft,
+                hop_length=block_size,
+                win_length=n_fft,
+                center=True,
+            ))
+
+    def loudness_from_stft(self, S, sampling_rate, n_fft=2048):
+        """ A-weighted loudness from a magnitude STFT """
+        S = np.log(S + 1e-7)
+        f = li.fft_frequencies(sr=sampling_rate, n_fft=n_fft)
         a_weight = li.A_weighting(f)
 
         S = S + a_weight.reshape(-1, 1)
@@ -68,6 +72,29 @@ class Extractor:
 
         return S
 
+    def onsets_from_stft(self, S, compression=10):
+        """ Spectral flux onset function from a magnitude STFT, frame aligned
+        with the loudness and normalized to [0, 1] """
+        S = np.log1p(compression * S)
+        flux = np.maximum(np.diff(S, axis=1), 0).sum(0)
+        flux = np.concatenate([[0], flux])[..., :-1]
+
+        return flux / max(np.max(flux), 1e-7)
+
+    def extract_loudness(self, signal, sampling_rate, block_size, n_fft=2048):
+        S = self.extract_stft(signal, block_size, n_fft)
+        return self.loudness_from_stft(S, sampling_rate, n_fft)
+
+    def extract_loudness_onsets(self,
+                                signal,
+                                sampling_rate,
+                                block_size,
+                                n_fft=2048):
+        """ Loudness and spectral flux onset function sharing one STFT """
+        S = self.extract_stft(signal, block_size, n_fft)
+        return self.loudness_from_stft(S, sampling_rate,
+                                       n_fft), self.onsets_from_stft(S)
+
     def extract_time_pitch_confidence(self, signal, sampling_rate, block_size):
         f0 = crepe.predict(
             signal,
@@ -128,3 +155,33 @@ class Extractor:
                 self.write_file(file_path, time, f0, confidence, loudness)
 
             return time, f0, confidence, loudness
+
+    def get_time_f0_confidence_loudness_onsets(self, dataset_path, filename,
+                                               sampling_rate, block_size):
+        """ Same as get_time_f0_confidence_loudness, with the spectral flux
+        onset function. The audio is decoded once and its STFT is shared by
+        loudness and onsets, f0 and confidence are read from the csv file
+        when it exists. """
+
+        audio, fs = li.load(dataset_path + filename, sr=sampling_rate)
+        loudness, onsets = self.extract_loudness_onsets(audio, sampling_rate,
+                                                        block_size)
+
+        name = filename[:-4]  # remove .wav
+        file_path = self.path + name + "_{}_{}.csv".format(
+            sampling_rate, block_size)
+
+        if path.exists(file_path):
+            time, f0, confidence, _ = self.read_file(file_path)
+        else:
+            time, f0, confidence = self.extract_time_pitch_confidence(
+                audio, sampling_rate, block_size)
+
+        size = min(time.shape[0], loudness.shape[0])
+        time, f0, confidence = time[:size], f0[:size], confidence[:size]
+        loudness, onsets = loudness[:size], onsets[:size]
+
+        if not path.exists(file_path):
+            self.write_file(file_path, time, f0, confidence, loudness)
+
+        return time, f0, confidence, loudness, onsets
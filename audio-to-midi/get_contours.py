@@ -3,8 +3,11 @@ from extract_f0_confidence_loudness import Extractor
 import glob
 import sys
 from midiConverter import Converter
+from alignment import BandedDTW
+
+sys.path.insert(0, "dataset")
+from contours_store import ContoursStore
 
-import csv
 from tqdm import tqdm
 import os
 import numpy as np
@@ -25,39 +28,42 @@ class ContoursGetter:
     def __init__(self):
         pass
 
-    def get_window(self, signal, index, width):
-        a, b = index - width // 2, index + width // 2
-        if a < 0: a = 0
-        if b > signal.shape[0]: n = signal.shape[0] - 1
-        return signal[a:b]
+    def moving_average(self, signal, width):
+        """ Mean of signal[i - width // 2:i + width // 2] (clipped to the
+        signal) for every frame i, from one cumulative sum """
+        n = signal.shape[0]
+        c = np.concatenate([[0], np.cumsum(signal)])
+        i = np.arange(n)
+        a = np.maximum(i - width // 2, 0)
+        b = np.minimum(i + width // 2, n)
+        return (c[b] - c[a]) / (b - a)
 
     def onset_offset(self, dm, max_silence):
-        l = []
-        silence = {"on": 0, "off": None}
-        for i in range(len(dm) - 1):
-
-            if dm[i] == True and dm[i + 1] == False:
-                silence["on"] = i
-
-            if dm[i] == False and dm[i + 1] == True:
-                silence["off"] = i
-                if silence["off"] - silence["on"] > max_silence:
-                    l.append(silence)
-                silence = {"on": None, "off": None}
-        return l
+        """ Input : boolean not quiet frames
+        Output : (on, off) arrays of the silences longer than max_silence,
+        on being the last loud frame and off the last quiet one """
+        dm = np.asarray(dm, dtype=bool)
+        ons = np.flatnonzero(dm[:-1] & ~dm[1:])
+        offs = np.flatnonzero(~dm[:-1] & dm[1:])
+
+        # each silence ends on the first off following its on, a track
+        # starting quiet has a first silence starting at 0
+        if len(dm) and not dm[0]:
+            ons = np.concatenate([[0], ons])
+        ons = ons[:len(offs)]
+
+        keep = offs - ons > max_silence
+        return ons[keep], offs[keep]
 
     def get_not_silence(self, indexes, times):
-        l = []
-        loud = [0, None]
-        for idx in indexes:
-            loud[1] = idx["on"]
-            l.append(loud)
-            loud = [idx["off"], None]
-        loud[1] = len(times)
-        l.append(loud)
-        if l[0] == [0, 0]:
-            l = l[1:]
-        return l
+        """ Input : (on, off) silences
+        Output : (start, end) arrays of the parts between them """
+        ons, offs = indexes
+        starts = np.concatenate([[0], offs])
+        ends = np.concatenate([ons, [len(times)]])
+        if starts[0] == 0 and ends[0] == 0:
+            starts, ends = starts[1:], ends[1:]
+        return starts, ends
 
     def get_notes_loudness(self, loudness, onsets):
         notes_loudness = np.zeros_like(loudness)
@@ -114,6 +120,36 @@ class ContoursGetter:
                 events[elt[1]] = -1  # offset
         return events
 
+    def align(self, pitch_midi, velocity_midi, midi_onsets, frequency_wav,
+              loudness_wav, band=300, threshold=-5.5, width=160):
+        """ Banded DTW between the midi (pitch, note on) and the performance
+        (crepe pitch, loudness above threshold) frames.
+        Output : midi pitch and note (on, off) frames on the performance
+        timeline """
+
+        voiced_midi = velocity_midi > 0
+        voiced_wav = self.moving_average(loudness_wav, width) > threshold
+
+        # pitch in octaves, 0 when silent
+        X = np.stack([pitch_midi * voiced_midi / 12, voiced_midi], -1)
+        Y = np.stack([
+            li.core.hz_to_midi(np.maximum(frequency_wav, 1e-3)) * voiced_wav /
+            12, voiced_wav
+        ], -1)
+
+        dtw = BandedDTW(band)
+        path = dtw.align(X, Y)
+
+        pitch_midi = dtw.warp(path, pitch_midi, Y.shape[0])
+
+        # frames after the end of the track stay after its end
+        onsets = np.array(midi_onsets, dtype=np.int64).reshape(-1, 2)
+        warped = dtw.warp_frames(path, np.minimum(onsets, X.shape[0] - 1))
+        warped = np.where(onsets < X.shape[0], warped, Y.shape[0])
+        midi_onsets = [(int(on), int(off)) for on, off in warped]
+
+        return pitch_midi, midi_onsets
+
     def get_contours(self,
                      dataset_path,
                      midi_file,
@@ -121,6 +157,8 @@ class ContoursGetter:
                      sampling_rate=16000,
                      block_size=160,
                      max_silence_duration=3,
+                     align=False,
+                     band=300,
                      verbose=False):
 
         # From text file
@@ -133,23 +171,27 @@ class ContoursGetter:
         c = Converter()
 
         midi_data = pm.PrettyMIDI(dataset_path + midi_file)
-        time_gen, pitch_midi, _ = c.midi2time_f0_loudness(
+        time_gen, pitch_midi, velocity_midi = c.midi2time_f0_loudness(
             midi_data, times_needed=time_wav)
-        frequency_midi = li.core.midi_to_hz(pitch_midi)
 
         midi_onsets = self.get_onsets(dataset_path + midi_file,
                                       sampling_rate // block_size)
 
+        if align:  # warp the midi onto the performance timeline
+            pitch_midi, midi_onsets = self.align(pitch_midi, velocity_midi,
+                                                 midi_onsets, frequency_wav,
+                                                 loudness_wav, band,
+                                                 width=sampling_rate // 100)
+
+        frequency_midi = li.core.midi_to_hz(pitch_midi)
+
         events = self.get_events(midi_onsets, frequency_wav.shape)
         loudness_midi = self.get_notes_loudness(loudness_wav, midi_onsets)
 
         frequency_wav_means = self.get_freq_mean(frequency_wav, midi_onsets)
 
         threshold = -5.5
-        m = np.array([
-            np.mean(self.get_window(loudness_wav, i, sampling_rate // 100))
-            for i in range(loudness_wav.shape[0])
-        ])
+        m = self.moving_average(loudness_wav, sampling_rate // 100)
         tm = (m > threshold)
 
         max_silence_length = max_silence_duration * (sampling_rate //
@@ -157,61 +199,28 @@ class ContoursGetter:
 
         indexes = self.onset_offset(
             tm, max_silence_length)  # Onsets = beginning of non quiet part
-        #print(indexes)
-        onsets = np.zeros_like(loudness_wav)
-        for idx in indexes:
-            onsets[idx["on"]] = 1.0
-            onsets[idx["off"]] = -1.0
-
-        parts_index = self.get_not_silence(indexes, time_wav)
-
-        diff_f0 = np.abs(frequency_midi - frequency_wav)
-        diff_loudness = np.abs(loudness_wav - loudness_midi)
-
-        # # compute difference and score:
-
-        #score = np.mean(diff_f0) + np.mean(diff_loudness)
-
-        frequency_midi_array = np.empty(0)
-        loudness_midi_array = np.empty(0)
-        frequency_wav_array = np.empty(0)
-        loudness_wav_array = np.empty(0)
-        frequency_wav_means_array = np.empty(0)
 
-        f0_confidence_array = np.empty(0)
-        events_array = np.empty(0)
+        starts, ends = self.get_not_silence(indexes, time_wav)
 
         silence_duration = 0.5  # duration of silence we keep at each cut.
         silence_length = silence_duration * (sampling_rate // block_size)
 
-        n = len(parts_index)
-        for elt in parts_index:
-            start, end = elt
+        # need to check if begining or end
+        starts = np.where(starts - silence_length < 0, 0, starts)
+        ends = np.where(ends + silence_length > len(time_wav) - 1,
+                        len(time_wav) - 1, ends)
+        lengths = np.maximum(ends - starts, 0)
 
-            # need to check if begining or end
+        # frame indexes of all the parts, gathered at once
+        offsets = np.cumsum(lengths) - lengths
+        idx = np.arange(np.sum(lengths)) + np.repeat(starts - offsets, lengths)
 
-            if start - silence_length < 0:
-                start = 0
-            if end + silence_length > len(time_wav) - 1:
-                end = len(time_wav) - 1
+        contours = np.stack([
+            frequency_midi, loudness_midi, frequency_wav, loudness_wav,
+            frequency_wav_means, f0_confidence, events
+        ])[:, idx]
 
-            frequency_midi_array = np.concatenate(
-                (frequency_midi_array, frequency_midi[start:end]))
-            loudness_midi_array = np.concatenate(
-                (loudness_midi_array, loudness_midi[start:end]))
-
-            frequency_wav_array = np.concatenate(
-                (frequency_wav_array, frequency_wav[start:end]))
-            loudness_wav_array = np.concatenate(
-                (loudness_wav_array, loudness_wav[start:end]))
-
-            frequency_wav_means_array = np.concatenate(
-                (frequency_wav_means_array, frequency_wav_means[start:end]))
-
-            f0_confidence_array = np.concatenate(
-                (f0_confidence_array, f0_confidence[start:end]))
-
-            events_array = np.concatenate((events_array, events[start:end]))
+        frequency_midi_array, loudness_midi_array, frequency_wav_array, loudness_wav_array, frequency_wav_means_array, f0_confidence_array, events_array = contours
 
         if verbose:
 
@@ -235,7 +244,7 @@ class ContoursGetter:
             # plt.title("Frequency comparison {}".format(wav_file))
             # plt.show()
 
-        return frequency_midi_array, loudness_midi_array, frequency_wav_array, loudness_wav_array, frequency_wav_means, f0_confidence_array, events_array
+        return frequency_midi_array, loudness_midi_array, frequency_wav_array, loudness_wav_array, frequency_wav_means_array, f0_confidence_array, events_array
 
 
 if __name__ == '__main__':
@@ -245,23 +254,15 @@ if __name__ == '__main__':
         for file in glob.glob(dataset_path + "*.mid")
     ]
     print(filenames)
-    duration = 0
 
-    u_f0 = np.empty(0)
-    u_loudness = np.empty(0)
-    e_f0 = np.empty(0)
-    e_loudness = np.empty(0)
-    e_f0_mean = np.empty(0)
-    e_f0_stddev = np.empty(0)
-    f0_conf = np.empty(0)
-    events = np.empty(0)
+    store = ContoursStore("dataset/contours-violin-update", mode="w")
 
     with tqdm(total=len(filenames)) as pbar:
         for filename in filenames:
             midi_file = filename + ".mid"
             wav_file = filename + ".wav"
             g = ContoursGetter()
-            u_f0_track, u_loudness_track, e_f0_track, e_loudness_track, e_f0_mean_track, f0_conf_track, events_track = g.get_contours(
+            u_f0, u_loudness, e_f0, e_loudness, e_f0_mean, f0_conf, events = g.get_contours(
                 dataset_path,
                 midi_file,
                 wav_file,
@@ -270,35 +271,20 @@ if __name__ == '__main__':
                 max_silence_duration=3,
                 verbose=True)
 
-            u_f0 = np.concatenate((u_f0, u_f0_track))
-            u_loudness = np.concatenate((u_loudness, u_loudness_track))
-            e_f0 = np.concatenate((e_f0, e_f0_track))
-            e_loudness = np.concatenate((e_loudness, e_loudness_track))
-            e_f0_mean = np.concatenate((e_f0_mean, e_f0_mean_track))
-            f0_conf = np.concatenate(((f0_conf, f0_conf_track)))
-            events = np.concatenate((events, events_track))
+            e_f0_stddev = (1200 * np.log2(e_f0 / u_f0)).clip(-50, 50)
+
+            # each track is written as soon as it is computed
+            store.append(filename,
+                         u_f0=u_f0,
+                         u_loudness=u_loudness,
+                         e_f0=e_f0,
+                         e_loudness=e_loudness,
+                         e_f0_mean=e_f0_mean,
+                         e_f0_stddev=e_f0_stddev,
+                         f0_conf=f0_conf,
+                         events=events)
 
             pbar.update(1)
-        e_f0_stddev = (1200 * np.log2(e_f0 / u_f0)).clip(-50, 50)
-
-        print("Writing : \n")
-
-        with open("dataset/contours-violin-update.csv", 'w') as csvfile:
-            fieldnames = [
-                "u_f0", "u_loudness", "e_f0", "e_loudness", "e_f0_mean",
-                "e_f0_stddev", "f0_conf", "events"
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for t in range(u_f0.shape[0]):
-                writer.writerow({
-                    "u_f0": str(u_f0[t]),
-                    "u_loudness": str(u_loudness[t]),
-                    "e_f0": str(e_f0[t]),
-                    "e_loudness": str(e_loudness[t]),
-                    "e_f0_mean": str(e_f0_mean[t]),
-                    "e_f0_stddev": str(e_f0_stddev[t]),
-                    "f0_conf": str(f0_conf[t]),
-                    "events": str(events[t])
-                })
+
+    print("Writing : \n")
+    store.to_csv("dataset/contours-violin-update.csv")
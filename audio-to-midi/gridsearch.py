@@ -1,169 +1,300 @@
 from audio2midi import Audio2MidiConverter
 from extract_f0_confidence_loudness import Extractor
-import sys
-sys.path.insert(0,'..')
-from midiConverter import Converter
 
+from multiprocessing import Pool
 from tqdm import tqdm
-import os
 import numpy as np
-import sounddevice as sd
-import soundfile as sf
 import matplotlib.pyplot as plt
 import librosa as li
 import seaborn as sns
 
-import pandas as pd
-import pretty_midi as pm
-import note_seq
-from note_seq.protobuf import music_pb2
-import matplotlib.pyplot as plt
+from madmom.features import onsets
+import json
 
+# features shared by the worker processes, set once by init_worker
+features = {}
 
 
+def init_worker(shared_features):
+    features.update(shared_features)
 
 
-class GridSearch:
-    def __init__(self, filename, sampling_rate = 48000, block_size = 480):
-        self.filename = filename
-        self.sampling_rate = sampling_rate
-        self.block_size = block_size
-        self.save_path = None
+def rasterize(notes, n_frames):
+    """ Input : notes as (on, off, pitch, loudness) arrays
+    Output : midi pitch of each frame (0 when silent) """
+    on, off, pitch, _ = notes
+    raster = np.zeros(n_frames)
+    for a, b, p in zip(on, off, pitch):
+        raster[a:b] = p
+    return raster
 
 
-    def set_save_path(self, path):
-        self.save_path 
+def evaluate(params):
+    """ Input : (threshold1, threshold2, min_note_length, join_gap, windows)
+    windows being a list of (start, end) frame excerpts, None for the
+    whole file
+    Output : mean absolute midi pitch error over the excerpts. Onsets and
+    note off changes of an excerpt are the ones of the whole file """
 
+    threshold1, threshold2, min_note_length, join_gap, windows = params
+    a2m = features["a2m"]
+    n = features["time"].shape[0]
 
-    def get_result(self, thresholds1, thresholds2, madmom = True, verbose = False, keep_best_file = False):
+    if windows is None:
+        windows = [(0, n)]
+
+    # context of the local_AND windows of the loudness onsets
+    margin = 2 * int(features["h_window_length"]) + 1
+
+    error, n_frames = 0, 0
+    for a, b in windows:
+        time = features["time"][a:b]
+        frequency = features["frequency"][a:b]
+        loudness = features["loudness"][a:b]
+
+        if features["madmom"]:
+            all_onsets = features["madmom_onsets"][threshold2][a:b]
+            neg_changes = features["confidence_dv"][a:b] < -threshold1
+        else:
+            a0, b0 = max(a - margin, 0), min(b + margin, n)
+            all_onsets, neg_changes = a2m.get_onsets_from_dv(
+                features["confidence_dv"][a0:b0],
+                features["loudness_dv"][a0:b0], threshold1, threshold2)
+            all_onsets = all_onsets[a - a0:b - a0]
+            neg_changes = neg_changes[a - a0:b - a0]
+
+        notes = a2m.get_notes(time, frequency, loudness, all_onsets,
+                              neg_changes, min_note_length, join_gap)
+
+        error += np.sum(
+            np.abs(features["frequency_midi"][a:b] -
+                   rasterize(notes, time.shape[0])))
+        n_frames += time.shape[0]
+
+    return error / n_frames
 
-        # get original f0 and loudness contours
-        ext = Extractor()
-        time_or, frequency_or, _, loudness_or = ext.get_time_f0_confidence_loudness("",filename, sampling_rate, block_size, write=True)
-        if verbose:
-            print("Track Duration : ", time_or[-1])
-            print("Vectors length : ", time_or.shape[0])
 
+def evaluate_cell(thresholds):
+    threshold1, threshold2 = thresholds
+    return evaluate((threshold1, threshold2, features["min_note_length"],
+                     0.1, None))
 
-        confidence_length = thresholds1.shape[0]
-        loudness_length = thresholds2.shape[0]
 
+class GridSearch:
+    def __init__(self, filename, sampling_rate = 48000, block_size = 480):
+        self.filename = filename
+        self.sampling_rate = sampling_rate
+        self.block_size = block_size
+        self.features = None
+
+    def get_features(self, madmom = True):
+        """ Extracts f0, loudness, the confidence and loudness variations
+        (or the madmom onset activation) once for the whole grid, on the
+        whole file """
 
-        results = np.zeros((confidence_length, loudness_length))
-        
-        with tqdm(total=confidence_length*loudness_length) as pbar:
+        a2m = Audio2MidiConverter(self.filename)
+        a2m.sampling_rate = self.sampling_rate
 
-            for i in range(confidence_length):
-                for j in range(loudness_length):
+        ext = Extractor()
+        time, frequency, confidence, loudness = ext.get_time_f0_confidence_loudness("", self.filename, self.sampling_rate, self.block_size, write=True)
+
+        features = {
+            "a2m": a2m,
+            "madmom": madmom,
+            "time": time,
+            "frequency": frequency,
+            "frequency_midi": li.core.hz_to_midi(frequency),
+            "loudness": a2m.dB2midi(loudness),
+            "confidence_dv": a2m.compute_dv(confidence),
+            "h_window_length": a2m.get_h_window_length(),
+        }
+
+        if madmom:
+            features["act"] = onsets.RNNOnsetProcessor()(self.filename)
+        else:
+            features["loudness_dv"] = a2m.get_loudness_dv(features["loudness"])
+
+        return features
+
+    def get_madmom_onsets(self, thresholds):
+        """ Output : dict threshold -> onsets picked from the activation of
+        the whole file """
+        a2m = self.features["a2m"]
+        return {th: a2m.pick_onsets_madmom(self.features["time"], self.features["act"], th) for th in thresholds}
+
+    def get_result(self, thresholds1, thresholds2, madmom = True, min_note_length = 0.01, n_workers = None, verbose = False):
+        """ Input : confidence thresholds, loudness (or madmom) thresholds
+        Output : matrix of the mean midi pitch error of each combination """
+
+        if self.features is None or self.features["madmom"] != madmom:
+            self.features = self.get_features(madmom)
+
+        features = dict(self.features, min_note_length = min_note_length)
+        if madmom:
+            features["madmom_onsets"] = self.get_madmom_onsets(thresholds2)
+        if verbose:
+            print("Track Duration : ", features["time"][-1])
+            print("Vectors length : ", features["time"].shape[0])
 
-                    a2m = Audio2MidiConverter(self.filename)    
-                    if madmom:
-                        threshold_confidence, threshold_madmom = thresholds1[i], thresholds2[j]
-                        seq_midi = a2m.process_madmom(sampling_rate = self.sampling_rate, block_size = self.block_size, threshold_confidence = threshold_confidence, threshold_madmom = threshold_madmom, verbose = False)
-                        save_file = save_path + filename[:-4] + "(from-audio)-thC{}-thM{}.mid".format(threshold_confidence, threshold_madmom)
-                    else:
-                        threshold_confidence, threshold_loudness = thresholds1[i], thresholds2[j]
-                        seq_midi = a2m.process(sampling_rate = self.sampling_rate, block_size = self.block_size, threshold_confidence = threshold_confidence, threshold_loudness = threshold_loudness, verbose = False)
-                        save_file = save_path + filename[:-4] + "(from-audio)-thC{}-thL{}.mid".format(threshold_confidence, threshold_loudness)
-                        
-                    note_seq.sequence_proto_to_midi_file(seq_midi, save_file)
+        grid = [(th1, th2) for th1 in thresholds1 for th2 in thresholds2]
 
+        with Pool(n_workers, initializer=init_worker, initargs=(features,)) as pool:
+            scores = list(tqdm(pool.imap(evaluate_cell, grid), total=len(grid)))
 
-                    if verbose:
-                        print("Start converting : ", save_file)
+        results = np.array(scores).reshape(len(thresholds1), len(thresholds2))
+        self.results = results
 
-                    c = Converter()
-                    midi_data = pm.PrettyMIDI(save_file)
+        return results
 
-                    if verbose:
-                        print("->   File loaded.")
+    def best(self, thresholds1, thresholds2):
+        i, j = np.unravel_index(np.argmin(self.results), self.results.shape)
+        return thresholds1[i], thresholds2[j]
+
+    def successive_halving(self,
+                           thresholds1,
+                           thresholds2,
+                           min_note_lengths=(0.01, ),
+                           join_gaps=(0.1, ),
+                           madmom=True,
+                           excerpt_length=500,
+                           n_excerpts=2,
+                           eta=3,
+                           n_workers=None,
+                           seed=0,
+                           verbose=False):
+        """ Adaptive search over thresholds, minimum note length and join gap.
+        Every candidate is first scored on n_excerpts random excerpts of
+        excerpt_length frames, the best 1/eta are promoted to eta times more
+        excerpts and so on until the survivors are scored on the whole file.
+        Output : best parameters (as process / process_madmom arguments),
+        their score on the whole file and the number of evaluated frames """
+
+        if self.features is None or self.features["madmom"] != madmom:
+            self.features = self.get_features(madmom)
+
+        features = dict(self.features)
+        if madmom:
+            features["madmom_onsets"] = self.get_madmom_onsets(thresholds2)
+
+        n_frames = self.features["time"].shape[0]
+        rng = np.random.default_rng(seed)
+        # excerpts of the k-th rung are the first n_excerpts * eta**k blocks
+        blocks = rng.permutation(n_frames // excerpt_length) * excerpt_length
+
+        candidates = [(th1, th2, min_length, gap) for th1 in thresholds1
+                      for th2 in thresholds2 for min_length in min_note_lengths
+                      for gap in join_gaps]
+        cost = 0
+        rung = 0
+
+        with Pool(n_workers, initializer=init_worker, initargs=(features,)) as pool:
+            while True:
+                n_blocks = n_excerpts * eta**rung
+                full = n_blocks >= blocks.shape[0]
+                if full:
+                    windows = None
+                    length = n_frames
+                else:
+                    windows = [(a, a + excerpt_length) for a in np.sort(blocks[:n_blocks])]
+                    length = n_blocks * excerpt_length
 
-                    time_gen, frequency_gen, loudness_gen = c.midi2time_f0_loudness(midi_data, sampling_rate/block_size)
-                    frequencyMidi = li.core.hz_to_midi(frequency_or)
+                scores = pool.map(evaluate, [c + (windows,) for c in candidates])
+                cost += len(candidates) * length
+                order = np.argsort(scores, kind="stable")
 
-                    # 0 padding:
-                    new_freq_gen = np.concatenate((frequency_gen, np.zeros(time_or.shape[0]-time_gen.shape[0])))
+                if verbose:
+                    print("Rung {} : {} candidates on {} frames, best score {:.4f}".format(rung, len(candidates), length, scores[order[0]]))
 
-                    # compute difference and score:
+                if full:
+                    break
 
-                    diff = np.abs(frequencyMidi-new_freq_gen)
-                    score = np.mean(diff)
+                n_keep = max(1, int(np.ceil(len(candidates) / eta)))
+                candidates = [candidates[i] for i in order[:n_keep]]
+                rung += 1
 
-                    if verbose:
-                        plt.plot(time_or, frequencyMidi)
-                        plt.plot(time_or, new_freq_gen)
-                        plt.show()
+        threshold1, threshold2, min_note_length, join_gap = candidates[order[0]]
+        parameters = {
+            "sampling_rate": self.sampling_rate,
+            "block_size": self.block_size,
+            "threshold_confidence": float(threshold1),
+            "threshold_madmom" if madmom else "threshold_loudness": float(threshold2),
+            "min_note_length": float(min_note_length),
+            "join_gap": float(join_gap),
+        }
 
-                        plt.plot(time_or, diff)
-                        plt.show()
-                        print("Loss : ", score)
-                    
-                    results[i, j] = score
-                    
-                    # update progress bar
-                    pbar.update(1)
+        return {"parameters": parameters, "score": float(scores[order[0]]), "cost": cost, "grid_cost": (len(thresholds1) * len(thresholds2) * len(min_note_lengths) * len(join_gaps) * n_frames)}
 
-        self.results = results
 
-        # clean files
-        self.clean(keep_best_file, save_path + filename[:-4], results, thresholds1, thresholds2, madmom)
+def tune_instruments(filenames,
+                     thresholds1,
+                     thresholds2,
+                     min_note_lengths,
+                     join_gaps,
+                     madmom=True,
+                     sampling_rate=16000,
+                     block_size=160,
+                     **kwargs):
+    """ Input : dict instrument -> audio file
+    Output : dict instrument -> tuned parameters (see successive_halving) """
 
-        return results
+    tuned = {}
+    for instrument, filename in filenames.items():
+        gs = GridSearch(filename, sampling_rate, block_size)
+        tuned[instrument] = gs.successive_halving(thresholds1, thresholds2, min_note_lengths, join_gaps, madmom = madmom, **kwargs)
+        print("{} : {}".format(instrument, tuned[instrument]))
 
-    def clean(self, keep_best_file, path_name, results, thresholds1, thresholds2, madmom = True):
-        idx = np.argmin(results)
-        a, b = idx // results.shape[1], idx % results.shape[1]
-        for i in range(thresholds1.shape[0]):
-            for j in range(thresholds2.shape[0]):
-                if i==a and j==b and keep_best_file: # need to delete this file
-                    continue
+    return tuned
 
-                if madmom:
-                    path = path_name + "(from-audio)-thC{}-thM{}.mid".format(thresholds2[i], thresholds2[j])
-                else:
-                    path = path_name + "(from-audio)-thC{}-thL{}.mid".format(thresholds2[i], thresholds2[j])
-                
-                os.remove(path)
 
 
+if __name__ == "__main__":
 
+    filename = "vn_01_Jupiter.wav"
+    #filename = "flute.wav"
+    sampling_rate = 16000
+    block_size = 160
 
 
+    ### FIRST EXPERIMENT ###
 
-filename = "vn_01_Jupiter.wav"
-#filename = "flute.wav"
-save_path = "midi-generated-files/"
-sampling_rate = 16000
-block_size = 160
+    gs = GridSearch(filename, sampling_rate, block_size)
 
+    # define thresholds ranges : 
+    number_thresholds = 10
+    thresholds2 = np.linspace(0.01, 0.4, number_thresholds)
+    thresholds1 = np.linspace(0.01, 0.4, number_thresholds)
 
-### FIRST EXPERIMENT ###
+    # get results :
+    rslt = gs.get_result(thresholds1, thresholds2, madmom=False, verbose=False)
+    print("Best thresholds : ", gs.best(thresholds1, thresholds2))
 
-gs = GridSearch(filename, sampling_rate, block_size)
-gs.set_save_path(save_path)
+    # print results : 
 
-# define thresholds ranges : 
-number_thresholds = 10
-thresholds2 = np.linspace(0.01, 0.4, number_thresholds)
-thresholds1 = np.linspace(0.01, 0.4, number_thresholds)
+    rslt = np.log(rslt)
+    rslt = rslt/np.max(rslt)
 
-# get results :
-rslt = gs.get_result(thresholds1, thresholds2, madmom=False, verbose=False, keep_best_file=True)
 
-# print results : 
+    sns.heatmap(rslt)
 
-rslt = np.log(rslt)
-rslt = rslt/np.max(rslt)
+    plt.xticks(plt.xticks()[0], labels=np.round(thresholds1, 3))
+    plt.yticks(plt.yticks()[0], labels=np.round(thresholds2, 3))
+    plt.xlabel("Confidence threshold")
+    plt.ylabel("Loudness threshold")
+    plt.title("Grid Search for Audio2Midi")
+    plt.legend()
+    plt.show()
 
 
-sns.heatmap(rslt)
+    ### ADAPTIVE SEARCH PER INSTRUMENT ###
 
-plt.xticks(plt.xticks()[0], labels=np.round(thresholds1, 3))
-plt.yticks(plt.yticks()[0], labels=np.round(thresholds2, 3))
-plt.xlabel("Confidence threshold")
-plt.ylabel("Loudness threshold")
-plt.title("Grid Search for Audio2Midi")
-plt.legend()
-plt.show()
+    filenames = {"violin": "vn_01_Jupiter.wav", "flute": "flute.wav"}
 
+    tuned = tune_instruments(filenames,
+                             thresholds1 = np.linspace(0.01, 0.4, 20),
+                             thresholds2 = np.linspace(0.01, 0.4, 20),
+                             min_note_lengths = [0.01, 2, 5, 10],
+                             join_gaps = [0.05, 0.1, 0.2],
+                             madmom = False)
 
+    with open("tuned-parameters.json", "w") as out:
+        json.dump(tuned, out, indent=4)
@@ -240,18 +240,56 @@ class Converter:
                               midi_data,
                               frame_rate=16000,
                               times_needed=None):
+        """ Monophonic rasterization of the first instrument : each frame
+        gets the pitch and velocity of the last note started before it and
+        not yet ended (pitch 0 and loudness 0 when silent). Frames are the
+        piano roll columns pretty_midi would compute, without building the
+        128 x frames roll (pedal and pitch bends are ignored). """
 
         instrument_data = midi_data.instruments[0]
+        notes = sorted(instrument_data.notes, key=lambda note: note.start)
+        starts = np.array([note.start for note in notes])
+        ends = np.array([note.end for note in notes])
+        pitches = np.array([note.pitch for note in notes], dtype=np.int64)
+        velocities = np.array([note.velocity for note in notes],
+                              dtype=np.float64)
+
         if times_needed is None:
-            notes = instrument_data.get_piano_roll(frame_rate)
-            times = np.array([i / frame_rate for i in range(notes.shape[1])])
+            end_time = instrument_data.get_end_time()
+            columns = np.arange(int(frame_rate *
+                                    end_time)) if notes else np.arange(0)
+            times = columns / frame_rate
+            fs = frame_rate
         else:
-            notes = instrument_data.get_piano_roll(times=times_needed)
+            # pretty_midi columns at 100 fps, the last time is left silent
             times = times_needed
+            fs = 100
+            columns = np.round(times * fs).astype(int)
+
+        pitch, loudness = self.rasterize_notes(starts, ends, pitches,
+                                               velocities, columns, fs)
+        if times_needed is not None:
+            pitch[-1:], loudness[-1:] = 0, 0
+
+        return times, pitch, loudness
+
+    def rasterize_notes(self, starts, ends, pitches, velocities, columns, fs):
+        """ Input : notes sorted by start time, frame (column) indexes
+        Output : pitch and velocity of the note covering each frame """
+
+        note_starts = (starts * fs).astype(int)
+        note_ends = (ends * fs).astype(int)
+
+        idx = np.searchsorted(note_starts, columns, side="right") - 1
+        active = idx >= 0
+        active[active] = columns[active] < note_ends[idx[active]]
 
-        pitches, loudness = self.extract_f0_loudness(notes)
+        pitch = np.zeros(columns.shape[0], dtype=np.int64)
+        loudness = np.zeros(columns.shape[0])
+        pitch[active] = pitches[idx[active]]
+        loudness[active] = velocities[idx[active]]
 
-        return times, pitches, loudness
+        return pitch, loudness
 
     def extract_f0_loudness(self, notes):
         pitches = np.argmax(notes, axis=0)
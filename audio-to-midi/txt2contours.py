@@ -20,47 +20,62 @@ class Txt2Contours:
         return list_events
 
 
-    def process(self, filename, sampling_rate=16000):
-        list_events = self.get_list_events(filename)
+    def rasterize(self, list_events, frame_rate=100):
+        """ Input : list of (onset, pitch, duration) events sorted by onset
+        Output : time, f0 and loudness sampled at frame_rate. A frame gets
+        the pitch of the note covering it (onset <= t < offset), a note
+        overlapping the previous one only starts when the previous ends,
+        and at most one note starts per frame """
+
+        events = np.array(list_events, dtype=np.float64).reshape(-1, 3)
+        onsets, pitches = events[:, 0], events[:, 1]
+        offsets = events[:, 0] + events[:, 2]
+
+        # Compute track duration :
+        duration = offsets[-1]
+
+        # create time vector :
+        time = np.arange(0, duration, 1/frame_rate)
+
+        # frame reaching each note : the next note is reached once the
+        # previous offset is strictly passed, one note per frame at most
+        # (reached[k] = max(reached[k-1] + 1, released[k-1]))
+        released = np.searchsorted(time, offsets, side="right")
+        k = np.arange(len(onsets))
+        reached = np.maximum.accumulate(
+            np.concatenate([[0], released[:-1] - k[1:]])) + k
 
-        # Compute track duration : 
-        last_note = list_events[-1]
-        duration = last_note[0] + last_note[2]
-
-        # create time vector : 
-
-        time = np.arange(0, duration, 1/sampling_rate)
-        f0 = np.zeros_like(time)
-        loudness = np.zeros_like(time)
-        i_note = 0
-        note = list_events[i_note]
-        onset = note[0]
-        offset = note[0]+note[2]
-        pitch = note[1]
-        for i in range(time.shape[0]):
-            if offset<time[i] and i_note+1<len(list_events):
-                i_note += 1
-                note = list_events[i_note]
-                onset = note[0]
-                offset = note[0]+note[2]
-                pitch = note[1]
-
-            if time[i]>= onset and offset>time[i]:
-                f0[i] = pitch
-                loudness[i] = 1
-            else:
-                f0[i] = 0
+        # first frame of each note and first frame after it
+        starts = np.maximum(np.searchsorted(time, onsets),
+                            np.minimum(reached, time.shape[0]))
+        ends = np.maximum(np.searchsorted(time, offsets), starts)
+
+        # runs of silence followed by a note : [0, p0, 0, p1, ...]
+        lengths = np.empty(2 * len(starts), dtype=np.int64)
+        lengths[0::2] = starts - np.concatenate([[0], ends[:-1]])
+        lengths[1::2] = ends - starts
+        values = np.zeros(2 * len(starts), dtype=np.float32)
+        values[1::2] = pitches
+
+        f0 = np.zeros(time.shape[0], dtype=np.float32)
+        f0[:ends[-1]] = np.repeat(values, lengths)
+        loudness = np.zeros(time.shape[0], dtype=np.float32)
+        loudness[:ends[-1]] = np.repeat(np.arange(values.shape[0]) % 2, lengths)
 
         return time, f0, loudness
 
+    def process(self, filename, sampling_rate=16000):
+        list_events = self.get_list_events(filename)
+        return self.rasterize(list_events, sampling_rate)
+
 
 
 
 if __name__ == '__main__':
     filename = "violin.txt"
     t2c = Txt2Contours()
-    time, f0, loudness = t2c.process(filename)
+    time, f0, loudness = t2c.process(filename, sampling_rate=100)
     
-    plt.plot(time[0:400000], f0[0:400000], label = "Frequency")
-    #plt.plot(time[10000:400000], loudness[10000:400000], label = "Loudness")
+    plt.plot(time[0:2500], f0[0:2500], label = "Frequency")
+    #plt.plot(time[62:2500], loudness[62:2500], label = "Loudness")
     plt.show()
@@ -11,6 +11,10 @@ import pickle
 import matplotlib.pyplot as plt
 from random import randint, sample
 from utils import *
+import sys
+
+sys.path.insert(0, "dataset")
+from torch_transforms import from_sklearn
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -37,6 +41,7 @@ class Model(pl.LightningModule):
         super().__init__()
         self.save_hyperparameters()
         self.scalers = scalers
+        self.transforms = [from_sklearn(sc) for sc in scalers or []]
         self.ddsp = None
         self.val_idx = 0
         self.lr = nn.LeakyReLU()
@@ -152,10 +157,8 @@ class Model(pl.LightningModule):
         return out
 
     def apply_inverse_transform(self, x, idx):
-        scaler = self.scalers[idx]
-        x = x.cpu()
-        out = scaler.inverse_transform(x.reshape(-1, 1))
-        out = torch.from_numpy(out).to("cuda")
+        transform = self.transforms[idx].to(x.device)
+        out = transform.inverse_transform(x.reshape(-1, 1))
         out = out.unsqueeze(0)
         return out.float()
 
@@ -0,0 +1,164 @@
+import argparse
+import importlib
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# name : (directory, module, class, input channels, constructor kwargs)
+MODELS = {
+    "diffusion": ("diffusion", "training_mse", "Network", 2, {
+        "down_channels": [2, 8, 64, 128, 256, 512],
+        "up_channels": [512, 256, 128, 64, 16, 8, 2],
+        "down_dilations": [1, 1, 2, 2, 4, 4],
+        "up_dilations": [1, 1, 3, 3, 3, 9, 9],
+        "scalers": None,
+    }),
+    "unet": ("unet-rnn", "unet", "UNet", 2, {
+        "channels": [2, 16, 512, 1024],
+        "scalers": None,
+    }),
+    "unet-rnn": ("unet-rnn", "unet_rnn", "UNet_RNN", 2, {
+        "channels": [2, 16, 512, 1024],
+        "scalers": None,
+    }),
+    "lstm-categorical": ("lstms", "LSTMCategorical", "ModelCategorical", 598,
+                         {
+                             "in_size": 598,
+                             "hidden_size": 1024,
+                             "out_size": 349,
+                             "scalers": None,
+                         }),
+    "lstm-continuous": ("lstms", "LSTMContinuous", "ModelContinuousPitch",
+                        245, {
+                            "in_size": 245,
+                            "hidden_size": 1024,
+                            "out_size": 124,
+                            "scalers": None,
+                        }),
+    "baseline": ("baseline", "baseline_model", "Model", 472, {
+        "in_size": 472,
+        "hidden_size": 512,
+        "out_size": 221,
+        "scalers": None,
+    }),
+}
+
+
+def load_model(name, checkpoint=None):
+    directory, module, cls, _, kwargs = MODELS[name]
+
+    # every family imports its own siblings (utils, datasets...)
+    sys.path.insert(0, os.path.join(ROOT, directory))
+    cls = getattr(importlib.import_module(module), cls)
+
+    if checkpoint is None:
+        model = cls(**kwargs)
+    else:
+        model = cls.load_from_checkpoint(checkpoint, strict=False)
+
+    if name == "diffusion":
+        model.set_noise_schedule()
+
+    return model.eval()
+
+
+def generate(name, model, x):
+    if name == "diffusion":
+        return model.sample(x, x)
+    elif name in ["unet", "unet-rnn"]:
+        return model(x)
+    # autoregressive models write their predictions into their input
+    return model.generation_loop(x.clone())
+
+
+def run_config(name, checkpoint, n_sample, batch_size, n_warmup, n_repeat,
+               n_threads):
+    torch.set_num_threads(n_threads)
+    torch.set_grad_enabled(False)
+
+    model = load_model(name, checkpoint)
+    x = torch.randn(batch_size, n_sample, MODELS[name][3])
+
+    for _ in range(n_warmup):
+        generate(name, model, x)
+
+    latencies = []
+    for _ in range(n_repeat):
+        start = time.perf_counter()
+        generate(name, model, x)
+        latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies)
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return {
+        "n_sample": n_sample,
+        "batch_size": batch_size,
+        "latency_ms": {
+            "mean": 1000 * latencies.mean(),
+            "p50": 1000 * np.percentile(latencies, 50),
+            "p90": 1000 * np.percentile(latencies, 90),
+            "p99": 1000 * np.percentile(latencies, 99),
+        },
+        "frames_per_second": batch_size * n_sample / latencies.mean(),
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def count_parameters(name, checkpoint):
+    model = load_model(name, checkpoint)
+    return sum(p.numel() for p in model.parameters())
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="CPU inference benchmark of the contour models")
+    parser.add_argument("model", choices=list(MODELS))
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--n-sample", type=int, nargs="+", default=[2048])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1])
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    # each configuration runs in a fresh process so that peak RSS is its own
+    ctx = mp.get_context("spawn")
+
+    with ctx.Pool(1) as pool:
+        n_params = pool.apply(count_parameters, (args.model, args.checkpoint))
+
+    results = []
+    for n_sample in args.n_sample:
+        for batch_size in args.batch_size:
+            with ctx.Pool(1) as pool:
+                results.append(
+                    pool.apply(run_config,
+                               (args.model, args.checkpoint, n_sample,
+                                batch_size, args.warmup, args.repeat,
+                                args.threads)))
+
+    report = {
+        "model": args.model,
+        "checkpoint": args.checkpoint,
+        "n_params": n_params,
+        "threads": args.threads,
+        "results": results,
+    }
+
+    if args.output is None:
+        print(json.dumps(report, indent=4))
+    else:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=4)
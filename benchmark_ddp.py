@@ -0,0 +1,123 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+
+from benchmark import MODELS, load_model
+from launch import get_cores, pin
+
+
+def run_rank(rank, world_size, port, n_sample, batch_size, n_warmup, n_steps,
+             queue):
+    """ One process of the data parallel training : pinned to its share of
+    the cores, gradients averaged over gloo """
+    pin(get_cores(rank, world_size))
+    dist.init_process_group("gloo",
+                            init_method="tcp://127.0.0.1:{}".format(port),
+                            rank=rank,
+                            world_size=world_size)
+
+    torch.manual_seed(rank)
+    model = load_model("diffusion").train()
+    # same weights on every process, as DDP broadcasts them from rank 0.
+    # Some parameters of the UNet get no gradient (unused batch norms) : the
+    # static graph finds them once
+    model.model = DistributedDataParallel(model.model, static_graph=True)
+    optimizer = model.configure_optimizers()
+
+    channels = MODELS["diffusion"][3]
+    model_input = torch.randn(batch_size, n_sample, channels)
+    cdt = torch.randn(batch_size, n_sample, channels)
+
+    for step in range(n_warmup + n_steps):
+        if step == n_warmup:
+            dist.barrier()
+            start = time.perf_counter()
+
+        optimizer.zero_grad()
+        loss = model.compute_loss(model_input, cdt)
+        loss.backward()
+        optimizer.step()
+
+    dist.barrier()
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        queue.put(elapsed)
+    dist.destroy_process_group()
+
+
+def run_config(world_size, port, n_sample, batch_size, n_warmup, n_steps):
+    """ Output : duration of n_steps training steps with world_size
+    processes, each one training on batch_size windows per step """
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    processes = [
+        ctx.Process(target=run_rank,
+                    args=(rank, world_size, port, n_sample, batch_size,
+                          n_warmup, n_steps, queue))
+        for rank in range(world_size)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    if any(p.exitcode != 0 for p in processes):
+        raise RuntimeError("run with {} processes failed".format(world_size))
+    return queue.get()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Scaling of the CPU data parallel training (DDP over "
+        "gloo) of the diffusion model on a single machine")
+    parser.add_argument("--nproc", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--n-sample", type=int, default=2048)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--master-port", type=int, default=29500)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = []
+    for i, world_size in enumerate(args.nproc):
+        # a fresh port for every configuration : no wait for the release of
+        # the previous one
+        elapsed = run_config(world_size, args.master_port + i, args.n_sample,
+                             args.batch_size, args.warmup, args.steps)
+        samples = world_size * args.batch_size * args.steps
+        results.append({
+            "nproc": world_size,
+            "cores_per_process": len(get_cores(0, world_size)),
+            "global_batch_size": world_size * args.batch_size,
+            "step_ms": 1000 * elapsed / args.steps,
+            "samples_per_second": samples / elapsed,
+        })
+
+    # relative to the first configuration, usually a single process
+    for r in results:
+        r["speedup"] = r["samples_per_second"] / results[0][
+            "samples_per_second"]
+        r["efficiency"] = r["speedup"] * results[0]["nproc"] / r["nproc"]
+
+    report = {
+        "model": "diffusion",
+        "cores": len(os.sched_getaffinity(0)),
+        "n_sample": args.n_sample,
+        "batch_size_per_process": args.batch_size,
+        "results": results,
+    }
+
+    if args.output is None:
+        print(json.dumps(report, indent=4))
+    else:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=4)
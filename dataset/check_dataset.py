@@ -1,38 +1,24 @@
-import csv
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 
-PATH = "dataset/contours-violin.csv"
-
-u_f0 = []
-u_loudness = []
-e_f0 = []
-e_loudness = []
-e_f0_mean = []
-e_f0_stddev = []
-f0_conf = []
-events = []
-
-with open(PATH) as csvfile:
-    reader = csv.DictReader(csvfile)
-    for row in reader:
-        u_f0.append(float(row["u_f0"]))
-        u_loudness.append(float(row["u_loudness"]))
-        e_f0.append(float(row["e_f0"]))
-        e_loudness.append(float(row["e_loudness"]))
-        e_f0_mean.append(float(row["e_f0_mean"]))
-        e_f0_stddev.append(float(row["e_f0_stddev"]))
-        f0_conf.append(float(row["f0_conf"]))
-        events.append(float(row["events"]))
-
-u_f0 = np.array(u_f0)
-u_loudness = np.array(u_loudness)
-e_f0 = np.array(e_f0)
-e_loudness = np.array(e_loudness)
-e_f0_mean = np.array(e_f0_mean)
-e_f0_stddev = np.array(e_f0_stddev)
-f0_conf = np.array(f0_conf)
-events = np.array(events)
+from contours_store import ContoursStore
+
+PATH = "dataset/contours-violin"
+
+# the csv is converted once, plots then read memory-mapped slices
+if not os.path.exists(os.path.join(PATH, "index.csv")):
+    ContoursStore(PATH, mode="w").append_csv("contours-violin", PATH + ".csv")
+
+store = ContoursStore(PATH)
+u_f0 = store.column("u_f0")
+u_loudness = store.column("u_loudness")
+e_f0 = store.column("e_f0")
+e_loudness = store.column("e_loudness")
+e_f0_mean = store.column("e_f0_mean")
+e_f0_stddev = store.column("e_f0_stddev")
+f0_conf = store.column("f0_conf")
+events = store.column("events")
 
 print(len(u_f0.squeeze()))
 fig, (ax1, ax2, ax3, ax4, ax5) = plt.subplots(5, 1)
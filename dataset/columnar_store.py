@@ -0,0 +1,138 @@
+import csv
+import os
+import numpy as np
+
+
+class ColumnarStore:
+
+    # name : dtype of the stored columns
+    COLUMNS = {}
+
+    # name : type of the index fields identifying a chunk
+    KEY = {"name": str}
+
+    def __init__(self, path, mode="r", dtypes=None):
+        """ Append-only columnar store. Every column is a raw binary file in
+        the path directory, chunks are appended contiguously and index.csv
+        records the key fields, start and length of each chunk. dtypes.csv
+        records the dtype of every column (dtypes of a new store, default
+        COLUMNS). Mode "w" clears the store, "a" appends to it. """
+
+        self.path = path
+        self.mode = mode
+        self.index_path = os.path.join(path, "index.csv")
+        self.dtypes_path = os.path.join(path, "dtypes.csv")
+
+        if mode == "w" and os.path.exists(path):
+            files = [c + ".bin" for c in self.COLUMNS]
+            for f in files + ["index.csv", "dtypes.csv"]:
+                if os.path.exists(os.path.join(path, f)):
+                    os.remove(os.path.join(path, f))
+        if mode in ["a", "w"]:
+            os.makedirs(path, exist_ok=True)
+
+        if os.path.exists(self.dtypes_path):
+            with open(self.dtypes_path) as f:
+                self.dtypes = {
+                    row["column"]: row["dtype"]
+                    for row in csv.DictReader(f)
+                }
+        elif os.path.exists(self.index_path):
+            self.dtypes = self.get_legacy_dtypes()
+        else:
+            self.dtypes = dict(dtypes or self.COLUMNS)
+
+        # a key appended again replaces the previous chunk : last row wins
+        self.index = {}
+        self.length = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index:
+                for row in csv.DictReader(index):
+                    start, length = int(row["start"]), int(row["length"])
+                    self.index[self.read_key(row)] = (start, length)
+                    self.length = max(self.length, start + length)
+
+    def get_legacy_dtypes(self):
+        """ Output : dtypes of a store written without dtypes.csv """
+        return dict(self.COLUMNS)
+
+    def read_key(self, row):
+        key = tuple(t(row[f]) for f, t in self.KEY.items())
+        return key if len(key) > 1 else key[0]
+
+    def write_key(self, key):
+        return dict(zip(self.KEY, key if len(self.KEY) > 1 else (key, )))
+
+    def column_path(self, name):
+        return os.path.join(self.path, "{}.bin".format(name))
+
+    def append_chunks(self, key, chunks, replace=False):
+        """ Writes one entry given as successive chunks (dicts of all the
+        columns), memory stays bounded by the chunk size. With replace, an
+        entry already stored is replaced (its old data is left unused) """
+
+        if self.mode == "r":
+            raise ValueError("store opened in read mode")
+        if key in self.index and not replace:
+            raise ValueError("{} already stored".format(key))
+
+        if not os.path.exists(self.dtypes_path):
+            with open(self.dtypes_path, "w", newline="") as dtypes:
+                writer = csv.writer(dtypes)
+                writer.writerow(["column", "dtype"])
+                writer.writerows(self.dtypes.items())
+
+        # drop the data of an interrupted append
+        for c, dtype in self.dtypes.items():
+            size = self.length * np.dtype(dtype).itemsize
+            if os.path.exists(self.column_path(c)) and os.path.getsize(
+                    self.column_path(c)) > size:
+                os.truncate(self.column_path(c), size)
+
+        first = next(iter(self.dtypes))
+        length = 0
+        for columns in chunks:
+            chunk_length = len(columns[first])
+            for c, dtype in self.dtypes.items():
+                x = np.asarray(columns[c], dtype=dtype).reshape(-1)
+                if x.shape[0] != chunk_length:
+                    raise ValueError(
+                        "column {} has length {} instead of {}".format(
+                            c, x.shape[0], chunk_length))
+                with open(self.column_path(c), "ab") as f:
+                    x.tofile(f)
+            length += chunk_length
+
+        # index written last : a crash leaves unindexed data only, dropped
+        # by the next append
+        new_index = not os.path.exists(self.index_path)
+        with open(self.index_path, "a", newline="") as index:
+            writer = csv.DictWriter(index,
+                                    fieldnames=list(self.KEY) +
+                                    ["start", "length"])
+            if new_index:
+                writer.writeheader()
+            writer.writerow({
+                **self.write_key(key), "start": self.length,
+                "length": length
+            })
+
+        self.index[key] = (self.length, length)
+        self.length += length
+
+    def column(self, name):
+        """ Memory-mapped view of a whole column """
+        if self.length == 0:
+            return np.empty(0, dtype=self.dtypes[name])
+        return np.memmap(self.column_path(name),
+                         dtype=self.dtypes[name],
+                         mode="r",
+                         shape=(self.length, ))
+
+    def get(self, key, columns=None):
+        """ Returns a dict of memory-mapped slices for one entry """
+        start, length = self.index[key]
+        return {
+            c: self.column(c)[start:start + length]
+            for c in columns or self.COLUMNS
+        }
@@ -0,0 +1,118 @@
+import io
+import itertools
+import os
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+
+from columnar_store import ColumnarStore
+
+
+def read_blocks(path, block_size):
+    """ Yields the header line of a csv file, then blocks of about
+    block_size bytes of whole lines """
+    with open(path, "rb") as f:
+        yield f.readline()
+        rest = b""
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            block = rest + block
+            cut = block.rfind(b"\n") + 1
+            if cut == 0:
+                rest = block
+                continue
+            rest = block[cut:]
+            yield block[:cut]
+        if rest.strip():
+            yield rest
+
+
+def parse_block(task):
+    """ Input : (csv lines, column names, columns to keep)
+    Output : dict of float64 columns """
+    block, names, columns = task
+    chunk = pd.read_csv(io.BytesIO(block),
+                        header=None,
+                        names=names,
+                        usecols=columns,
+                        dtype="float64")
+    return {c: chunk[c].to_numpy() for c in columns}
+
+
+class ContoursStore(ColumnarStore):
+
+    COLUMNS = {
+        "u_f0": "float32",
+        "u_loudness": "float32",
+        "e_f0": "float32",
+        "e_loudness": "float32",
+        "e_f0_mean": "float32",
+        "e_f0_stddev": "float32",
+        "f0_conf": "float32",
+        "events": "int8",
+    }
+
+    def __init__(self, path, mode="r", precision="float32"):
+        """ Columnar store of contours, one entry per track (name).
+        Contours are stored with the given precision (float32 or float16)
+        and events as int8 (float64 for stores without dtypes.csv). """
+        dtypes = {
+            c: precision if dtype.startswith("float") else dtype
+            for c, dtype in self.COLUMNS.items()
+        }
+        super().__init__(path, mode, dtypes)
+
+    def get_legacy_dtypes(self):
+        return {c: "float64" for c in self.COLUMNS}
+
+    def append(self, name, **columns):
+        """ Writes one track (all columns of the same length) at the end of
+        the store """
+        self.append_chunks(name, [columns])
+
+    def append_csv(self, name, path, block_size=64 << 20, n_workers=None):
+        """ Streams a contours csv file into the store as one track. The file
+        is read in blocks of block_size bytes, parsed n_workers blocks at a
+        time by a pool of processes : memory stays bounded by
+        n_workers * block_size """
+        n_workers = n_workers or os.cpu_count()
+        blocks = read_blocks(path, block_size)
+        names = next(blocks).decode().strip().split(",")
+        tasks = ((block, names, list(self.COLUMNS)) for block in blocks)
+
+        def parsed_chunks(pool):
+            while True:
+                batch = list(itertools.islice(tasks, n_workers))
+                if not batch:
+                    return
+                yield from pool.map(parse_block, batch)
+
+        if n_workers == 1:
+            self.append_chunks(name, map(parse_block, tasks))
+        else:
+            with Pool(n_workers) as pool:
+                self.append_chunks(name, parsed_chunks(pool))
+
+    def to_csv(self, path, chunksize=1000000):
+        """ Exports the whole store as a contours csv file, chunksize rows
+        at a time """
+        for start in range(0, max(self.length, 1), chunksize):
+            pd.DataFrame({
+                c: self.column(c)[start:start + chunksize]
+                for c in self.COLUMNS
+            }).to_csv(path, mode="w" if start == 0 else "a",
+                      header=start == 0, index=False)
+
+
+def merge_stores(paths, path, precision="float32"):
+    """ Copies the tracks of the stores (names prefixed with the store
+    name) into a new store, one track at a time """
+    merged = ContoursStore(path, mode="w", precision=precision)
+    for store_path in paths:
+        store = ContoursStore(store_path)
+        for name in store.index:
+            merged.append("{}/{}".format(os.path.basename(store_path), name),
+                          **store.get(name))
+    return merged
@@ -1,310 +1,277 @@
-import torch
-import pickle
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 import pandas as pd
 
+from make_dataset import load_dataset
+
 
 class Analyzer:
-    def __init__(self, path) -> None:
-        with open(path, "rb") as dataset:
-            self.dataset = pickle.load(dataset)
-        self.load_data()
-
-    def load_data(self):
-
-        self.u_f0 = torch.from_numpy(self.dataset["u_f0"]).float()
-        self.u_lo = torch.from_numpy(self.dataset["u_loudness"]).float()
-        self.e_f0 = torch.from_numpy(self.dataset["e_f0"]).float()
-        self.e_lo = torch.from_numpy(self.dataset["e_loudness"]).float()
-        self.onsets = torch.from_numpy(self.dataset["onsets"]).float()
-        self.offsets = torch.from_numpy(self.dataset["offsets"]).float()
-
-    def get_trans_frames(self, ratio=0.1):
-
-        trans = torch.zeros_like(self.onsets)
-        frames = torch.zeros_like(self.onsets)
-        note_on = 0
-
-        for i in range(self.onsets.shape[0]):
-            if self.onsets[i]:
-                note_on = i
-            elif self.offsets[i]:
-                l = i - note_on
-                l_onset = int(ratio * l)
-                # update transition tensor
-                s_attack, e_attack = note_on, note_on + l_onset
-                trans[s_attack:e_attack] = 1
-                s_release, e_release = i - l_onset, i
-                trans[s_release:e_release] = 1
-                #update frames tensor
-                frames[e_attack:s_release] = 1
 
+    # dataset keys of the analyzed contours
+    COLUMNS = {
+        "u_f0": "u_f0",
+        "u_lo": "u_loudness",
+        "e_f0": "e_f0",
+        "e_lo": "e_loudness",
+        "onsets": "onsets",
+        "offsets": "offsets",
+    }
+
+    def __init__(self, path=None, ratio=0.1) -> None:
+        """ Note and transition tables of a dataset, as columnar arrays.
+        Data can be appended : only the end of the tables is updated. """
+        self.ratio = ratio
+        self.n = 0
+        for c in self.COLUMNS:
+            setattr(self, c, np.zeros(0))
+        self.trans = np.zeros(0, dtype=bool)
+        self.frames = np.zeros(0, dtype=bool)
+        self.notes = None
+        self.transitions = None
+
+        if path is not None:
+            self.append(load_dataset(path))
+
+    def append(self, dataset):
+        """ Adds the frames of dataset (same keys as the dataset pickles)
+        at the end and updates the tables """
+
+        # offsets after the last onset are the only ones to change the
+        # transitions and frames of the data already analyzed
+        onsets = np.flatnonzero(self.onsets)
+        cut = onsets[-1] if onsets.shape[0] else 0
+
+        for c, key in self.COLUMNS.items():
+            x = np.asarray(dataset[key], dtype=np.float64)
+            setattr(self, c, np.concatenate([getattr(self, c), x]))
+        self.n = self.u_f0.shape[0]
+
+        trans, frames = self.get_trans_frames(cut)
+        self.trans = np.concatenate([self.trans[:cut], trans])
+        self.frames = np.concatenate([self.frames[:cut], frames])
+
+        self.notes = self.update_table(self.notes, self.frames, cut,
+                                       self.get_notes_table)
+        self.transitions = self.update_table(self.transitions, self.trans,
+                                             cut, self.get_transitions_table)
+
+    def update_table(self, table, x, cut, get_table):
+        """ Keeps the rows of the segments ending before cut, computes the
+        segments of x after them """
+        if table is None:
+            r0 = 0
+        else:
+            keep = table[0]["end"] < cut
+            table = [{c: v[keep] for c, v in t.items()} for t in table]
+            r0 = table[0]["end"][-1] if keep.any() else 0
+
+        starts, ends = self.get_segments(x[r0:])
+        new = get_table(starts + r0, ends + r0)
+        if table is None:
+            return new
+        return tuple({c: np.concatenate([t[c], n[c]])
+                      for c in t} for t, n in zip(table, new))
+
+    def get_trans_frames(self, start=0):
+        """ Output : transition and (stable) frames masks of [start, n[,
+        start being 0 or an onset """
+
+        onsets = self.onsets[start:] > 0
+        offsets = (self.offsets[start:] > 0) & ~onsets
+        on = np.flatnonzero(onsets) + start
+        off = np.flatnonzero(offsets) + start
+
+        # start of the note of each offset : last onset before it, start if
+        # there is none (on can be empty)
+        k = np.searchsorted(on, off, side="right") - 1
+        note_on = np.where(k >= 0, on[np.maximum(k, 0)] if on.size else start,
+                           start)
+
+        l_onset = (self.ratio * (off - note_on)).astype(np.int64)
+        e_attack, s_release = note_on + l_onset, off - l_onset
+
+        n = self.n - start
+        trans = self.union(n, np.concatenate([note_on, s_release]) - start,
+                           np.concatenate([e_attack, off]) - start)
+        frames = self.union(n, e_attack - start, s_release - start)
         return trans, frames
 
-    def get_all_notes(self):
-        trans, frames = self.get_trans_frames()
-        onsets = self.get_onsets(frames)
-
-        midi = []
-        target = []
-
-        for onset in onsets:
-            note_midi = {
-                "start": None,
-                "end": None,
-                "f0": None,
-                "lo": None,
-                "diff_cents": None,
-                "accurate": None
-            }
-            note_target = {
-                "start": None,
-                "end": None,
-                "f0": None,
-                "lo": None,
-                "diff_cents": None,
-                "accurate": None
-            }
-
-            # Set onsets
-            note_midi["start"], note_midi["end"] = onset["start"], onset["end"]
-            note_target["start"], note_target["end"] = onset["start"], onset[
-                "end"]
-
-            # MIDI
-            note_midi["f0"] = torch.mean(
-                self.u_f0[note_midi["start"]:note_midi["end"]])
-            note_midi["lo"] = torch.mean(
-                self.u_lo[note_midi["start"]:note_midi["end"]])
-
-            # Performance
-
-            note_target["f0"] = torch.mean(
-                self.e_f0[note_target["start"]:note_target["end"]])
-            note_target["lo"] = torch.mean(
-                self.e_lo[note_target["start"]:note_target["end"]])
-
-            # Compute accuracy
-
-            d_cents, accuracy = self.accuracy(note_midi["f0"],
-                                              note_target["f0"])
-
-            note_midi["diff_cents"] = d_cents
-            note_target["diff_cents"] = -d_cents
-            note_midi["accurate"] = note_target["accurate"] = accuracy
-
-            midi.append(note_midi)
-            target.append(note_target)
+    def union(self, n, starts, ends):
+        """ Output : mask of the union of the [start, end[ intervals """
+        keep = ends > starts
+        count = np.bincount(starts[keep], minlength=n + 1) - np.bincount(
+            ends[keep], minlength=n + 1)
+        return np.cumsum(count)[:n] > 0
+
+    def get_segments(self, mask):
+        """ Output : starts and ends of the runs of the mask (a run still on
+        at the end is not ended) """
+        d = np.diff(mask.astype(np.int8), prepend=0)
+        starts, ends = np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+        return starts[:ends.shape[0]], ends
+
+    def segment_mean(self, x, starts, ends, offset=0):
+        """ Output : mean of x (starting at frame offset) over each
+        [start, end[ segment """
+        cumsum = np.concatenate([[0], np.cumsum(x)])
+        return (cumsum[ends - offset] - cumsum[starts - offset]) / (ends -
+                                                                   starts)
+
+    def get_notes_table(self, starts, ends):
+        midi = {"start": starts, "end": ends}
+        target = {"start": starts, "end": ends}
+
+        # notes span [lo, hi[
+        lo, hi = (starts[0], ends[-1]) if starts.shape[0] else (0, 0)
+        for table, f0, loudness in [(midi, self.u_f0, self.u_lo),
+                                    (target, self.e_f0, self.e_lo)]:
+            table["f0"] = self.segment_mean(f0[lo:hi], starts, ends, lo)
+            table["lo"] = self.segment_mean(loudness[lo:hi], starts, ends, lo)
+
+        d_cents, accuracy = self.accuracy(midi["f0"], target["f0"])
+        midi["diff_cents"], target["diff_cents"] = d_cents, -d_cents
+        midi["accurate"] = target["accurate"] = accuracy
+        return midi, target
 
+    def get_transitions_table(self, starts, ends):
+        midi = {"start": starts, "end": ends}
+        target = {"start": starts, "end": ends}
+
+        midi["d_f0"] = self.u_f0[ends] - self.u_f0[starts]
+        midi["d_lo"] = self.u_lo[ends] - self.u_lo[starts]
+        target["d_f0"] = self.e_f0[ends] - self.e_f0[starts]
+        target["d_lo"] = self.e_lo[ends] - self.e_lo[starts]
+
+        # mean pitch distance (cents) over each transition
+        lo, hi = (starts[0], ends[-1]) if starts.shape[0] else (0, 0)
+        d_cents = self.score_pitch(self.e_f0[lo:hi],
+                                   self.u_f0[lo:hi],
+                                   reduction="none")
+        midi["diff_cents"] = self.segment_mean(d_cents, starts, ends, lo)
+        target["diff_cents"] = midi["diff_cents"]
         return midi, target
 
-    def get_all_transitions(self):
-        trans, frames = self.get_trans_frames()
-        transitions = self.get_onsets(trans)
-
-        midi = []
-        target = []
-
-        for t in transitions:
-            trans_midi = {
-                "start": None,
-                "end": None,
-                "d_f0": None,
-                "d_lo": None,
-                "diff_cents": None,
-            }
-            trans_target = {
-                "start": None,
-                "end": None,
-                "d_f0": None,
-                "d_lo": None,
-                "diff_cents": None,
-            }
-
-            # Set onsets
-            trans_midi["start"], trans_midi["end"] = t["start"], t["end"]
-            trans_target["start"], trans_target["end"] = t["start"], t["end"]
-
-            # MIDI
-            trans_midi["d_f0"] = self.u_f0[trans_midi["end"]] - self.u_f0[
-                trans_midi["start"]]
-            trans_midi["d_lo"] = self.u_lo[trans_midi["end"]] - self.u_lo[
-                trans_midi["start"]]
-
-            # Performance
-
-            trans_target["d_f0"] = self.e_f0[trans_target["end"]] - self.e_f0[
-                trans_target["start"]]
-            trans_target["d_lo"] = self.e_lo[trans_target["end"]] - self.e_lo[
-                trans_target["start"]]
-
-            # Compute accuracy
-
-            d_cents = self.score_pitch(
-                self.e_f0[trans_target["start"]:trans_target["end"]],
-                self.u_f0[trans_target["start"]:trans_target["end"]])
-
-            trans_midi["diff_cents"] = d_cents
-            trans_target["diff_cents"] = d_cents
-
-            midi.append(trans_midi)
-            target.append(trans_target)
+    def get_all_notes(self):
+        return self.notes
 
-        return midi, target
+    def get_all_transitions(self):
+        return self.transitions
 
     def accuracy(self, pitch, f0):
-        d_cents = 1200 * torch.log2(torch.abs(pitch / f0))
+        d_cents = 1200 * np.log2(np.abs(pitch / f0))
         return d_cents, d_cents < 50
 
+    def get_df(self, table, columns):
+        midi, target = table
+        df = {
+            name: pd.Series(np.concatenate([midi[c], target[c]]), dtype=dtype)
+            for name, (c, dtype) in columns.items()
+        }
+        df["cat"] = pd.Categorical.from_codes(
+            np.repeat([0, 1], [midi["start"].shape[0]] * 2),
+            ["midi", "target"])
+        return pd.DataFrame(df)
+
     def get_notes_df(self):
-        pitch = []
-        loudness = []
-        cat = []
-        diff_cents = []
-        accuracy = []
-        midi, target = self.get_all_notes()
-
-        for note in midi:
-            pitch += [note["f0"]]
-            loudness += [note["lo"]]
-            diff_cents += [note["diff_cents"]]
-            accuracy += [note["accurate"]]
-            cat += ["midi"]
-
-        for note in target:
-            pitch += [note["f0"]]
-            loudness += [note["lo"]]
-            diff_cents += [note["diff_cents"]]
-            accuracy += [note["accurate"]]
-            cat += ["target"]
-
-        df = pd.DataFrame({
-            "pitch": pd.Series(pitch, dtype="float32"),
-            "loudness": pd.Series(loudness, dtype="float32"),
-            "diff_cents": pd.Series(diff_cents, dtype="float32"),
-            "accuracy": pd.Series(accuracy, dtype="bool"),
-            "cat": pd.Categorical(cat),
-        })
-
-        return df
+        return self.get_df(
+            self.notes, {
+                "pitch": ("f0", "float32"),
+                "loudness": ("lo", "float32"),
+                "diff_cents": ("diff_cents", "float32"),
+                "accuracy": ("accurate", "bool"),
+            })
 
     def get_transitions_df(self):
-        d_f0 = []
-        d_lo = []
-        diff_cents = []
-        cat = []
-        midi, target = self.get_all_transitions()
-
-        for note in midi:
-            d_f0 += [note["d_f0"]]
-            d_lo += [note["d_lo"]]
-            diff_cents += [note["diff_cents"]]
-            cat += ["midi"]
-
-        for note in target:
-            d_f0 += [note["d_f0"]]
-            d_lo += [note["d_lo"]]
-            diff_cents += [note["diff_cents"]]
-            cat += ["target"]
-
-        df = pd.DataFrame({
-            "d_f0": pd.Series(d_f0, dtype="float32"),
-            "d_lo": pd.Series(d_lo, dtype="float32"),
-            "diff_cents": pd.Series(diff_cents, dtype="float32"),
-            "cat": pd.Categorical(cat)
-        })
-
-        return df
+        return self.get_df(
+            self.transitions, {
+                "d_f0": ("d_f0", "float32"),
+                "d_lo": ("d_lo", "float32"),
+                "diff_cents": ("diff_cents", "float32"),
+            })
 
     def get_onsets(self, frames):
-        note = {"start": None, "end": None}
-        onsets = []
-
-        for i in range(len(frames)):
-            if frames[i] and note["start"] is None:
-                note["start"] = i
-            elif not frames[i] and note["start"] is not None:  # note turned off
-                note["end"] = i
-                onsets.append(note)
-                note = {"start": None, "end": None}
-        return onsets
+        starts, ends = self.get_segments(np.asarray(frames) > 0)
+        return [{"start": s, "end": e} for s, e in zip(starts, ends)]
 
     def score_pitch(self, x, y, reduction="mean"):
-        y[y == 0] = 0.001
-        x[x == 0] = 0.001
-        d_cents = torch.abs(1200 * torch.log2(torch.abs(x / y)))
-        d_cents[torch.isnan(d_cents)] = 0
-
-        if reduction == "mean":
-            return torch.mean(d_cents)
+        y = np.where(y == 0, 0.001, y)
+        x = np.where(x == 0, 0.001, x)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d_cents = np.abs(1200 * np.log2(np.abs(x / y)))
+        d_cents[np.isnan(d_cents)] = 0
+
+        if reduction == "none":
+            return d_cents
+        elif reduction == "mean":
+            return np.mean(d_cents)
         elif reduction == "median":
-            return torch.median(d_cents)
+            return np.median(d_cents)
         elif reduction == "sum":
-            return torch.sum(d_cents)
+            return np.sum(d_cents)
         else:
             print("ERROR reduction type")
             return None
 
     def score(self, reduction="mean"):
-        trans, frames = self.get_trans_frames()
-        score_trans = self.score_pitch(self.u_f0 * trans, self.e_f0 * trans,
-                                       reduction)
-        score_frames = self.score_pitch(self.u_f0 * frames, self.e_f0 * frames,
-                                        reduction)
+        score_trans = self.score_pitch(self.u_f0 * self.trans,
+                                       self.e_f0 * self.trans, reduction)
+        score_frames = self.score_pitch(self.u_f0 * self.frames,
+                                        self.e_f0 * self.frames, reduction)
 
         return score_trans, score_frames
 
 
-path = "dataset/violin-train.pickle"
+if __name__ == "__main__":
+
+    path = "dataset/violin-train.pickle"
 
-analyzer = Analyzer(path)
-# trans, frames = analyzer.get_trans_frames()
-# midi, target = analyzer.get_all_notes()
+    analyzer = Analyzer(path)
+    # trans, frames = analyzer.get_trans_frames()
+    # midi, target = analyzer.get_all_notes()
 
-#df = analyzer.get_transitions_df()
+    #df = analyzer.get_transitions_df()
 
-df = analyzer.get_notes_df()
-print(df.dtypes)
+    df = analyzer.get_notes_df()
+    print(df.dtypes)
 
-# sns.set_theme(style="darkgrid")
+    # sns.set_theme(style="darkgrid")
 
-# g = sns.jointplot(x="pitch",
-#                   y="loudness",
-#                   data=df,
-#                   kind="kde",
-#                   hue="cat",
-#                   alpha=.7)
+    # g = sns.jointplot(x="pitch",
+    #                   y="loudness",
+    #                   data=df,
+    #                   kind="kde",
+    #                   hue="cat",
+    #                   alpha=.7)
 
-# g = sns.jointplot(x="pitch",
-#                   y="accuracy",
-#                   data=df,
-#                   kind="kde",
-#                   hue="cat",
-#                   alpha=.7)
+    # g = sns.jointplot(x="pitch",
+    #                   y="accuracy",
+    #                   data=df,
+    #                   kind="kde",
+    #                   hue="cat",
+    #                   alpha=.7)
 
-# g = sns.jointplot(x="pitch",
-#                   y="diff_cents",
-#                   data=df,
-#                   kind="kde",
-#                   hue="cat",
-#                   alpha=.7)
+    # g = sns.jointplot(x="pitch",
+    #                   y="diff_cents",
+    #                   data=df,
+    #                   kind="kde",
+    #                   hue="cat",
+    #                   alpha=.7)
 
-# g = sns.jointplot(x="loudness",
-#                   y="diff_cents",
-#                   data=df,
-#                   kind="kde",
-#                   hue="cat",
-#                   alpha=.7)
+    # g = sns.jointplot(x="loudness",
+    #                   y="diff_cents",
+    #                   data=df,
+    #                   kind="kde",
+    #                   hue="cat",
+    #                   alpha=.7)
 
-#g = sns.relplot(x=df["loudness"], y=df["diff_cents"].abs())
+    #g = sns.relplot(x=df["loudness"], y=df["diff_cents"].abs())
 
-# g = sns.jointplot(x="d_f0",
-#                   y="diff_cents",
-#                   data=df,
-#                   kind="kde",
-#                   hue="cat",
-#                   alpha=.7)
+    # g = sns.jointplot(x="d_f0",
+    #                   y="diff_cents",
+    #                   data=df,
+    #                   kind="kde",
+    #                   hue="cat",
+    #                   alpha=.7)
 
-plt.show()
\ No newline at end of file
+    plt.show()
@@ -46,28 +46,63 @@ def pctof(p, c):
 
 
 def onsets_offsets(events):
-    note_on = False
+    """ Input : events (1 note on, -1 note off)
+    Output : onsets, offsets. A note on following a note on also ends the
+    previous note on the frame before """
     onsets, offsets = np.zeros_like(events), np.zeros_like(events)
-    for i in range(len(events)):
-        if events[i] == -1:
-            note_on = False
-            offsets[i] = 1
-
-        elif events[i] == 1:
-            if note_on:
-                offsets[i - 1] = 1
-                onsets[i] = 1
-                note_on = True
-            else:
-                onsets[i] = 1
-                note_on = True
+    idx = np.flatnonzero((events == 1) | (events == -1))
+    ev = events[idx]
+
+    onsets[idx[ev == 1]] = 1
+    offsets[idx[ev == -1]] = 1
+    repeated = (ev[1:] == 1) & (ev[:-1] == 1)
+    offsets[idx[1:][repeated] - 1] = 1
 
     return onsets, offsets
 
 
+FLAGS = ["onsets", "offsets"]
+
+
+def to_storage(data, precision="float32", bitpack=False):
+    """
+    casts contours to precision (float32 or float16) and onsets / offsets
+    to uint8, or to packed bits with bitpack
+    """
+    out = {}
+    for name, x in data.items():
+        if name in FLAGS:
+            x = np.asarray(x) > 0
+            out[name] = np.packbits(x) if bitpack else x.astype(np.uint8)
+        else:
+            out[name] = np.asarray(x, dtype=precision)
+    if bitpack:
+        out["n_frames"] = len(data["u_f0"])
+    return out
+
+
+def load_dataset(path):
+    """
+    loads a dataset pickle : unpacks onsets / offsets (uint8), float16
+    contours are loaded as float32
+    """
+    with open(path, "rb") as dataset:
+        data = pickle.load(dataset)
+
+    n_frames = data.pop("n_frames", None)
+    for name, x in data.items():
+        if name in FLAGS and n_frames is not None:
+            data[name] = np.unpackbits(x, count=n_frames)
+        elif x.dtype == np.float16:
+            data[name] = x.astype(np.float32)
+    return data
+
+
 if __name__ == "__main__":
 
     ratio = 0.05  # ratio between train/test/validation and test dataset
+    PRECISION = "float32"  # or "float16"
+    BITPACK = False
 
     u_f0 = []
     u_loudness = []
@@ -110,7 +145,7 @@ if __name__ == "__main__":
     }
 
     with open("dataset/v-test.pickle", "wb") as file_out:
-        pickle.dump(test, file_out)
+        pickle.dump(to_storage(test, PRECISION, BITPACK), file_out)
 
         test = {
             "u_f0": u_f0[cut_idx:cut_idx * 2],
@@ -123,7 +158,7 @@ if __name__ == "__main__":
         }
 
     with open("dataset/v-valid.pickle", "wb") as file_out:
-        pickle.dump(test, file_out)
+        pickle.dump(to_storage(test, PRECISION, BITPACK), file_out)
 
     u_f0 = u_f0[cut_idx * 2:]
     u_loudness = u_loudness[cut_idx * 2:]
@@ -203,7 +238,7 @@ if __name__ == "__main__":
     ext = "-da" if DATA_AUGMENTATION else ""
     name = "v-train{}.pickle".format(ext)
     with open("dataset/" + name, "wb") as file_out:
-        pickle.dump(out, file_out)
+        pickle.dump(to_storage(out, PRECISION, BITPACK), file_out)
 
     print(
         "Train dataset length : {}min {}s \n Test dataset length : {}min {}s".
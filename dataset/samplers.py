@@ -0,0 +1,123 @@
+import numpy as np
+from torch.utils.data import Sampler
+
+
+class OnsetSampler(Sampler):
+    def __init__(self,
+                 onsets,
+                 n_sample,
+                 epoch_size=None,
+                 pitch=None,
+                 n_bins=8,
+                 boundaries=None,
+                 lead=0,
+                 seed=None):
+        """ Draws windows of n_sample frames starting lead frames before a
+        note onset. Every onset whose window fits (inside its piece when the
+        piece boundaries are given) is a candidate. With pitch (contour of
+        the pitch at every frame), onsets are grouped in n_bins pitch ranges
+        and each window draws its range first : low and high notes are seen
+        as often as the middle of the tessitura.
+        Yields window start frames, epoch_size per epoch (default : one per
+        candidate onset). """
+
+        onsets = np.asarray(onsets)
+        N = onsets.shape[0]
+        starts = np.flatnonzero(onsets > 0) - lead
+
+        if boundaries is None:
+            boundaries = [0, N]
+        boundaries = np.asarray(boundaries)
+        piece = np.searchsorted(boundaries, starts + lead, side="right") - 1
+        valid = (starts >= boundaries[piece]) & (starts + n_sample <=
+                                                 boundaries[piece + 1])
+        self.starts = starts[valid]
+        if self.starts.shape[0] == 0:
+            raise ValueError("no onset window of {} frames".format(n_sample))
+
+        self.epoch_size = epoch_size or self.starts.shape[0]
+        self.rng = np.random.default_rng(seed)
+
+        self.bins = None
+        if pitch is not None:
+            p = np.asarray(pitch)[self.starts + lead]
+            edges = np.linspace(p.min(), p.max(), n_bins + 1)[1:-1]
+            bins = np.searchsorted(edges, p, side="right")
+            # candidates grouped by range, empty ranges dropped
+            order = np.argsort(bins, kind="stable")
+            self.starts = self.starts[order]
+            counts = np.bincount(bins, minlength=n_bins)
+            self.counts = counts[counts > 0]
+            self.bins = np.cumsum(self.counts) - self.counts
+
+    def __len__(self):
+        return self.epoch_size
+
+    def sample(self, n):
+        """ Output : n window starts """
+        if self.bins is None:
+            k = self.rng.integers(0, self.starts.shape[0], n)
+        else:
+            b = self.rng.integers(0, self.bins.shape[0], n)
+            k = self.bins[b] + (self.rng.random(n) * self.counts[b]).astype(
+                np.int64)
+        return self.starts[k]
+
+    def __iter__(self):
+        return iter(self.sample(self.epoch_size).tolist())
+
+
+class WindowBatchSampler(Sampler):
+    def __init__(self,
+                 sampler,
+                 batch_size,
+                 drop_last=False,
+                 rank=0,
+                 world_size=1,
+                 pad=True):
+        """ Yields whole batches of indexes, to be fetched at once by the
+        dataset (DataLoader(dataset, batch_size=None, sampler=...)).
+        Batches of an OnsetSampler are drawn directly as arrays.
+        With world_size processes (data parallel training), the indexes of
+        an epoch are split in world_size contiguous shards and the process
+        of rank rank gets one of them. Shards are completed by wrapping
+        around so that every process runs as many steps. Without pad, the
+        indexes left over are dropped instead : no index is seen twice in
+        an epoch (validation). """
+        self.sampler = sampler
+        self.batch_size = batch_size
+        self.drop_last = drop_last
+        self.rank = rank
+        self.world_size = world_size
+        self.pad = pad
+
+    def get_shard_size(self):
+        if self.pad:
+            return -(-len(self.sampler) // self.world_size)
+        return len(self.sampler) // self.world_size
+
+    def __len__(self):
+        if self.drop_last:
+            return self.get_shard_size() // self.batch_size
+        return -(-self.get_shard_size() // self.batch_size)
+
+    def __iter__(self):
+        if isinstance(self.sampler, OnsetSampler):
+            idx = self.sampler.sample(len(self.sampler))
+        else:
+            idx = np.fromiter(iter(self.sampler), np.int64, len(self.sampler))
+
+        if self.world_size > 1:
+            n = self.get_shard_size()
+            idx = np.resize(idx, n * self.world_size) if self.pad else idx
+            idx = idx[self.rank * n:(self.rank + 1) * n]
+
+        for b in range(len(self)):
+            yield idx[b * self.batch_size:(b + 1) * self.batch_size]
+
+
+def get_boundaries(shards):
+    """ Input : ShardedContours
+    Output : piece boundaries in the concatenated columns """
+    lengths = [piece[3] for piece in shards.pieces]
+    return np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
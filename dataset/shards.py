@@ -0,0 +1,263 @@
+import csv
+import glob
+import os
+import zlib
+import numpy as np
+
+from contours_store import ContoursStore
+from make_dataset import onsets_offsets
+
+
+class ShardedContours:
+
+    COLUMNS = [
+        "u_f0", "u_loudness", "e_f0", "e_loudness", "f0_conf", "onsets",
+        "offsets"
+    ]
+
+    FLAGS = ["onsets", "offsets"]
+
+    def __init__(self,
+                 path,
+                 mode="r",
+                 max_shard_frames=6000000,
+                 precision="float32"):
+        """ Dataset split stored as shards. Every shard holds whole pieces,
+        one .npy file per column, and pieces.csv records the
+        (piece, shard, start, length) of every piece. Window indexes
+        windows-{n_sample}-{hop}.npy list the (piece, shard, start) of
+        every window fitting in a piece. Appending pieces writes new
+        shards and extends the indexes, existing shards are never
+        rewritten. Contours are written with the given precision (float32
+        or float16), onsets and offsets as uint8. """
+
+        self.path = path
+        self.mode = mode
+        self.max_shard_frames = max_shard_frames
+        self.precision = precision
+        self.pieces_path = os.path.join(path, "pieces.csv")
+
+        if mode == "a":
+            os.makedirs(path, exist_ok=True)
+
+        self.pieces = []  # (piece, shard, start, length)
+        if os.path.exists(self.pieces_path):
+            with open(self.pieces_path) as pieces:
+                for row in csv.DictReader(pieces):
+                    self.pieces.append((row["piece"], int(row["shard"]),
+                                        int(row["start"]), int(row["length"])))
+
+        self.names = set(piece[0] for piece in self.pieces)
+        self.n_shards = max([piece[1] for piece in self.pieces], default=-1) + 1
+        self.shards = {}
+
+    def shard_path(self, shard, column):
+        return os.path.join(self.path, "{:05d}-{}.npy".format(shard, column))
+
+    def index_path(self, n_sample, hop):
+        return os.path.join(self.path,
+                            "windows-{}-{}.npy".format(n_sample, hop))
+
+    def __len__(self):
+        return sum(piece[3] for piece in self.pieces)
+
+    def append(self, pieces):
+        """ Input : iterable of (name, columns dict) pieces. Pieces already
+        stored are skipped, the others are grouped in new shards of about
+        max_shard_frames frames """
+
+        if self.mode != "a":
+            raise ValueError("shards opened in read mode")
+
+        batch, length = [], 0
+        for name, columns in pieces:
+            if name in self.names:
+                continue
+            batch.append((name, columns))
+            length += len(columns["u_f0"])
+            if length >= self.max_shard_frames:
+                self.write_shard(batch)
+                batch, length = [], 0
+
+        if batch:
+            self.write_shard(batch)
+
+    def write_shard(self, batch):
+        shard = self.n_shards
+
+        for column in self.COLUMNS:
+            dtype = np.uint8 if column in self.FLAGS else self.precision
+            np.save(
+                self.shard_path(shard, column),
+                np.concatenate([columns[column]
+                                for _, columns in batch]).astype(dtype))
+
+        new_pieces = []
+        start = 0
+        for name, columns in batch:
+            new_pieces.append((name, shard, start, len(columns["u_f0"])))
+            start += len(columns["u_f0"])
+
+        # indexes are extended before the pieces are registered : an
+        # interrupted build leaves an unreferenced shard, and index windows
+        # of unregistered pieces, dropped by load_index
+        for index_path in glob.glob(os.path.join(self.path, "windows-*.npy")):
+            n_sample, hop = os.path.basename(index_path)[8:-4].split("-")
+            windows = self.make_windows(new_pieces, len(self.pieces),
+                                        int(n_sample), int(hop))
+            self.save_index(
+                index_path,
+                np.concatenate([self.load_index(index_path), windows]))
+
+        new_index = not os.path.exists(self.pieces_path)
+        with open(self.pieces_path, "a", newline="") as pieces:
+            writer = csv.writer(pieces)
+            if new_index:
+                writer.writerow(["piece", "shard", "start", "length"])
+            writer.writerows(new_pieces)
+
+        self.pieces += new_pieces
+        self.names.update(piece[0] for piece in new_pieces)
+        self.n_shards += 1
+
+    def make_windows(self, pieces, first_piece, n_sample, hop):
+        """ Output : (piece, shard, start) of the windows of n_sample frames
+        (every hop frames) inside each piece """
+        windows = [np.zeros((0, 3), dtype=np.int64)]
+        for i, (_, shard, start, length) in enumerate(pieces):
+            starts = np.arange(0, length - n_sample + 1, hop)
+            windows.append(
+                np.stack([
+                    np.full_like(starts, first_piece + i),
+                    np.full_like(starts, shard), start + starts
+                ], 1))
+        return np.concatenate(windows)
+
+    def load_index(self, index_path):
+        """ Output : windows of the index, but the ones of pieces not
+        registered in pieces.csv (interrupted build) """
+        windows = np.load(index_path)
+        return windows[windows[:, 0] < len(self.pieces)]
+
+    def save_index(self, index_path, windows):
+        """ Writes a complete index file or none """
+        tmp = index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, windows)
+        os.replace(tmp, index_path)
+
+    def get_index(self, n_sample, hop=None):
+        """ Loads (or builds and saves) the window index """
+        hop = hop or n_sample
+        index_path = self.index_path(n_sample, hop)
+        if os.path.exists(index_path):
+            return self.load_index(index_path)
+
+        windows = self.make_windows(self.pieces, 0, n_sample, hop)
+        if self.mode == "a":
+            self.save_index(index_path, windows)
+        return windows
+
+    def get_starts(self, n_sample, hop=None):
+        """ Output : start frames of the windows of the index in the
+        concatenated columns (see get_column) """
+        windows = self.get_index(n_sample, hop)
+        piece_starts = np.array([piece[2] for piece in self.pieces],
+                                dtype=np.int64)
+        lengths = np.array([piece[3] for piece in self.pieces],
+                           dtype=np.int64)
+        # first frame of every piece in the concatenated columns
+        firsts = np.cumsum(lengths) - lengths
+        piece = windows[:, 0]
+        return firsts[piece] + windows[:, 2] - piece_starts[piece]
+
+    def get_shard(self, shard):
+        if shard not in self.shards:
+            self.shards[shard] = {
+                column: np.load(self.shard_path(shard, column), mmap_mode="r")
+                for column in self.COLUMNS
+            }
+        return self.shards[shard]
+
+    def get_window(self, shard, start, n_sample):
+        """ Output : dict of column slices [start, start + n_sample[ """
+        columns = self.get_shard(shard)
+        return {c: x[start:start + n_sample] for c, x in columns.items()}
+
+    def get_column(self, column):
+        """ Output : whole column, pieces in order """
+        return np.concatenate([
+            self.get_shard(shard)[column][start:start + length]
+            for _, shard, start, length in self.pieces
+        ]) if self.pieces else np.zeros(0)
+
+
+def get_split(name, ratio=0.05):
+    """ Stable piece-wise split : a piece always goes to the same split,
+    whenever it is added """
+    h = zlib.crc32(name.encode()) % 10000 / 10000
+    if h < ratio:
+        return "test"
+    if h < 2 * ratio:
+        return "valid"
+    return "train"
+
+
+def read_pieces(store, names=None):
+    """ Input : ContoursStore of tracks, names of the tracks to read
+    (default : all)
+    Output : (name, columns) of every track """
+    for name in store.index if names is None else names:
+        track = store.get(name)
+        onsets, offsets = onsets_offsets(np.asarray(track["events"]))
+        yield name, {
+            "u_f0": np.asarray(track["u_f0"]),
+            "u_loudness": np.asarray(track["u_loudness"]),
+            "e_f0": np.asarray(track["e_f0"]),
+            "e_loudness": np.asarray(track["e_loudness"]),
+            "f0_conf": np.asarray(track["f0_conf"]),
+            "onsets": onsets,
+            "offsets": offsets,
+        }
+
+
+def build_shards(store_path,
+                 path,
+                 ratio=0.05,
+                 n_sample=2048,
+                 precision="float32"):
+    """ Adds the tracks of the store not yet in the {path}-{split} shards.
+    Tracks are dispatched by name, only the new ones are read (once) """
+    store = ContoursStore(store_path)
+    splits = {
+        split: ShardedContours("{}-{}".format(path, split),
+                               mode="a",
+                               precision=precision)
+        for split in ["train", "valid", "test"]
+    }
+
+    stored = set().union(*[shards.names for shards in splits.values()])
+    names = {split: [] for split in splits}
+    for name in store.index:
+        if name not in stored:
+            names[get_split(name, ratio)].append(name)
+
+    for split, shards in splits.items():
+        if not shards.names and not names[split]:
+            print("Warning : no piece in the {} split ({} pieces, ratio {})".
+                  format(split, len(store.index), ratio))
+
+        shards.get_index(n_sample)  # indexes are then kept up to date
+        shards.append(read_pieces(store, names[split]))
+
+    return splits
+
+
+if __name__ == "__main__":
+
+    splits = build_shards("dataset/contours-violin-update", "dataset/v")
+
+    for split, shards in splits.items():
+        print("{} : {} pieces, {}min {}s, {} windows".format(
+            split, len(shards.pieces), (len(shards) // 100) // 60,
+            (len(shards) // 100) % 60, len(shards.get_index(2048))))
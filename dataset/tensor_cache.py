@@ -0,0 +1,101 @@
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+import uuid
+import numpy as np
+import torch
+
+
+class TensorCache:
+
+    # bump to invalidate every cache when the format changes
+    VERSION = 1
+
+    def __init__(self, dataset_file, list_transforms, cls,
+                 path="dataset/cache"):
+        """ Cache of the preprocessed (float32) tensors of a dataset and of
+        its fitted scalers. The key depends on the dataset file (path, size,
+        modification time), on the transforms (classes and arguments) and on
+        the source code of the dataset and transform classes : any change
+        builds a new cache. Tensors are loaded memory-mapped. """
+
+        self.key = self.get_key(dataset_file, list_transforms, cls)
+        self.path = os.path.join(path, "{}-{}".format(cls.__name__, self.key))
+
+    def get_key(self, dataset_file, list_transforms, cls):
+        h = hashlib.sha1(str(self.VERSION).encode())
+
+        stat = os.stat(dataset_file)
+        h.update("{} {} {}".format(os.path.abspath(dataset_file),
+                                   stat.st_size,
+                                   stat.st_mtime_ns).encode())
+
+        classes = [cls]
+        for transform in list_transforms or []:
+            classes.append(transform[0])
+            h.update("{}.{} {}".format(transform[0].__module__,
+                                       transform[0].__qualname__,
+                                       repr(transform[1:])).encode())
+
+        for source in sorted(set(map(self.get_source_file, classes))):
+            with open(source, "rb") as f:
+                h.update(f.read())
+
+        return h.hexdigest()[:16]
+
+    def get_source_file(self, cls):
+        try:
+            return inspect.getsourcefile(cls) or os.devnull
+        except TypeError:
+            return os.devnull
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, "scalers.pickle"))
+
+    def save(self, tensors, scalers):
+        """ Input : dict of tensors, fitted scalers. Several processes can
+        save the same cache at once (data parallel training) : each one
+        writes its own directory, the first renamed one is kept """
+        tmp = "{}.tmp-{}".format(self.path, uuid.uuid4().hex)
+        os.makedirs(tmp)
+        for name, x in tensors.items():
+            np.save(os.path.join(tmp, name + ".npy"),
+                    x.numpy().astype(np.float32))
+        with open(os.path.join(tmp, "scalers.pickle"), "wb") as f:
+            pickle.dump(scalers, f)
+
+        # complete caches only, never replaced once there
+        try:
+            os.rename(tmp, self.path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not self.exists():
+                raise
+
+    def load(self):
+        """ Output : dict of (memory-mapped, copy on write) tensors, scalers """
+        tensors = {}
+        for f in sorted(os.listdir(self.path)):
+            if f.endswith(".npy"):
+                x = np.load(os.path.join(self.path, f), mmap_mode="c")
+                tensors[f[:-4]] = torch.from_numpy(x)
+
+        with open(os.path.join(self.path, "scalers.pickle"), "rb") as f:
+            scalers = pickle.load(f)
+        return tensors, scalers
+
+    def load_or_build(self, obj, build, names):
+        """ Input : dataset, function preprocessing it (sets its tensors and
+        its scalers), names of the tensors to cache
+        Sets the tensors and the scalers of obj, loaded from the cache or
+        built then saved """
+        if self.exists():
+            tensors, obj.scalers = self.load()
+            for name in names:
+                setattr(obj, name, tensors[name])
+        else:
+            build()
+            self.save({name: getattr(obj, name)
+                       for name in names}, obj.scalers)
@@ -0,0 +1,153 @@
+import torch
+import torch.nn as nn
+
+# same bounds as sklearn's QuantileTransformer
+BOUNDS_THRESHOLD = 1e-7
+SPACING = 2.220446049250313e-16
+
+
+def interp(x, xp, fp):
+    """ np.interp for tensors : piecewise linear interpolation of the points
+    (xp, fp), xp increasing, constant outside [xp[0], xp[-1]] """
+    j = torch.searchsorted(xp, x.contiguous(), right=True) - 1
+    j = j.clamp(0, xp.shape[0] - 2)
+    dx = xp[j + 1] - xp[j]
+    slope = (fp[j + 1] - fp[j]) / torch.where(dx > 0, dx, torch.ones_like(dx))
+    y = fp[j] + slope * (x - xp[j])
+    y = torch.where(x < xp[0], fp[0], y)
+    return torch.where(x >= xp[-1], fp[-1], y)
+
+
+class TorchIdentity(nn.Module):
+    def transform(self, x):
+        return x
+
+    def inverse_transform(self, x):
+        return x
+
+    def forward(self, x):
+        return self.transform(x)
+
+
+class TorchMinMaxScaler(nn.Module):
+    def __init__(self, scale, min):
+        """ MinMaxScaler of one feature : x * scale + min """
+        super().__init__()
+        self.register_buffer("scale", torch.tensor(float(scale)))
+        self.register_buffer("min", torch.tensor(float(min)))
+
+    def transform(self, x):
+        return x * self.scale + self.min
+
+    def inverse_transform(self, x):
+        return (x - self.min) / self.scale
+
+    def forward(self, x):
+        return self.transform(x)
+
+
+class TorchQuantileTransformer(nn.Module):
+    def __init__(self, quantiles, references, output_distribution="normal"):
+        """ QuantileTransformer of one feature. The quantiles table is a
+        buffer, transforms interpolate it on the device of the input """
+        super().__init__()
+        self.register_buffer("quantiles",
+                             torch.as_tensor(quantiles, dtype=torch.float))
+        self.register_buffer("references",
+                             torch.as_tensor(references, dtype=torch.float))
+        self.output_distribution = output_distribution
+
+        bound = torch.tensor(BOUNDS_THRESHOLD - SPACING, dtype=torch.double)
+        self.clip_min = float(torch.special.ndtri(bound))
+        self.clip_max = float(torch.special.ndtri(1 - bound))
+
+    def get_bounds(self, x, lower, upper):
+        if self.output_distribution == "normal":
+            return x - BOUNDS_THRESHOLD < lower, x + BOUNDS_THRESHOLD > upper
+        return x == lower, x == upper
+
+    def transform(self, x):
+        q, r = self.quantiles, self.references
+        lower, upper = self.get_bounds(x, q[0], q[-1])
+
+        # mean of both interpolation directions, for repeated quantiles
+        y = 0.5 * (interp(x, q, r) - interp(-x, -q.flip(0), -r.flip(0)))
+        y = torch.where(upper, torch.ones_like(y), y)
+        y = torch.where(lower, torch.zeros_like(y), y)
+
+        if self.output_distribution == "normal":
+            y = torch.special.ndtri(y).clamp(self.clip_min, self.clip_max)
+        return y
+
+    def inverse_transform(self, x):
+        q, r = self.quantiles, self.references
+        if self.output_distribution == "normal":
+            x = torch.special.ndtr(x)
+        lower, upper = self.get_bounds(x, 0, 1)
+
+        y = interp(x, r, q)
+        y = torch.where(upper, q[-1], y)
+        return torch.where(lower, q[0], y)
+
+    def forward(self, x):
+        return self.transform(x)
+
+
+class TorchPitchTransformer(nn.Module):
+    def __init__(self, sc1):
+        """ PitchTransformer : quantiles of the midi pitch, divided by 10 """
+        super().__init__()
+        self.sc1 = sc1
+
+    def mtof(self, m):
+        return 440 * 2**((m - 69) / 12)
+
+    def ftom(self, f):
+        m = 12 * torch.log2(f / 440) + 69
+        return m.clamp(0, 128)
+
+    def transform(self, x):
+        return self.sc1.transform(self.ftom(x)) / 10
+
+    def inverse_transform(self, x):
+        return self.mtof(self.sc1.inverse_transform(x * 10))
+
+    def forward(self, x):
+        return self.transform(x)
+
+
+class TorchLoudnessTransformer(nn.Module):
+    def __init__(self, sc1):
+        """ LoudnessTransformer : quantiles of the loudness, divided by 10 """
+        super().__init__()
+        self.sc1 = sc1
+
+    def transform(self, x):
+        return self.sc1.transform(x) / 10
+
+    def inverse_transform(self, x):
+        return self.sc1.inverse_transform(x * 10)
+
+    def forward(self, x):
+        return self.transform(x)
+
+
+def from_sklearn(scaler):
+    """ Input : scaler fitted with sklearn (one feature)
+    Output : the equivalent torch module """
+    name = type(scaler).__name__
+
+    if name == "Identity":
+        return TorchIdentity()
+    if name == "MinMaxScaler":
+        return TorchMinMaxScaler(scaler.scale_[0], scaler.min_[0])
+    if name == "QuantileTransformer":
+        return TorchQuantileTransformer(scaler.quantiles_[:, 0],
+                                        scaler.references_,
+                                        scaler.output_distribution)
+    if name == "PitchTransformer":
+        return TorchPitchTransformer(from_sklearn(scaler.sc1))
+    if name == "LoudnessTransformer":
+        return TorchLoudnessTransformer(from_sklearn(scaler.sc1))
+
+    raise ValueError("no torch version of {}".format(name))
@@ -5,35 +5,86 @@ from sklearn.preprocessing import StandardScaler, MinMaxScaler, QuantileTransfor
 import pytorch_lightning as pl
 import pickle
 import numpy as np
-from random import randint
+import sys
+
+sys.path.insert(0, "dataset")
+from samplers import OnsetSampler, get_boundaries
+from shards import ShardedContours
+from tensor_cache import TensorCache
+from torch_transforms import from_sklearn
+from make_dataset import load_dataset
 
 
 class DiffusionDataset(Dataset):
+
+    # preprocessed tensors kept in the TensorCache
+    CACHED = ["contours"]
+
     def __init__(self,
                  instrument,
                  data_augmentation=False,
                  type_set="train",
                  n_sample=2048,
                  list_transforms=None,
-                 eval=False):
-
-        da = "-da" if data_augmentation else ""
-        path = "dataset/{}-{}{}.pickle".format(instrument[0], type_set, da)
-        print("{} dataset file used : {}".format(type_set, path))
-        print("Loading Dataset...")
-        with open(path, "rb") as dataset:
-            dataset = pickle.load(dataset)
+                 eval=False,
+                 shards=None,
+                 aligned=False):
+        """ With shards (path prefix given to dataset/shards.py
+        build_shards), the {shards}-{type_set} shards are used instead of
+        the pickle : items are the windows of the shards index and windows
+        never cross a piece boundary. Shard columns are only read to build
+        the cache, the contours are then memory-mapped from it. With
+        aligned, items are indexed by their start frame, as drawn by the
+        sampler of get_sampler. """
+
+        self.store = None
+        self.boundaries = None
+        self.window_starts = None
+        if shards is None:
+            da = "-da" if data_augmentation else ""
+            path = "dataset/{}-{}{}.pickle".format(instrument[0], type_set,
+                                                   da)
+            print("{} dataset file used : {}".format(type_set, path))
+            print("Loading Dataset...")
+            dataset = load_dataset(path)
+        else:
+            self.store = ShardedContours("{}-{}".format(shards, type_set))
+            path = self.store.pieces_path
+            print("{} shards used : {}".format(type_set, self.store.path))
+            print("Loading Dataset...")
+            dataset = None  # read by get_column when needed
+            self.boundaries = get_boundaries(self.store)
+            self.window_starts = self.store.get_starts(n_sample)
 
         self.dataset = dataset
-        self.N = len(dataset["u_f0"])
+        self.N = len(self.store) if dataset is None else len(dataset["u_f0"])
         self.n_sample = n_sample
         self.list_transforms = list_transforms
 
-        self.scalers = self.fit_transforms()
-        self.transform()
+        TensorCache(path, list_transforms,
+                    type(self)).load_or_build(self, self.preprocess,
+                                              self.CACHED)
+        # views of the contours, also after a cache load
+        self.set_contours(self.contours)
+        self.transforms = [from_sklearn(sc) for sc in self.scalers]
         self.eval = eval
+        self.aligned = aligned
         print("Dataset loaded. Length : {}min".format(self.N // 6000))
 
+    def preprocess(self):
+        if self.store is not None:
+            self.dataset = {c: self.get_column(c) for c in self.store.COLUMNS}
+        self.scalers = self.fit_transforms()
+        self.transform()
+        if self.store is not None:
+            self.dataset = None
+
+    def get_column(self, column):
+        """ Output : raw column of the dataset (read from the shards) """
+        if self.dataset is not None:
+            return self.dataset[column]
+        return self.store.get_column(column).astype(np.float32)
+
     def fit_transforms(self):
         scalers = []
 
@@ -77,24 +128,43 @@ class DiffusionDataset(Dataset):
         self.u_f0 = torch.from_numpy(self.u_f0).float()
         self.e_f0 = torch.from_numpy(self.e_f0).float()
         self.e_lo = torch.from_numpy(self.e_lo).float()
-        self.u_lo = self.get_quantized_loudness(self.e_lo, self.onsets,
-                                                self.offsets)
+        # per piece : no note spans two pieces
+        pieces = [0, self.N] if self.boundaries is None else self.boundaries
+        self.u_lo = torch.cat([
+            self.get_quantized_loudness(self.e_lo[a:b], self.onsets[a:b],
+                                        self.offsets[a:b])
+            for a, b in zip(pieces[:-1], pieces[1:])
+        ])
+
+        self.set_contours(
+            torch.stack([
+                self.e_f0, self.e_lo, self.u_f0, self.u_lo, self.onsets,
+                self.offsets
+            ]))
+
+    def set_contours(self, contours):
+        """ Input : channel-stacked contours [6, N]. Sets the contours as
+        views of it, and the view of all their windows
+        [6, N - n_sample + 1, n_sample] (no copy) """
+        self.contours = contours
+        self.e_f0, self.e_lo, self.u_f0, self.u_lo, self.onsets, \
+            self.offsets = contours
+        self.windows = self.contours.unfold(1, self.n_sample, 1)
 
     def apply_transform(self, x, scaler):
         out = scaler.transform(x.reshape(-1, 1)).squeeze(-1)
         return out
 
     def inverse_transform(self, x):
+        """ Output : f0, lo numpy arrays """
 
         f0, lo = torch.split(x, 1, -1)
-        f0 = f0.reshape(-1, 1).cpu().numpy()
-        lo = lo.reshape(-1, 1).cpu().numpy()
 
-        # Inverse transforms
-        f0 = self.scalers[0].inverse_transform(f0).reshape(-1)
-        lo = self.scalers[1].inverse_transform(lo).reshape(-1)
+        # Inverse transforms, on the device of x
+        f0 = self.transforms[0].to(x.device).inverse_transform(f0)
+        lo = self.transforms[1].to(x.device).inverse_transform(lo)
 
-        return f0, lo
+        return f0.reshape(-1).cpu().numpy(), lo.reshape(-1).cpu().numpy()
 
     def get_quantized_loudness(self, e_l0, onsets, offsets):
         e = torch.abs(onsets + offsets)
@@ -112,18 +182,71 @@ class DiffusionDataset(Dataset):
                 e_l0[indexes[i]:indexes[i + 1]])
         return u_l0
 
+    def get_sampler(self, epoch_size=None, stratify=False, lead=0, seed=None):
+        """ Sampler of windows starting at note onsets, epoch_size windows
+        per epoch. With stratify, windows are drawn uniformly over the
+        pitch ranges. It yields start frames : the dataset must be
+        aligned. """
+        if not self.aligned:
+            raise ValueError("get_sampler needs a dataset built with "
+                             "aligned=True (items indexed by start frame)")
+        pitch = np.log2(np.maximum(self.get_column("u_f0"), 1e-5))
+        return OnsetSampler(self.get_column("onsets"),
+                            self.n_sample,
+                            epoch_size,
+                            pitch=pitch if stratify else None,
+                            boundaries=self.boundaries,
+                            lead=lead,
+                            seed=seed)
+
     def __len__(self):
+        if self.window_starts is not None:
+            return len(self.window_starts)
         return self.N // self.n_sample
 
-    def __getitem__(self, idx):
+    def get_starts(self, idx):
+        """ Input : array of item indexes (window starts if aligned)
+        Output : window start frames (with jitter during training) """
+        idx = np.asarray(idx, dtype=np.int64)
+        if self.aligned:
+            return idx
+
         N = self.n_sample
-        idx *= N
+        if self.window_starts is None:
+            starts = idx * N
+            end = len(self) * N
+        else:
+            # jittered windows stay inside their piece
+            starts = self.window_starts[idx]
+            piece = np.searchsorted(self.boundaries, starts, side="right")
+            end = self.boundaries[piece]
 
-        # add jitter during training only
         if not self.eval:
-            idx += randint(0, N // 10)
-        idx = max(idx, 0)
-        idx = min(idx, len(self) * self.n_sample - self.n_sample)
+            starts = starts + np.random.randint(0, N // 10 + 1, idx.shape)
+        return np.clip(starts, 0, end - N)
+
+    def get_batch(self, idx):
+        """ Input : array of item indexes
+        Output : the whole batch, gathered at once from the windows view :
+        model_input, cdt [B, n_sample, 2] (and onsets, offsets
+        [B, n_sample] in eval mode) """
+        starts = torch.from_numpy(self.get_starts(idx))
+        batch = self.windows[:, starts].permute(1, 2, 0).contiguous()
+
+        model_input = batch[..., 0:2]
+        cdt = batch[..., 2:4]
+        if self.eval:
+            return model_input, cdt, batch[..., 4], batch[..., 5]
+
+        return model_input, cdt
+
+    def __getitem__(self, idx):
+        if not np.isscalar(idx):
+            # list of indexes from a WindowBatchSampler
+            return self.get_batch(idx)
+
+        # window start (with jitter during training only)
+        idx = int(self.get_starts([idx])[0])
 
         s_u_f0 = self.u_f0[idx:idx + self.n_sample]
         s_u_lo = self.u_lo[idx:idx + self.n_sample]
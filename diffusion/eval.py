@@ -15,7 +15,10 @@ from transforms import PitchTransformer, LoudnessTransformer
 import numpy as np
 from tqdm import tqdm
 
-import pickle
+import sys
+
+sys.path.insert(0, "results")
+from results_store import ResultsStore
 
 list_transforms = [
     (PitchTransformer, {}),
@@ -36,21 +39,8 @@ model = Network.load_from_checkpoint(
 model.set_noise_schedule()
 model.ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
 
-# Initialize data :
-
-sample = np.empty(0)
-time = np.empty(0)
-
-# samples data
-
-u_f0 = np.empty(0)
-u_lo = np.empty(0)
-e_f0 = np.empty(0)
-e_lo = np.empty(0)
-pred_f0 = np.empty(0)
-pred_lo = np.empty(0)
-onsets = np.empty(0)
-offsets = np.empty(0)
+store = ResultsStore("results/store", mode="a")
+model_id = "diffusion-{}".format(inst)
 
 # Prediction loops :
 
@@ -65,41 +55,16 @@ for i in tqdm(range(N_EXAMPLE)):
     midi_f0, midi_lo = dataset.inverse_transform(midi)
     target_f0, target_lo = dataset.inverse_transform(target)
 
-    # sample information
-
-    sample_idx = np.ones_like(f0) * i
-    t = np.arange(len(f0)) / 100  # sr = 100
-
-    sample = np.concatenate((sample, sample_idx))
-    time = np.concatenate((time, t))
-
     # add to results:
 
-    u_f0 = np.concatenate((u_f0, midi_f0.squeeze()))
-    u_lo = np.concatenate((u_lo, midi_lo.squeeze()))
-
-    e_f0 = np.concatenate((e_f0, target_f0.squeeze()))
-    e_lo = np.concatenate((e_lo, target_lo.squeeze()))
-
-    pred_f0 = np.concatenate((pred_f0, f0.squeeze()))
-    pred_lo = np.concatenate((pred_lo, lo.squeeze()))
-
-    onsets = np.concatenate((onsets, ons.squeeze()))
-    offsets = np.concatenate((offsets, offs.squeeze()))
-
-out = {
-    "sample": sample,
-    "time": time,
-    "u_f0": u_f0,
-    "u_lo": u_lo,
-    "e_f0": e_f0,
-    "e_lo": e_lo,
-    "pred_f0": pred_f0,
-    "pred_lo": pred_lo,
-    "onsets": onsets,
-    "offsets": offsets
-}
-
-with open("results/diffusion/data/{}-results.pickle".format(inst),
-          "wb") as file_out:
-    pickle.dump(out, file_out)
+    store.append(model_id,
+                 i,
+                 replace=True,
+                 u_f0=midi_f0,
+                 u_lo=midi_lo,
+                 e_f0=target_f0,
+                 e_lo=target_lo,
+                 pred_f0=f0,
+                 pred_lo=lo,
+                 onsets=ons.numpy(),
+                 offsets=offs.numpy())
@@ -1,18 +1,22 @@
+import os
 import torch
 import pytorch_lightning as pl
 from pytorch_lightning import loggers as pl_loggers
+from pytorch_lightning.strategies import DDPStrategy
 
 from torch import nn
 from utils import FiLM
 from downsampling import DBlock
 from upsampling import UBlock
 from diffusion_mse import DiffusionModel
-from torch.utils.data import DataLoader, Dataset, random_split
+from torch.utils.data import DataLoader, Dataset, random_split, SequentialSampler
 from model import UNet_Diffusion
 
 from sklearn.preprocessing import QuantileTransformer, MinMaxScaler
 from transforms import PitchTransformer, LoudnessTransformer
 from diffusion_dataset import DiffusionDataset
+from samplers import WindowBatchSampler
+from torch_transforms import from_sklearn
 import matplotlib.pyplot as plt
 import math
 
@@ -34,8 +38,10 @@ class Network(pl.LightningModule, DiffusionModel):
                                     up_dilations=up_dilations)
 
         self.scalers = scalers
+        self.transforms = [from_sklearn(sc) for sc in scalers or []]
         self.ddsp = None
         self.val_idx = 0
+        self.last_val_batch = None
 
     def neural_pass(self, x, cdt, noise_level):
 
@@ -64,26 +70,25 @@ class Network(pl.LightningModule, DiffusionModel):
 
         model_input, cdt = batch
         loss = self.compute_loss(model_input, cdt)
-        self.log("val_loss", loss)
+        # averaged over the processes in data parallel training
+        self.log("val_loss", loss, sync_dist=True)
 
-        # returns cdt for validation end epoch
-        return (model_input, cdt)
+        # kept for validation end epoch
+        self.last_val_batch = (model_input, cdt)
 
     def post_process(self, out):
 
         f0, l0 = torch.split(out, 1, -1)
-        f0 = f0.reshape(-1, 1).cpu().numpy()
-        l0 = l0.reshape(-1, 1).cpu().numpy()
 
-        # Inverse transforms
-        f0 = self.scalers[0].inverse_transform(f0).reshape(-1)
-        l0 = self.scalers[1].inverse_transform(l0).reshape(-1)
-        return f0, l0
+        # Inverse transforms, on the device of out
+        f0 = self.transforms[0].to(out.device).inverse_transform(f0)
+        l0 = self.transforms[1].to(out.device).inverse_transform(l0)
+        return f0.reshape(-1), l0.reshape(-1)
 
-    def validation_epoch_end(self, outs):
+    def on_validation_epoch_end(self):
 
         # test for last cdt
-        model_input, cdt = outs[-1]
+        model_input, cdt = self.last_val_batch
 
         self.val_idx += 1
 
@@ -117,16 +122,16 @@ class Network(pl.LightningModule, DiffusionModel):
         f0, lo = self.post_process(out[0])
         midi_f0, midi_lo = self.post_process(cdt[0])
 
-        plt.plot(midi_f0)
-        plt.plot(f0)
+        plt.plot(midi_f0.cpu())
+        plt.plot(f0.cpu())
         self.logger.experiment.add_figure("pitch", plt.gcf(), self.val_idx)
-        plt.plot(midi_lo)
-        plt.plot(lo)
+        plt.plot(midi_lo.cpu())
+        plt.plot(lo.cpu())
         self.logger.experiment.add_figure("loudness", plt.gcf(), self.val_idx)
 
         if self.ddsp is not None:
-            f0 = torch.from_numpy(f0).float().reshape(1, -1, 1).to(device)
-            lo = torch.from_numpy(lo).float().reshape(1, -1, 1).to(device)
+            f0 = f0.float().reshape(1, -1, 1)
+            lo = lo.float().reshape(1, -1, 1)
             signal = self.ddsp(f0, lo)
             signal = signal.reshape(-1).cpu().numpy()
 
@@ -159,14 +164,43 @@ class Network(pl.LightningModule, DiffusionModel):
 if __name__ == "__main__":
 
     inst = "violin"  #"flute"  #
+    # path prefix of shards built by dataset/shards.py, instead of the pickles
+    shards = None  # "dataset/v"
 
     tb_logger = pl_loggers.TensorBoardLogger('logs/diffusion/{}/'.format(inst))
 
-    trainer = pl.Trainer(
-        gpus=1,
-        callbacks=[pl.callbacks.ModelCheckpoint(monitor="val_loss")],
-        max_epochs=100000,
-        logger=tb_logger)
+    # CPU data parallel training when started by launch.py (one process
+    # included) : python launch.py --nproc-per-node 8 diffusion/training_mse.py
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    rank = int(os.environ.get("RANK", 0))
+
+    # the batch samplers shard the windows themselves (argument renamed in
+    # Lightning 2)
+    if int(pl.__version__.split(".")[0]) >= 2:
+        own_sampler = {"use_distributed_sampler": False}
+    else:
+        own_sampler = {"replace_sampler_ddp": False}
+
+    if "LOCAL_RANK" in os.environ:
+        nproc = int(os.environ["LOCAL_WORLD_SIZE"])
+        trainer = pl.Trainer(
+            accelerator="cpu",
+            devices=nproc,
+            num_nodes=world_size // nproc,
+            # static graph : some parameters of the UNet get no gradient
+            strategy=DDPStrategy(process_group_backend="gloo",
+                                 static_graph=True),
+            **own_sampler,
+            callbacks=[pl.callbacks.ModelCheckpoint(monitor="val_loss")],
+            max_epochs=100000,
+            logger=tb_logger)
+    else:
+        trainer = pl.Trainer(
+            accelerator="auto",
+            devices=1,
+            callbacks=[pl.callbacks.ModelCheckpoint(monitor="val_loss")],
+            max_epochs=100000,
+            logger=tb_logger)
 
     list_transforms = [
         (PitchTransformer, {}),
@@ -175,11 +209,14 @@ if __name__ == "__main__":
     train = DiffusionDataset(instrument=inst,
                              type_set="train",
                              data_augmentation=True,
-                             list_transforms=list_transforms)
+                             list_transforms=list_transforms,
+                             shards=shards,
+                             aligned=True)
     test = DiffusionDataset(instrument=inst,
                             type_set="test",
                             data_augmentation=False,
-                            list_transforms=list_transforms)
+                            list_transforms=list_transforms,
+                            shards=shards)
 
     down_channels = [2, 8, 64, 128, 256, 512]
     up_channels = [512, 256, 128, 64, 16, 8,
@@ -201,8 +238,25 @@ if __name__ == "__main__":
                                  "end": 1e-2
                              })
 
+    # windows starting at note onsets, drawn over the whole pitch range,
+    # fetched a whole batch at a time. Every process draws its own windows
+    # (unseeded sampler) and gets 1 / world_size of the epoch
+    sampler = train.get_sampler(epoch_size=64 * 100, stratify=True)
+
     trainer.fit(
         model,
-        DataLoader(train, 64, True),
-        DataLoader(test, 64),
+        DataLoader(train,
+                   batch_size=None,
+                   sampler=WindowBatchSampler(sampler,
+                                              64,
+                                              rank=rank,
+                                              world_size=world_size)),
+        DataLoader(test,
+                   batch_size=None,
+                   # no window counted twice in val_loss
+                   sampler=WindowBatchSampler(SequentialSampler(test),
+                                              64,
+                                              rank=rank,
+                                              world_size=world_size,
+                                              pad=False)),
     )
\ No newline at end of file
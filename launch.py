@@ -0,0 +1,101 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+def get_cores(local_rank, nproc, cores=None):
+    """ Input : rank of the process on its node, number of processes of the
+    node, cores available (default : affinity of the current process)
+    Output : cores of the process. The cores are split evenly between the
+    processes, which share them when there are more processes than cores """
+    cores = sorted(cores or os.sched_getaffinity(0))
+    start = local_rank * len(cores) // nproc
+    end = (local_rank + 1) * len(cores) // nproc
+    return cores[start:max(end, start + 1)]
+
+
+def pin(cores):
+    """ Pins the current process and its intra-op threads to cores. To be
+    called before any torch operation : the thread pool is created then """
+    import torch
+
+    os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+
+def get_env(args, local_rank, cores):
+    env = os.environ.copy()
+    env.update({
+        "MASTER_ADDR": args.master_addr,
+        "MASTER_PORT": str(args.master_port),
+        "WORLD_SIZE": str(args.nnodes * args.nproc_per_node),
+        "NODE_RANK": str(args.node_rank),
+        "RANK": str(args.node_rank * args.nproc_per_node + local_rank),
+        "LOCAL_RANK": str(local_rank),
+        "LOCAL_WORLD_SIZE": str(args.nproc_per_node),
+        # intra-op threads of torch (OpenMP) and MKL
+        "OMP_NUM_THREADS": str(len(cores)),
+        "MKL_NUM_THREADS": str(len(cores)),
+    })
+    return env
+
+
+def launch(args):
+    """ Starts the processes of the node, each pinned to its own cores,
+    and waits for them. If one of them fails, the others are stopped.
+    Output : exit code """
+    processes = []
+    for local_rank in range(args.nproc_per_node):
+        cores = get_cores(local_rank, args.nproc_per_node)
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, args.script] + args.script_args,
+                env=get_env(args, local_rank, cores),
+                preexec_fn=lambda cores=cores: os.sched_setaffinity(
+                    0, cores)))
+        print("rank {} : pid {}, cores {}".format(
+            args.node_rank * args.nproc_per_node + local_rank,
+            processes[-1].pid, cores))
+
+    code = 0
+    try:
+        while processes:
+            for p in list(processes):
+                if p.poll() is None:
+                    continue
+                processes.remove(p)
+                if p.returncode != 0:
+                    print("process {} exited with code {}".format(
+                        p.pid, p.returncode))
+                    code = code or p.returncode
+                    for other in processes:
+                        other.send_signal(signal.SIGTERM)
+            time.sleep(.1)
+    except KeyboardInterrupt:
+        for p in processes:
+            p.send_signal(signal.SIGINT)
+        for p in processes:
+            p.wait()
+        code = 1
+    return code
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Starts a CPU data parallel training (DDP over gloo) : "
+        "nproc-per-node processes on every node, each one pinned to its "
+        "share of the cores of the node")
+    parser.add_argument("--nproc-per-node", type=int, default=1)
+    parser.add_argument("--nnodes", type=int, default=1)
+    parser.add_argument("--node-rank", type=int, default=0)
+    parser.add_argument("--master-addr", default="127.0.0.1")
+    parser.add_argument("--master-port", type=int, default=29500)
+    parser.add_argument("script")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    sys.exit(launch(args))
@@ -11,6 +11,10 @@ import pickle
 import matplotlib.pyplot as plt
 from random import randint, sample
 from utils import *
+import sys
+
+sys.path.insert(0, "dataset")
+from torch_transforms import from_sklearn
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -37,6 +41,7 @@ class ModelCategorical(pl.LightningModule):
         super().__init__()
         self.save_hyperparameters()
         self.scalers = scalers
+        self.transforms = [from_sklearn(sc) for sc in scalers or []]
         self.loudness_nbins = 100
         self.ddsp = None
         self.val_idx = 0
@@ -168,16 +173,15 @@ class ModelCategorical(pl.LightningModule):
         lo = torch.argmax(loudness, -1, keepdim=True) / 120
         p = torch.argmax(pitch, -1, keepdim=True) / 127
 
-        p = self.scalers[0].inverse_transform(p.squeeze(0).cpu())
-        lo = self.scalers[1].inverse_transform(lo.squeeze(0).cpu())
-        c = self.scalers[2].inverse_transform(c.squeeze(0).cpu())
+        p = self.transforms[0].to(p.device).inverse_transform(p.squeeze(0))
+        lo = self.transforms[1].to(lo.device).inverse_transform(lo.squeeze(0))
+        c = self.transforms[2].to(c.device).inverse_transform(c.squeeze(0))
 
         # Change range [0, 1] -> [-0.5, 0.5]
         c -= 0.5
 
-        f0 = pctof(p, c)
-        f0 = torch.Tensor(f0).to("cuda")
-        lo = torch.Tensor(lo).to("cuda")
+        f0 = pctof(p, c).float()
+        lo = lo.float()
 
         y = self.ddsp(f0.unsqueeze(0), lo.unsqueeze(0))
 
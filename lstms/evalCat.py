@@ -11,7 +11,10 @@ from LSTMContinuous import ModelContinuousPitch
 from expressive_dataset import ExpressiveDataset, ExpressiveDatasetPitchContinuous
 
 from random import randint
-import pickle
+import sys
+
+sys.path.insert(0, "results")
+from results_store import ResultsStore
 
 list_transforms = [
     (MinMaxScaler, {}),  # pitch
@@ -33,16 +36,7 @@ model = ModelCategorical.load_from_checkpoint(
 
 model.ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
 
-# Initialize data :
-
-u_f0 = np.empty(0)
-u_lo = np.empty(0)
-e_f0 = np.empty(0)
-e_lo = np.empty(0)
-pred_f0 = np.empty(0)
-pred_lo = np.empty(0)
-onsets = np.empty(0)
-offsets = np.empty(0)
+store = ResultsStore("results/store", mode="a")
 
 # Prediction loops :
 
@@ -70,25 +64,16 @@ for i in range(N_EXAMPLE):
     s_u_f0, s_u_lo = dataset.post_processing(s_u_p, s_u_cents, s_u_lo)
     s_e_f0, s_e_lo = dataset.post_processing(s_u_p, s_e_cents, s_e_lo)
 
-    u_f0 = np.concatenate((u_f0, s_u_f0.squeeze()))
-    u_lo = np.concatenate((u_lo, s_u_lo.squeeze()))
-
-    e_f0 = np.concatenate((e_f0, s_e_f0.squeeze()))
-    e_lo = np.concatenate((e_lo, s_e_lo.squeeze()))
-
-    pred_f0 = np.concatenate((pred_f0, s_pred_f0.squeeze()))
-    pred_lo = np.concatenate((pred_lo, s_pred_lo.squeeze()))
-
-out = {
-    "u_f0": u_f0,
-    "u_lo": u_lo,
-    "e_f0": e_f0,
-    "e_lo": e_lo,
-    "pred_f0": pred_f0,
-    "pred_lo": pred_lo,
-    "onsets": onsets,
-    "offsets": offsets
-}
-
-# with open("results/lstm/categorical/data/results.pickle", "wb") as file_out:
-#     pickle.dump(out, file_out)
+    # align events with the shifted model input
+    n = len(s_u_f0.squeeze())
+    store.append("lstm-categorical",
+                 i,
+                 replace=True,
+                 u_f0=s_u_f0.squeeze(),
+                 u_lo=s_u_lo.squeeze(),
+                 e_f0=s_e_f0.squeeze(),
+                 e_lo=s_e_lo.squeeze(),
+                 pred_f0=s_pred_f0.squeeze(),
+                 pred_lo=s_pred_lo.squeeze(),
+                 onsets=ons[-n:].numpy(),
+                 offsets=offs[-n:].numpy())
@@ -7,9 +7,21 @@ import pytorch_lightning as pl
 import pickle
 from random import randint
 from utils import *
+import sys
+
+sys.path.insert(0, "dataset")
+from tensor_cache import TensorCache
+from torch_transforms import from_sklearn
+from make_dataset import load_dataset
 
 
 class ExpressiveDataset(Dataset):
+
+    # preprocessed tensors kept in the TensorCache
+    CACHED = [
+        "u_f0", "e_f0", "e_lo", "e_cents", "u_lo", "onsets", "offsets"
+    ]
+
     def __init__(self,
                  instrument,
                  data_augmentation=False,
@@ -22,18 +34,23 @@ class ExpressiveDataset(Dataset):
         path = "dataset/{}-{}{}.pickle".format(instrument[0], type_set, da)
         print("{} dataset file used : {}".format(type_set, path))
         print("Loading Dataset...")
-        with open(path, "rb") as dataset:
-            dataset = pickle.load(dataset)
+        dataset = load_dataset(path)
 
         self.dataset = dataset
         self.N = len(dataset["u_f0"])
         self.list_transforms = list_transforms
         self.n_sample = n_sample
+        TensorCache(path, list_transforms,
+                    type(self)).load_or_build(self, self.preprocess,
+                                              self.CACHED)
+        self.transforms = [from_sklearn(sc) for sc in self.scalers]
+        self.eval = eval
+        print("Dataset loaded. Length : {}min".format(self.N // 6000))
+
+    def preprocess(self):
         self.load()
         self.scalers = self.fit_transforms()
         self.transform()
-        self.eval = eval
-        print("Dataset loaded. Length : {}min".format(self.N // 6000))
 
     def fit_transforms(self):
         scalers = []
@@ -115,9 +132,9 @@ class ExpressiveDataset(Dataset):
         lo = torch.argmax(lo, -1, keepdim=True) / 120
         p = torch.argmax(p, -1, keepdim=True) / 127
 
-        p = self.scalers[0].inverse_transform(p.squeeze(0))
-        lo = self.scalers[1].inverse_transform(lo.squeeze(0))
-        c = self.scalers[2].inverse_transform(c.squeeze(0))
+        p = self.transforms[0].to(p.device).inverse_transform(p.squeeze(0))
+        lo = self.transforms[1].to(lo.device).inverse_transform(lo.squeeze(0))
+        c = self.transforms[2].to(c.device).inverse_transform(c.squeeze(0))
 
         # Change range [0, 1] -> [-0.5, 0.5]
         c -= 0.5
@@ -200,6 +217,12 @@ class ExpressiveDataset(Dataset):
 
 
 class ExpressiveDatasetPitchContinuous(Dataset):
+
+    # preprocessed tensors kept in the TensorCache
+    CACHED = [
+        "u_f0", "e_f0", "e_lo", "e_cents", "u_lo", "onsets", "offsets"
+    ]
+
     def __init__(self,
                  instrument,
                  data_augmentation=False,
@@ -212,18 +235,23 @@ class ExpressiveDatasetPitchContinuous(Dataset):
         path = "dataset/{}-{}{}.pickle".format(instrument[0], type_set, da)
         print("{} dataset file used : {}".format(type_set, path))
         print("Loading Dataset...")
-        with open(path, "rb") as dataset:
-            dataset = pickle.load(dataset)
+        dataset = load_dataset(path)
 
         self.dataset = dataset
         self.N = len(dataset["u_f0"])
         self.list_transforms = list_transforms
         self.n_sample = n_sample
+        TensorCache(path, list_transforms,
+                    type(self)).load_or_build(self, self.preprocess,
+                                              self.CACHED)
+        self.transforms = [from_sklearn(sc) for sc in self.scalers]
+        self.eval = eval
+        print("Dataset loaded. Length : {}min".format(self.N // 6000))
+
+    def preprocess(self):
         self.load()
         self.scalers = self.fit_transforms()
         self.transform()
-        self.eval = eval
-        print("Dataset loaded. Length : {}min".format(self.N // 6000))
 
     def fit_transforms(self):
         scalers = []
@@ -303,9 +331,9 @@ class ExpressiveDatasetPitchContinuous(Dataset):
 
         p = torch.argmax(p, -1, keepdim=True) / 127
 
-        p = self.scalers[0].inverse_transform(p.squeeze(0))
-        lo = self.scalers[1].inverse_transform(lo.squeeze(0))
-        c = self.scalers[2].inverse_transform(c.squeeze(0))
+        p = self.transforms[0].to(p.device).inverse_transform(p.squeeze(0))
+        lo = self.transforms[1].to(lo.device).inverse_transform(lo.squeeze(0))
+        c = self.transforms[2].to(c.device).inverse_transform(c.squeeze(0))
 
         # Change range [0, 1] -> [-0.5, 0.5]
         c -= 0.5
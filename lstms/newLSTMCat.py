@@ -7,6 +7,10 @@ import pytorch_lightning as pl
 import pickle
 from random import randint
 from utils import *
+import sys
+
+sys.path.insert(0, "dataset")
+from torch_transforms import from_sklearn
 
 
 class LinearBlock(nn.Module):
@@ -189,6 +193,7 @@ class ExpressiveDataset(Dataset):
         self.n_sample = n_sample
         self.n_loudness = n_loudness
         self.scalers = self.fit_transforms()
+        self.transforms = [from_sklearn(sc) for sc in self.scalers]
 
     def fit_transforms(self):
         data = [
@@ -211,9 +216,8 @@ class ExpressiveDataset(Dataset):
         return out
 
     def apply_inverse_transform(self, x, idx):
-        scaler = self.scalers[idx]
-        out = torch.from_numpy(scaler.inverse_transform(x.reshape(
-            -1, 1))).unsqueeze(0)
+        transform = self.transforms[idx].to(x.device)
+        out = transform.inverse_transform(x.reshape(-1, 1)).unsqueeze(0)
         return out.float()
 
     def __len__(self):
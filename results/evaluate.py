@@ -1,15 +1,16 @@
 import torch
-import pickle
+import numpy as np
 from evaluation import Evaluator
+from results_store import ResultsStore
 import matplotlib.pyplot as plt
 import warnings
 
 warnings.filterwarnings('ignore')
 
-path = "results/diffusion/data/violin-results.pickle"
+store = ResultsStore("results/store")
+model_id = "diffusion-violin"
 
-with open(path, "rb") as results:
-    results = pickle.load(results)
+results = store.get(model_id, 0)
 n_sample = 500
 idx = 64
 
@@ -24,16 +25,16 @@ pred_lo = results["pred_lo"][idx:idx + n_sample]
 onsets = results["onsets"][idx:idx + n_sample]
 offsets = results["offsets"][idx:idx + n_sample]
 
-u_f0 = torch.from_numpy(u_f0).float().reshape(1, -1, 1)
-u_lo = torch.from_numpy(u_lo).float().reshape(1, -1, 1)
-e_f0 = torch.from_numpy(e_f0).float().reshape(1, -1, 1)
-e_lo = torch.from_numpy(e_lo).float().reshape(1, -1, 1)
+u_f0 = torch.from_numpy(np.array(u_f0)).float().reshape(1, -1, 1)
+u_lo = torch.from_numpy(np.array(u_lo)).float().reshape(1, -1, 1)
+e_f0 = torch.from_numpy(np.array(e_f0)).float().reshape(1, -1, 1)
+e_lo = torch.from_numpy(np.array(e_lo)).float().reshape(1, -1, 1)
 
-pred_f0 = torch.from_numpy(pred_f0).float().reshape(1, -1, 1)
-pred_lo = torch.from_numpy(pred_lo).float().reshape(1, -1, 1)
+pred_f0 = torch.from_numpy(np.array(pred_f0)).float().reshape(1, -1, 1)
+pred_lo = torch.from_numpy(np.array(pred_lo)).float().reshape(1, -1, 1)
 
-onsets = torch.from_numpy(onsets).float().reshape(1, -1, 1)
-offsets = torch.from_numpy(offsets).float().reshape(1, -1, 1)
+onsets = torch.from_numpy(np.array(onsets)).float().reshape(1, -1, 1)
+offsets = torch.from_numpy(np.array(offsets)).float().reshape(1, -1, 1)
 
 e = Evaluator()
 
@@ -53,6 +54,18 @@ print("Score frames = {}, score transitions = {}, score total = {}".format(
 accuracy = e.accuracy(u_f0, e_f0, frames)
 print("Accuracy = ", accuracy)
 
+# every example of the model scored at once as a batch
+examples = [store.get(*key) for key in store.keys(model_id)]
+n = min(len(example["u_f0"]) for example in examples)
+batch = [
+    torch.from_numpy(np.stack([example[key][:n] for example in examples
+                               ])).float().unsqueeze(-1)
+    for key in ["pred_f0", "e_f0", "onsets", "offsets"]
+]
+scores = e.evaluate_batch(*batch)
+print("Per example accuracy = ", scores["accuracy"])
+print("Mean accuracy = ", scores["mean_accuracy"])
+
 print(pred_f0.shape)
 e.plot(pred_f0, pred_lo, e_f0, e_lo)
 
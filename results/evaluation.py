@@ -1,11 +1,13 @@
 import torch
 import matplotlib.pyplot as plt
 from scipy.io.wavfile import write
+from spectral_loss import MultiScaleSpectralLoss
 
 
 class Evaluator:
     def __init__(self, sr=100):
         self.sr = sr
+        self.spectral_loss = MultiScaleSpectralLoss()
 
     def evaluate(self,
                  out_f0,
@@ -23,30 +25,45 @@ class Evaluator:
             return self.score(out_f0, out_loudness, target_f0, target_loudness,
                               reduction)
 
+    def paint(self, rows, starts, ends, shape):
+        """ Input: row, start and end indexes of intervals, [R, T] shape
+            Output: [R, T] mask set to 1 over every [start, end[ interval
+        """
+        starts, ends = starts.clamp(0, shape[1]), ends.clamp(0, shape[1])
+        keep = ends > starts
+        rows, starts, ends = rows[keep], starts[keep], ends[keep]
+
+        diff = torch.zeros(shape[0], shape[1] + 1, device=rows.device)
+        ones = torch.ones(rows.shape[0], device=rows.device)
+        diff.index_put_((rows, starts), ones, accumulate=True)
+        diff.index_put_((rows, ends), -ones, accumulate=True)
+        return (diff.cumsum(-1)[:, :-1] > 0).float()
+
     def get_trans_frames(self, onsets, offsets, ratio=0.1):
         """ Input: onsets, offsets [B, T, C], ratio between onset and frame in a note
             Outputs: transitions, frames [B, T, C]
         """
-        trans = torch.zeros_like(onsets)
-        frames = torch.zeros_like(onsets)
+        B, T, C = onsets.shape
+        on = onsets.permute(0, 2, 1).reshape(B * C, T) != 0
+        off = offsets.permute(0, 2, 1).reshape(B * C, T) != 0
 
-        note_on = 0
+        # index of the last onset before each frame (0 if none)
+        t = torch.arange(T, device=on.device).expand_as(on)
+        note_on = torch.where(on, t, torch.zeros_like(t)).cummax(-1)[0]
 
-        for i in range(onsets.shape[1]):
-            if onsets[:, i, :]:
-                note_on = i
-            elif offsets[:, i, :]:
-                l = i - note_on
-                l_onset = int(ratio * l)
+        rows, ends = torch.nonzero(off & ~on, as_tuple=True)
+        starts = note_on[rows, ends]
+        l_onset = (ratio * (ends - starts)).long()
 
-                # update transition tensor
-                s_attack, e_attack = note_on, note_on + l_onset
-                trans[:, s_attack:e_attack, :] = 1
-                s_release, e_release = i - l_onset, i
-                trans[:, s_release:e_release, :] = 1
+        # transitions : attack and release of each note
+        trans = torch.maximum(
+            self.paint(rows, starts, starts + l_onset, (B * C, T)),
+            self.paint(rows, ends - l_onset, ends, (B * C, T)))
+        frames = self.paint(rows, starts + l_onset, ends - l_onset,
+                            (B * C, T))
 
-                #update frames tensor
-                frames[:, e_attack:s_release, :] = 1
+        trans = trans.reshape(B, C, T).permute(0, 2, 1).to(onsets)
+        frames = frames.reshape(B, C, T).permute(0, 2, 1).to(onsets)
 
         return trans, frames
 
@@ -70,20 +87,31 @@ class Evaluator:
         plt.legend(loc='center left', bbox_to_anchor=(1, 0.5))
         plt.show()
 
-    def score_pitch(self, x, y, reduction="mean"):
-        x, y = x.squeeze(), y.squeeze()
-        d_cents = torch.abs(1200 * torch.log2(torch.abs(x / y)))
-        d_cents[torch.isnan(d_cents)] = 0
+    def reduce(self, x, reduction="mean", per_example=False):
+        if per_example:
+            x = x.reshape(x.shape[0], -1)
+            dim = {"dim": -1}
+        else:
+            dim = {}
+
         if reduction == "mean":
-            return torch.mean(d_cents)
+            return torch.mean(x, **dim)
         elif reduction == "median":
-            return torch.median(d_cents)
+            out = torch.median(x, **dim)
+            return out.values if per_example else out
         elif reduction == "sum":
-            return torch.sum(d_cents)
+            return torch.sum(x, **dim)
         else:
             print("ERROR reduction type")
             return None
 
+    def score_pitch(self, x, y, reduction="mean", per_example=False):
+        if not per_example:
+            x, y = x.squeeze(), y.squeeze()
+        d_cents = torch.abs(1200 * torch.log2(torch.abs(x / y)))
+        d_cents[torch.isnan(d_cents)] = 0
+        return self.reduce(d_cents, reduction, per_example)
+
     def score(self,
               f0,
               lo,
@@ -91,51 +119,103 @@ class Evaluator:
               target_lo,
               trans,
               frames,
-              reduction="mean"):
+              reduction="mean",
+              per_example=False):
 
         score_trans = self.score_pitch(f0 * trans, target_f0 * trans,
-                                       reduction)
+                                       reduction, per_example)
         score_frames = self.score_pitch(f0 * frames, target_f0 * frames,
-                                        reduction)
+                                        reduction, per_example)
 
         return score_trans, score_frames
 
     def get_notes(self, frames):
-        note = {"start": None, "end": None}
-        l_notes = []
-
-        for i in range(len(frames)):
-            if frames[i] and note["start"] is None:
-                note["start"] = i
-            elif not frames[i] and note["start"] is not None:  # note turned off
-                note["end"] = i
-                l_notes.append(note)
-                note = {"start": None, "end": None}
-
-        return l_notes
-
-    def accuracy(self, f0, target_f0, frames):
-
-        # only considering sustained parts
-        f0 = (f0 * frames).squeeze()
-        target_f0 = (target_f0 * frames).squeeze()
+        """ Input: frames [B, T, C]
+            Outputs: example index, start and end of each note [N]
+            (notes still on at the end of the example are ignored)
+        """
+        frames = frames != 0
+        prev = torch.nn.functional.pad(frames[:, :-1], (0, 0, 1, 0))
+
+        b_on, t_on, c_on = torch.nonzero(frames & ~prev, as_tuple=True)
+        b_off, t_off, c_off = torch.nonzero(~frames & prev, as_tuple=True)
+
+        # sort both by (example, channel, time) so that n-th onset and n-th
+        # offset of a row belong to the same note
+        T = frames.shape[1]
+        key_on = (b_on * frames.shape[2] + c_on) * T + t_on
+        key_off = (b_off * frames.shape[2] + c_off) * T + t_off
+        order_on, order_off = key_on.argsort(), key_off.argsort()
+        b_on, t_on, c_on = b_on[order_on], t_on[order_on], c_on[order_on]
+        t_off, c_off = t_off[order_off], c_off[order_off]
+
+        # drop the last onset of rows ending on a note
+        row_on = b_on * frames.shape[2] + c_on
+        row_off = b_off[order_off] * frames.shape[2] + c_off
+        n_on = torch.bincount(row_on, minlength=frames.shape[0] *
+                              frames.shape[2])
+        n_off = torch.bincount(row_off, minlength=frames.shape[0] *
+                               frames.shape[2])
+        rank = torch.arange(row_on.shape[0], device=row_on.device)
+        rank = rank - (n_on.cumsum(0) - n_on)[row_on]
+        closed = rank < n_off[row_on]
+
+        return b_on[closed], c_on[closed], t_on[closed], t_off
+
+    def note_means(self, x, b, c, starts, ends):
+        """ mean of x [B, T, C] over each [start, end[ segment """
+        cumsum = torch.nn.functional.pad(x.double().cumsum(1),
+                                         (0, 0, 1, 0))
+        total = cumsum[b, ends, c] - cumsum[b, starts, c]
+        return (total / (ends - starts)).to(x)
+
+    def accuracy(self, f0, target_f0, frames, per_example=False):
+        """ Input: f0, target_f0, frames [B, T, C]
+            Output: ratio of notes whose mean pitch is within 50 cents of
+            the target, for each example if per_example else overall
+        """
+        b, c, starts, ends = self.get_notes(frames)
 
-        l_notes = self.get_notes(frames.squeeze())
-        correct_f0 = 0
+        target_pitch = self.note_means(target_f0, b, c, starts, ends)
+        pitch = self.note_means(f0, b, c, starts, ends)
 
-        for note in l_notes:
-            target_pitch = torch.mean(target_f0[note["start"]:note["end"]])
-            pitch = torch.mean(f0[note["start"]:note["end"]])
+        d = torch.abs(1200 * torch.log2(torch.abs(pitch / target_pitch)))
+        d[torch.isnan(d)] = 0
 
-            d = torch.abs(self.score_pitch(pitch, target_pitch))
+        # if diff> 50 cents : note is off
+        correct = (d < 50).float()
 
-            # if diff> 50 cents : note is off
-            if d < 50:
-                correct_f0 += 1
+        if per_example:
+            n_notes = torch.bincount(b, minlength=f0.shape[0])
+            n_correct = torch.bincount(b, correct, minlength=f0.shape[0])
+            return n_correct / n_notes
 
-        return correct_f0 / len(l_notes)
+        return (correct.sum() / correct.shape[0]).item()
 
-        pass
+    def evaluate_batch(self,
+                       f0,
+                       target_f0,
+                       onsets,
+                       offsets,
+                       reduction="mean"):
+        """ Input: f0, target_f0, onsets, offsets [B, T, C]
+            Output: per-example and aggregate scores
+        """
+        trans, frames = self.get_trans_frames(onsets, offsets)
+
+        score_trans, score_frames = self.score(f0, None, target_f0, None,
+                                               trans, frames, reduction,
+                                               True)
+        accuracy = self.accuracy(f0, target_f0, frames, True)
+
+        return {
+            "score_trans": score_trans,
+            "score_frames": score_frames,
+            "accuracy": accuracy,
+            "mean_score_trans": score_trans.mean().item(),
+            "mean_score_frames": score_frames.mean().item(),
+            "mean_accuracy": self.accuracy(f0, target_f0, frames),
+        }
 
     def listen(self,
                out_f0,
@@ -180,30 +260,5 @@ class Evaluator:
         plt.show()
 
     def multi_scale_loss(self, out, resynth, overlap=0.75, alpha=1):
-        loss = 0
-        out = out.squeeze()
-        resynth = resynth.squeeze()
-        fft_sizes = [2048, 1024, 512, 256, 128, 64]
-        for fft_size in fft_sizes:
-            hop = int(fft_size * (1 - overlap))
-            window = torch.hann_window(fft_size).to(out)
-            x = torch.abs(
-                torch.stft(input=out,
-                           n_fft=fft_size,
-                           hop_length=hop,
-                           window=window,
-                           normalized=True,
-                           return_complex=True))
-            y = torch.abs(
-                torch.stft(input=resynth,
-                           n_fft=fft_size,
-                           hop_length=hop,
-                           window=window,
-                           normalized=True,
-                           return_complex=True))
-
-            # Compute loss for each fft size
-            loss += (y - x).abs().mean()
-            loss += alpha * (torch.log(x + 1e-7) -
-                             torch.log(y + 1e-7)).abs().mean()
-        return loss
+        return self.spectral_loss(out.squeeze(), resynth.squeeze(), overlap,
+                                  alpha)
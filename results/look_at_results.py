@@ -7,8 +7,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 
-import pickle
 import soundfile as sf
+from results_store import ResultsStore
 
 if torch.cuda.is_available():
     device = torch.device("cuda:0")
@@ -16,20 +16,21 @@ else:
     device = torch.device("cpu")
 print('using', device)
 
-path = "results/diffusion/data/results.pickle"
+path = "results/store"
+model_id = "diffusion-violin"
 number_of_examples = 5
 # get data
 
-dataset = pd.read_pickle(path, compression=None)
-
-df = pd.DataFrame(dataset)
-print(df)
+store = ResultsStore(path)
 
 # sns.set_theme(style="darkgrid")
 for i in range(number_of_examples):
-    sns.lineplot(x="time", y="u_f0", hue="sample", data=df[df["sample"] == i])
+    # only this example is read from the memory-mapped columns
+    example = store.get(model_id, i, columns=["u_f0", "e_f0"])
+    t = np.arange(len(example["u_f0"])) / 100
 
-    sns.lineplot(x="time", y="e_f0", hue="sample", data=df[df["sample"] == i])
+    sns.lineplot(x=t, y=example["u_f0"])
+    sns.lineplot(x=t, y=example["e_f0"])
     plt.show()
 
 # ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
@@ -4,8 +4,8 @@ import torch
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pickle
 import soundfile as sf
+from results_store import ResultsStore
 
 #from get_datasets import get_datasets
 
@@ -15,11 +15,12 @@ else:
     device = torch.device("cpu")
 print('using', device)
 
-path = "results/diffusion/data/results.pickle"
+path = "results/store"
+model_id = "diffusion-violin"
 # get data
 
-with open(path, "rb") as dataset:
-    dataset = pickle.load(dataset)
+# every example of the model
+dataset = ResultsStore(path).to_dataframe(model_id)
 
 ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
 
@@ -3,8 +3,8 @@ import scipy.io.wavfile as wav
 import torch
 import numpy as np
 import matplotlib.pyplot as plt
-import pickle
 import soundfile as sf
+from results_store import ResultsStore
 
 #from get_datasets import get_datasets
 
@@ -14,12 +14,13 @@ else:
     device = torch.device("cpu")
 print('using', device)
 
-path = "results/diffusion/data/violin-results.pickle"
+path = "results/store"
+model_id = "diffusion-violin"
+save_path = "results/diffusion"
 number_of_examples = 5
 # get data
 
-with open(path, "rb") as dataset:
-    dataset = pickle.load(dataset)
+store = ResultsStore(path)
 
 ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
 
@@ -28,17 +29,17 @@ ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
 n_sample = 2048
 
 for i in range(number_of_examples):
-    idx = i * n_sample
-    u_f0 = dataset["u_f0"][idx:idx + n_sample]
-    e_f0 = dataset["e_f0"][idx:idx + n_sample]
-    pred_f0 = dataset["pred_f0"][idx:idx + n_sample]
+    example = store.get(model_id, i)
+    u_f0 = np.array(example["u_f0"][:n_sample])
+    e_f0 = np.array(example["e_f0"][:n_sample])
+    pred_f0 = np.array(example["pred_f0"][:n_sample])
 
-    u_lo = dataset["u_lo"][idx:idx + n_sample]
-    e_lo = dataset["e_lo"][idx:idx + n_sample]
-    pred_lo = dataset["pred_lo"][idx:idx + n_sample]
+    u_lo = np.array(example["u_lo"][:n_sample])
+    e_lo = np.array(example["e_lo"][:n_sample])
+    pred_lo = np.array(example["pred_lo"][:n_sample])
 
-    onsets = dataset["onsets"][idx:idx + n_sample]
-    offsets = dataset["offsets"][idx:idx + n_sample]
+    onsets = np.array(example["onsets"][:n_sample])
+    offsets = np.array(example["offsets"][:n_sample])
 
     u_f0 = torch.from_numpy(u_f0).reshape(1, -1, 1).float()
     u_lo = torch.from_numpy(u_lo).reshape(1, -1, 1).float()
@@ -56,9 +57,7 @@ for i in range(number_of_examples):
     target = ddsp(e_f0, e_lo).reshape(-1).detach().numpy()
     pred = ddsp(pred_f0, pred_lo).reshape(-1).detach().numpy()
 
-    l = path.split("/")
-    save_path = "/".join(l[:2])
-    name = l[-1].split(".")[0] + str(i)
+    name = "{}{}".format(model_id, i)
 
     sf.write("{}/samples/{}-pred.wav".format(save_path, name), pred, 16000)
     sf.write("{}/samples/{}-midi.wav".format(save_path, name), midi, 16000)
@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, "dataset")
+from columnar_store import ColumnarStore
+
+
+class ResultsStore(ColumnarStore):
+
+    COLUMNS = {
+        "u_f0": "float32",
+        "u_lo": "float32",
+        "e_f0": "float32",
+        "e_lo": "float32",
+        "pred_f0": "float32",
+        "pred_lo": "float32",
+        "onsets": "float32",
+        "offsets": "float32",
+        "sample": "int32",
+        "model": "int16",
+    }
+
+    KEY = {"model": str, "sample": int}
+
+    def __init__(self, path, mode="r"):
+        """ Columnar store of evaluation results, one entry per
+        (model, sample) example. models.json lists the model names, the
+        model column holds their position in it. """
+        super().__init__(path, mode)
+        self.meta_path = os.path.join(path, "models.json")
+
+        self.models = []
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as meta:
+                self.models = json.load(meta)
+
+    def append(self, model, sample, replace=False, **columns):
+        """ Writes one example (all data columns of the same length) at the
+        end of the store. With replace, an example already stored (previous
+        evaluation run) is replaced """
+
+        if self.mode == "r":
+            raise ValueError("store opened in read mode")
+        length = len(columns["u_f0"])
+
+        if model not in self.models:
+            self.models.append(model)
+            with open(self.meta_path, "w") as meta:
+                json.dump(self.models, meta)
+
+        columns["sample"] = np.full(length, sample)
+        columns["model"] = np.full(length, self.models.index(model))
+        for name in self.COLUMNS:
+            if columns.get(name) is None:  # missing column : padded with zeros
+                columns[name] = np.zeros(length)
+
+        self.append_chunks((model, sample), [columns], replace)
+
+    def keys(self, model=None):
+        return [k for k in self.index if model is None or k[0] == model]
+
+    def get(self, model, sample, columns=None):
+        """ Returns a dict of memory-mapped slices for one example """
+        columns = columns or [
+            c for c in self.COLUMNS if c not in ["sample", "model"]
+        ]
+        return super().get((model, sample), columns)
+
+    def to_dataframe(self, model=None, columns=None, sr=100):
+        """ Loads the examples of one model (or all) in a DataFrame with
+        time and sample columns """
+        data = {}
+        for key in self.keys(model):
+            example = self.get(*key, columns)
+            example["time"] = np.arange(self.index[key][1]) / sr
+            example["sample"] = np.full(self.index[key][1], key[1])
+            example["model"] = np.full(self.index[key][1], key[0])
+            for c, x in example.items():
+                data.setdefault(c, []).append(np.asarray(x))
+
+        return pd.DataFrame({c: np.concatenate(x) for c, x in data.items()})
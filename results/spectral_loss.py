@@ -0,0 +1,81 @@
+import torch
+import torch.nn.functional as F
+
+
+class MultiScaleSpectralLoss:
+    def __init__(self,
+                 fft_sizes=(2048, 1024, 512, 256, 128, 64),
+                 overlap=0.75,
+                 alpha=1,
+                 chunk_frames=4096):
+        """ Multi-resolution STFT distance between batches of signals.
+        Signals are processed chunk_frames STFT frames at a time so that
+        memory does not grow with the signal length. """
+
+        self.fft_sizes = fft_sizes
+        self.overlap = overlap
+        self.alpha = alpha
+        self.chunk_frames = chunk_frames
+        self.windows = {}
+
+    def get_window(self, n_fft, x):
+        key = (n_fft, x.device, x.dtype)
+        if key not in self.windows:
+            self.windows[key] = torch.hann_window(n_fft).to(x)
+        return self.windows[key]
+
+    def scale_loss(self, x, n_fft, overlap):
+        """ Input: stacked prediction and target [2, B, N]
+            Output: linear and log distances [B] for this fft size
+        """
+        hop = int(n_fft * (1 - overlap))
+        window = self.get_window(n_fft, x)
+        _, B, N = x.shape
+
+        # centered frames, as torch.stft(center=True) does
+        x = x.reshape(2 * B, N)
+        x = F.pad(x.unsqueeze(1), (n_fft // 2, n_fft // 2),
+                  mode="reflect").squeeze(1)
+        n_frames = 1 + (x.shape[-1] - n_fft) // hop
+
+        lin = torch.zeros(B).to(x)
+        log = torch.zeros(B).to(x)
+
+        for start in range(0, n_frames, self.chunk_frames):
+            end = min(start + self.chunk_frames, n_frames)
+            chunk = x[:, start * hop:(end - 1) * hop + n_fft]
+
+            S = torch.stft(input=chunk,
+                           n_fft=n_fft,
+                           hop_length=hop,
+                           window=window,
+                           center=False,
+                           normalized=True,
+                           return_complex=True).abs()
+            s_out, s_target = S[:B], S[B:]
+
+            lin += (s_target - s_out).abs().sum((-1, -2))
+            log += (torch.log(s_out + 1e-7) -
+                    torch.log(s_target + 1e-7)).abs().sum((-1, -2))
+
+        n_bins = (n_fft // 2 + 1) * n_frames
+        return lin / n_bins, log / n_bins
+
+    def __call__(self, out, target, overlap=None, alpha=None):
+        """ Input: out, target [B, N] or [N], overlap and alpha of this call
+            (default : the ones of the loss)
+            Output: loss for each item [B] (or scalar for a single signal)
+        """
+        overlap = self.overlap if overlap is None else overlap
+        alpha = self.alpha if alpha is None else alpha
+        single = out.dim() == 1
+        out = out.reshape(-1, out.shape[-1])
+        target = target.reshape(-1, target.shape[-1])
+
+        x = torch.stack([out, target])
+        loss = torch.zeros(out.shape[0]).to(out)
+        for n_fft in self.fft_sizes:
+            lin, log = self.scale_loss(x, n_fft, overlap)
+            loss += lin + alpha * log
+
+        return loss[0] if single else loss
@@ -0,0 +1,89 @@
+import torch
+import numpy as np
+import soundfile as sf
+from results_store import ResultsStore
+
+
+class StreamRenderer:
+    def __init__(self,
+                 ddsp,
+                 sampling_rate=16000,
+                 block_size=160,
+                 n_frames=2048,
+                 overlap=64):
+        """ Block-wise DDSP rendering of (f0, loudness) contours.
+        n_frames and overlap are expressed in contour frames, each frame
+        being rendered as block_size audio samples by the DDSP module. """
+
+        if not 0 <= overlap < n_frames:
+            raise ValueError(
+                "overlap ({}) must be in [0, n_frames ({})[".format(
+                    overlap, n_frames))
+
+        self.ddsp = ddsp
+        self.sampling_rate = sampling_rate
+        self.block_size = block_size
+        self.n_frames = n_frames
+        self.overlap = overlap
+
+        n_fade = overlap * block_size
+        self.fade_in = (np.arange(n_fade) + .5) / max(n_fade, 1)
+        self.fade_out = 1 - self.fade_in
+
+    @torch.no_grad()
+    def synth(self, f0, lo):
+        f0 = torch.from_numpy(np.asarray(f0)).float().reshape(1, -1, 1)
+        lo = torch.from_numpy(np.asarray(lo)).float().reshape(1, -1, 1)
+        signal = self.ddsp(f0, lo)
+        return signal.reshape(-1).cpu().numpy()
+
+    def blocks(self, f0, lo):
+        """ Yields successive audio blocks. Each contour block shares
+        `overlap` frames with the previous one and the shared audio is
+        crossfaded, so that only one block is held in memory at a time. """
+
+        n = len(f0)
+        hop = self.n_frames - self.overlap
+        n_fade = self.overlap * self.block_size
+        tail = None
+
+        for start in range(0, max(n - self.overlap, 1), hop):
+            end = min(start + self.n_frames, n)
+            audio = self.synth(f0[start:end], lo[start:end])
+
+            if tail is not None:
+                n_cross = min(n_fade, audio.shape[0])
+                audio[:n_cross] = audio[:n_cross] * self.fade_in[:n_cross] + \
+                    tail[:n_cross] * self.fade_out[:n_cross]
+
+            if end == n:
+                yield audio
+                return
+
+            tail = audio[-n_fade:].copy() if n_fade else None
+            yield audio[:audio.shape[0] - n_fade]
+
+    def render(self, f0, lo, path):
+        """ Renders the contours into the wav file at path, appending
+        blocks to the open file as soon as they are synthesized. """
+
+        with sf.SoundFile(path, "w", self.sampling_rate, 1) as out:
+            for audio in self.blocks(f0, lo):
+                out.write(audio)
+
+
+if __name__ == "__main__":
+
+    model_id = "diffusion-violin"
+    save_path = "results/diffusion"
+
+    # every example of the model, in order
+    dataset = ResultsStore("results/store").to_dataframe(
+        model_id, columns=["pred_f0", "pred_lo"])
+
+    ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
+    renderer = StreamRenderer(ddsp)
+
+    renderer.render(dataset["pred_f0"].to_numpy(),
+                    dataset["pred_lo"].to_numpy(),
+                    "{}/samples/{}-pred-full.wav".format(save_path, model_id))
@@ -6,7 +6,7 @@ class MidiLikeSeq:
         """ Class for Midi-Like sequences. """
 
         self.seq = []
-        self.notes_on = [] # list of pitches of notes played a this given time
+        self.notes_on = set() # pitches of notes played a this given time
         self.duration = 0
         self.pitch = None
         self.loudness = None
@@ -20,7 +20,7 @@ class MidiLikeSeq:
             print("Error : note {} is already on".format(pitch))
         else:
             self.seq.append("NOTE_ON<{}>".format(int(pitch)))
-            self.notes_on.append(pitch)
+            self.notes_on.add(pitch)
 
 
     def note_off(self, pitch):
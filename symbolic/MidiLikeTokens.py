@@ -0,0 +1,235 @@
+import numpy as np
+import note_seq
+from note_seq.protobuf import music_pb2
+
+
+class MidiLikeTokens:
+
+    NOTE_ON = 0
+    NOTE_OFF = 1
+    SET_VELOCITY = 2
+    TIME_SHIFT = 3
+
+    NAMES = ["NOTE_ON", "NOTE_OFF", "SET_VELOCITY", "TIME_SHIFT"]
+
+    # time shift values are stored in nanoseconds
+    TIME_RESOLUTION = 1000000000
+
+    def __init__(self, types=None, values=None):
+        """ Array-backed Midi-Like sequence : one event type (int8) and one
+        int64 value (pitch, velocity or time shift in ns) per event. """
+
+        self.types = np.zeros(0, dtype=np.int8) if types is None else \
+            np.asarray(types, dtype=np.int8)
+        self.values = np.zeros(0, dtype=np.int64) if values is None else \
+            np.asarray(values, dtype=np.int64)
+
+    def __len__(self):
+        return self.types.shape[0]
+
+    def __eq__(self, o: object) -> bool:
+        return np.array_equal(self.types, o.types) and np.array_equal(
+            self.values, o.values)
+
+    def __repr__(self):
+        return "\n".join(self.to_strings()) + "\n"
+
+    @property
+    def duration(self):
+        shifts = self.values[self.types == self.TIME_SHIFT]
+        return np.sum(shifts) / self.TIME_RESOLUTION
+
+    def from_strings(self, seq):
+        """ Input : list of Midi-Like strings ("NOTE_ON<60>"...)
+        Output : self """
+
+        types = []
+        values = []
+        for task in seq:
+            name, value = task[:-1].split("<")
+            types.append(self.NAMES.index(name))
+            values.append(float(value))
+
+        self.types = np.array(types, dtype=np.int8)
+        values = np.array(values)
+        # time shifts are written in ms
+        shifts = self.types == self.TIME_SHIFT
+        values[shifts] *= self.TIME_RESOLUTION / 1000
+        self.values = np.round(values).astype(np.int64)
+        return self
+
+    def to_strings(self):
+        """ Output : list of Midi-Like strings, as MidiLikeSeq writes them """
+        values = self.values.astype(np.float64)
+        shifts = self.types == self.TIME_SHIFT
+        values[shifts] /= self.TIME_RESOLUTION / 1000
+        return [
+            "{}<{}>".format(self.NAMES[t], v if t == self.TIME_SHIFT else int(v))
+            for t, v in zip(self.types, values)
+        ]
+
+    def from_midi_like(self, midi_like_seq):
+        return self.from_strings(midi_like_seq.seq)
+
+    def from_note_sequence(self, sequence):
+        """ Input : NoteSequence (polyphonic)
+        Output : self. At equal times note offs come before note ons, a
+        velocity change is written before each note on playing with a new
+        velocity, time shifts before every event happening later """
+
+        n = len(sequence.notes)
+        pitch = np.fromiter((note.pitch for note in sequence.notes), np.int64, n)
+        velocity = np.fromiter((note.velocity for note in sequence.notes),
+                               np.int64, n)
+        start = np.fromiter((note.start_time for note in sequence.notes),
+                            np.float64, n)
+        end = np.fromiter((note.end_time for note in sequence.notes),
+                          np.float64, n)
+
+        # events : note ons then note offs, sorted by (time, off first)
+        times = np.round(np.concatenate([start, end]) *
+                         self.TIME_RESOLUTION).astype(np.int64)
+        kinds = np.repeat([self.NOTE_ON, self.NOTE_OFF], n)
+        pitches = np.concatenate([pitch, pitch])
+        velocities = np.concatenate([velocity, velocity])
+        order = np.lexsort((kinds == self.NOTE_ON, times))
+        times, kinds = times[order], kinds[order]
+        pitches, velocities = pitches[order], velocities[order]
+
+        shift = np.diff(times, prepend=0)
+
+        is_on = kinds == self.NOTE_ON
+        on_velocities = velocities[is_on]
+        new_velocity = np.zeros_like(is_on)
+        new_velocity[is_on] = on_velocities != np.concatenate(
+            [[0], on_velocities[:-1]])
+
+        # up to three tokens per event : time shift, velocity, note on/off
+        types = np.stack([
+            np.full_like(kinds, self.TIME_SHIFT),
+            np.full_like(kinds, self.SET_VELOCITY), kinds
+        ], 1)
+        values = np.stack([shift, velocities, pitches], 1)
+        keep = np.stack([shift > 0, new_velocity,
+                         np.ones_like(is_on)], 1)
+
+        self.types = types[keep].astype(np.int8)
+        self.values = values[keep]
+        return self
+
+    def get_notes(self):
+        """ Output : (pitch, velocity, start, end) arrays of the notes, in
+        note off order. Each note off ends the oldest note on of the same
+        pitch, unmatched events are dropped """
+
+        types, values = self.types, self.values
+        index = np.arange(len(self))
+
+        time = np.cumsum(np.where(types == self.TIME_SHIFT, values, 0))
+
+        # current velocity : last SET_VELOCITY before each event
+        last = np.where(types == self.SET_VELOCITY, index, -1)
+        last = np.maximum.accumulate(last)
+        velocity = np.where(last >= 0, values[np.maximum(last, 0)], 0)
+
+        ons = np.flatnonzero(types == self.NOTE_ON)
+        offs = np.flatnonzero(types == self.NOTE_OFF)
+
+        def rank(events):
+            """ (pitch, rank among the events of this pitch) keys """
+            events = events[np.argsort(values[events], kind="stable")]
+            pitch = values[events]
+            first = np.searchsorted(pitch, pitch)
+            return events, pitch * len(self) + np.arange(len(events)) - first
+
+        ons, on_keys = rank(ons)
+        offs, off_keys = rank(offs)
+        _, i_on, i_off = np.intersect1d(on_keys,
+                                        off_keys,
+                                        assume_unique=True,
+                                        return_indices=True)
+
+        ons, offs = ons[i_on], offs[i_off]
+        order = np.argsort(offs)
+        ons, offs = ons[order], offs[order]
+
+        return values[ons], velocity[ons], time[ons] / self.TIME_RESOLUTION, \
+            time[offs] / self.TIME_RESOLUTION
+
+    def to_note_sequence(self):
+        sequence = music_pb2.NoteSequence()
+        for p, v, s, e in zip(*self.get_notes()):
+            sequence.notes.add(pitch=int(p),
+                               start_time=s,
+                               end_time=e,
+                               velocity=int(v))
+        return sequence
+
+    def to_ids(self, time_step=0.01, max_shift=100):
+        """ Flat vocabulary for sequence models :
+        [0, 128[ note on, [128, 256[ note off, [256, 384[ velocity,
+        [384, 384 + max_shift[ time shifts of 1 to max_shift time steps.
+        Longer time shifts are split in several tokens. """
+
+        steps = np.round(self.values / (time_step * self.TIME_RESOLUTION))
+        steps = steps.astype(np.int64)
+        is_shift = self.types == self.TIME_SHIFT
+
+        # number of tokens of each event (0 for shifts shorter than a step)
+        counts = np.where(is_shift, -(-steps // max_shift), 1)
+        ids = np.repeat(self.types.astype(np.int64) * 128 + self.values,
+                        counts)
+
+        # every split shift is max_shift steps long but the last one
+        events = np.repeat(np.arange(len(self)), counts)
+        first = np.cumsum(counts) - counts
+        k = np.arange(ids.shape[0]) - first[events]
+        shift_steps = np.minimum(steps[events] - k * max_shift, max_shift)
+        shift_tokens = is_shift[events]
+        ids[shift_tokens] = 3 * 128 + shift_steps[shift_tokens] - 1
+        return ids
+
+    def from_ids(self, ids, time_step=0.01):
+        ids = np.asarray(ids, dtype=np.int64)
+        types = np.minimum(ids // 128, self.TIME_SHIFT)
+        values = ids - 128 * types
+        shifts = types == self.TIME_SHIFT
+        values[shifts] = np.round(
+            (values[shifts] + 1) * time_step * self.TIME_RESOLUTION)
+        self.types, self.values = types.astype(np.int8), values
+        return self
+
+    def save(self, filename):
+        np.savez(filename, types=self.types, values=self.values)
+
+    def load(self, filename):
+        data = np.load(filename)
+        self.types, self.values = data["types"], data["values"]
+        return self
+
+
+def tokenize_corpus(midi_files, path, time_step=0.01, max_shift=100):
+    """ Input : list of midi files, output path
+    Writes the token ids of all the files one after the other in
+    path + ".bin" (int16) and the token offset of every file in
+    path + "-offsets.npy" (len(midi_files) + 1 entries) """
+
+    offsets = [0]
+    with open(path + ".bin", "wb") as out:
+        for midi_file in midi_files:
+            sequence = note_seq.midi_file_to_note_sequence(midi_file)
+            ids = MidiLikeTokens().from_note_sequence(sequence).to_ids(
+                time_step, max_shift)
+            ids.astype(np.int16).tofile(out)
+            offsets.append(offsets[-1] + ids.shape[0])
+
+    np.save(path + "-offsets.npy", np.array(offsets, dtype=np.int64))
+
+
+def load_corpus(path):
+    """ Output : memory-mapped token ids, offsets """
+    offsets = np.load(path + "-offsets.npy")
+    ids = np.memmap(path + ".bin", dtype=np.int16, mode="r",
+                    shape=(offsets[-1], )) if offsets[-1] else np.zeros(
+                        0, dtype=np.int16)
+    return ids, offsets
@@ -0,0 +1,47 @@
+import numpy as np
+
+from NoteTupleSeq import NoteTupleSeq, NOTE_TUPLE_DTYPE
+
+
+class NoteTupleCorpus:
+    def __init__(self, path):
+        """ Read-only corpus of note tuple sequences : path + ".bin" holds
+        the fixed-width notes of all the sequences one after the other and
+        path + "-offsets.npy" the note offset of every sequence. The notes
+        are memory-mapped, nothing is read before it is accessed. """
+
+        self.path = path
+        self.offsets = np.load(path + "-offsets.npy")
+        if self.offsets[-1] > 0:
+            self.notes = np.memmap(path + ".bin",
+                                   dtype=NOTE_TUPLE_DTYPE,
+                                   mode="r",
+                                   shape=(self.offsets[-1], ))
+        else:
+            self.notes = np.zeros(0, dtype=NOTE_TUPLE_DTYPE)
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def __getitem__(self, i):
+        """ Output : zero-copy structured array of the i-th sequence """
+        return self.notes[self.offsets[i]:self.offsets[i + 1]]
+
+    def get_seq(self, i):
+        return NoteTupleSeq().from_array(self[i])
+
+    @staticmethod
+    def write(path, sequences):
+        """ Input : output path, iterable of NoteTupleSeq (or note tuple
+        structured arrays), written one at a time """
+
+        offsets = [0]
+        with open(path + ".bin", "wb") as out:
+            for seq in sequences:
+                if isinstance(seq, NoteTupleSeq):
+                    seq = seq.to_array()
+                seq = np.asarray(seq, dtype=NOTE_TUPLE_DTYPE)
+                seq.tofile(out)
+                offsets.append(offsets[-1] + seq.shape[0])
+
+        np.save(path + "-offsets.npy", np.array(offsets, dtype=np.int64))
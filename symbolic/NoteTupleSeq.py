@@ -1,6 +1,10 @@
 import numpy as np
 import librosa as li
 
+# (time shift major, minor ticks, pitch, velocity, duration major, minor ticks)
+NOTE_TUPLE_DTYPE = np.dtype([("ts_M", "<i4"), ("ts_m", "<i2"), ("pitch", "<i2"),
+                             ("velocity", "<i2"), ("d_M", "<i4"), ("d_m", "<i2")])
+
 class NoteTupleSeq:
     def __init__(self):
         self.seq = []
@@ -55,6 +59,20 @@ class NoteTupleSeq:
             line = file.readline()
         file.close()
 
+    def to_array(self):
+        """ Output : structured array (NOTE_TUPLE_DTYPE) of the notes """
+        return np.array([tuple(task) for task in self.seq], dtype = NOTE_TUPLE_DTYPE)
+
+    def from_array(self, notes):
+        self.seq = [tuple(note) for note in notes.astype(NOTE_TUPLE_DTYPE).tolist()]
+        return self
+
+    def save_binary(self, filename):
+        np.save(filename, self.to_array())
+
+    def load_binary(self, filename):
+        return self.from_array(np.load(filename))
+
     def get_f0_loudness_time(self, frame_rate, pitch_unit = "MIDI"):
         """ Input : frame rate (Hz), pitch unit (MIDI or HERTZ) 
         Output : Pitch (float array), Loudness (float array), Loudness (float array) 
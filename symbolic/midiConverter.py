@@ -1,3 +1,4 @@
+import heapq
 import pretty_midi
 import numpy as np
 import pandas as pd
@@ -6,6 +7,7 @@ from note_seq.protobuf import music_pb2
 
 
 from MidiLikeSeq import MidiLikeSeq
+from MidiLikeTokens import MidiLikeTokens
 from NoteTupleSeq import NoteTupleSeq
 
 
@@ -39,60 +41,56 @@ class Converter:
         return df
 
 
-    def df2midi_likePOLY(self,df):
-        
-        def insert_in_list_events(list_events, note):
-            i = 0 
-            while i<len(list_events) and list_events[i][0]< note[0]: # while previous notes end before
-                i+=1
-            list_events.insert(i, note)
-             
-
-        def select_next_move(note,list_events, current_time, velocity, seq):
+    def df2notes(self, df):
+        """ Input : data frame of notes
+        Output : pitch, velocity, start and end time arrays (as floats, like
+        the rows of the data frame) """
+        notes = df[["Pitch", "Velocity", "Start time", "End time"]].to_numpy(dtype = float)
+        return notes[:, 0], notes[:, 1], notes[:, 2], notes[:, 3]
 
-            #print("DEBUG : note = {} current time = {}, list_events = {} ".format(note, current_time, list_events))
 
+    def notes2midi_likePOLY(self, pitches, velocities, start_times, end_times):
+        """ Inputs : notes arrays (in playing order)
+        Pending note offs are kept in a heap of (end time, order) : among
+        notes ending together the last started is turned off first """
 
-            if list_events == [] or note[2] < list_events[0][0]: # if there is not note on or if note as to start before the others end 
-                if note[2]-current_time > 0: # need time shift
-                    seq.time_shift(note[2]-current_time)
-                current_time = note[2]
-                #print("note on {} - --current time {}".format(note[0],current_time))
-                insert_in_list_events(list_events, (note[3],note[0]))
+        current_time = 0
+        velocity = 0
+        pending = [] # notes on (end_time, -order, pitch)
+        midi_like_seq = MidiLikeSeq()
 
-                if note[1] != velocity:
-                    seq.set_velocity(note[1])
-                    velocity = note[1]   
-                seq.note_on(note[0])
-            
-            else: # a note needs to end before 
-                note_to_end = list_events.pop(0) # get and remove note to end
-                end_time = note_to_end[0]
+        for i, (pitch, v, start, end) in enumerate(zip(pitches, velocities, start_times, end_times)):
+            # turn off notes ending before this one starts
+            while pending and pending[0][0] <= start:
+                end_time, _, pitch_to_end = heapq.heappop(pending)
                 if end_time-current_time > 0:
-                    seq.time_shift(end_time-current_time)
+                    midi_like_seq.time_shift(end_time-current_time)
                 current_time = end_time
-                    #print("note off {} - --current time {}".format(note_to_end[1],current_time))
-                seq.note_off(note_to_end[1])
-                select_next_move(note, list_events, current_time, velocity,seq)
+                midi_like_seq.note_off(pitch_to_end)
+
+            if start-current_time > 0: # need time shift
+                midi_like_seq.time_shift(start-current_time)
+            current_time = start
+            heapq.heappush(pending, (end, -i, pitch))
+
+            if v != velocity:
+                midi_like_seq.set_velocity(v)
+                velocity = v
+            midi_like_seq.note_on(pitch)
+
+        # turn off last notes:
+        while pending:
+            end_time, _, pitch_to_end = heapq.heappop(pending)
+            if end_time-current_time > 0:
+                midi_like_seq.time_shift(end_time-current_time)
+            current_time = end_time
+            midi_like_seq.note_off(pitch_to_end)
 
-            return current_time, list_events, velocity
+        return midi_like_seq
 
-        current_time = 0
-        velocity = 0
-        list_current_notes = [] # notes on (end_time,pitch)
-        midi_like_seq = MidiLikeSeq()
-        for i in range(df.shape[0]):
-            note = (df.iloc[i]["Pitch"], df.iloc[i]["Velocity"], df.iloc[i]["Start time"], df.iloc[i]["End time"])
-            current_time, list_current_notes, velocity = select_next_move(note, list_current_notes, current_time, velocity, midi_like_seq)
-        # turn off last note:
-        note_to_end = list_current_notes.pop(0) # get and remove note to end
-        end_time = note_to_end[0]
-        if end_time-current_time > 0:
-            midi_like_seq.time_shift(end_time-current_time)
-        current_time = end_time
-        midi_like_seq.note_off(note_to_end[1])
 
-        return midi_like_seq
+    def df2midi_likePOLY(self,df):
+        return self.notes2midi_likePOLY(*self.df2notes(df))
 
 
     def df2midi_likeMONO(self, df):
@@ -101,8 +99,7 @@ class Converter:
         current_time = 0
         velocity = 0
         midi_like_seq = MidiLikeSeq()
-        for i in range(df.shape[0]):
-            note = (df.iloc[i]["Pitch"], df.iloc[i]["Velocity"], df.iloc[i]["Start time"], df.iloc[i]["End time"])
+        for note in zip(*self.df2notes(df)):
             time_shift = note[2] - current_time
             if time_shift>0:
                 midi_like_seq.time_shift(time_shift)
@@ -131,33 +128,12 @@ class Converter:
 
 
     def midi_like2seq(self, midi_like_content):
-        """ Inputs : midi like sequence"""
+        """ Inputs : midi like sequence (MidiLikeSeq or MidiLikeTokens)"""
 
-        current_time = 0
-        velocity = 0
-        notes_queue = [] # notes not yet ended (pitch, starting_time, velocity)
-        sequence =  music_pb2.NoteSequence()
+        if isinstance(midi_like_content, MidiLikeSeq):
+            midi_like_content = MidiLikeTokens().from_midi_like(midi_like_content)
 
-        for task in midi_like_content.seq:
-            if task[:7] == "SET_VEL":
-                velocity = int(float(task[13:len(task)-1]))
-
-            if task[:7] == "TIME_SH":
-                current_time += float(task[11:len(task)-1])/1000
-
-            if task[:7] == "NOTE_ON":
-                pitch = int(float(task[8:len(task)-1]))
-                notes_queue.append((pitch, current_time, velocity))
-
-            if task[:7] == "NOTE_OF":
-                pitch = int(float(task[9:len(task)-1]))
-                for note in notes_queue:
-                    if note[0] == pitch:
-                        sequence.notes.add(pitch = note[0], start_time = note[1], end_time = current_time, velocity = note[2])                        
-                        break
-                notes_queue.remove(note)
-        
-        return sequence
+        return midi_like_content.to_note_sequence()
 
 
     def df2note_tuple(self, df):
@@ -182,22 +158,19 @@ class Converter:
 
             return (major_ticks, minor_ticks)
 
-        previous_note_start_time = 0  # keep track of the beginning of the previous note (initialized at 0)
-        note_tuple_seq = NoteTupleSeq()
+        pitch, velocity, start_time, end_time = self.df2notes(df)
 
+        duration = end_time - start_time
+        # time shift since the beginning of the previous note (initialized at 0)
+        time_shift = np.diff(start_time, prepend = 0)
 
-        for i in range(df.shape[0]):
-            pitch = df.iloc[i]["Pitch"]
-            velocity = df.iloc[i]["Velocity"]
-            duration = df.iloc[i]["End time"] - df.iloc[i]["Start time"]
-            time_shift = df.iloc[i]["Start time"] -previous_note_start_time
-            previous_note_start_time = df.iloc[i]["Start time"] # update last note
+        ts_M, ts_m = time_shift2ticks(time_shift)
+        d_M, d_m = duration2ticks(duration)
+
+        note_tuples = np.stack([ts_M, ts_m, pitch, velocity, d_M, d_m], 1).astype(int)
+        note_tuple_seq = NoteTupleSeq()
+        note_tuple_seq.seq = [tuple(note_tuple) for note_tuple in note_tuples.tolist()]
 
-            ts_M, ts_m = time_shift2ticks(time_shift)
-            d_M, d_m = duration2ticks(duration)
-            note_tuple = (int(ts_M), int(ts_m), int(pitch), int(velocity), int(d_M), int(d_m))
-            note_tuple_seq.add_note(note_tuple)
-        
         return note_tuple_seq
 
 
@@ -236,19 +209,53 @@ class Converter:
 
 
     def midi2time_f0_loudness(self, midi_data, frame_rate = 16000, times_needed = None):
-        
+        """ Monophonic rasterization of the first instrument : each frame
+        gets the pitch and velocity of the last note started before it and
+        not yet ended (pitch 0 and loudness 0 when silent). Frames are the
+        piano roll columns pretty_midi would compute, without building the
+        128 x frames roll (pedal and pitch bends are ignored). """
+
         instrument_data = midi_data.instruments[0]
+        notes = sorted(instrument_data.notes, key = lambda note: note.start)
+        starts = np.array([note.start for note in notes])
+        ends = np.array([note.end for note in notes])
+        pitches = np.array([note.pitch for note in notes], dtype = np.int64)
+        velocities = np.array([note.velocity for note in notes], dtype = np.float64)
+
         if times_needed is None:
-            notes = instrument_data.get_piano_roll(frame_rate)
-            times = np.array([i/frame_rate for i in range(notes.shape[1])])
+            end_time = instrument_data.get_end_time()
+            columns = np.arange(int(frame_rate*end_time)) if notes else np.arange(0)
+            times = columns/frame_rate
+            fs = frame_rate
         else:
-            notes = instrument_data.get_piano_roll(times = times_needed)
+            # pretty_midi columns at 100 fps, the last time is left silent
             times = times_needed
-        
-        pitches, loudness = self.extract_f0_loudness(notes)
-        
+            fs = 100
+            columns = np.round(times*fs).astype(int)
+
+        pitch, loudness = self.rasterize_notes(starts, ends, pitches, velocities, columns, fs)
+        if times_needed is not None:
+            pitch[-1:], loudness[-1:] = 0, 0
+
+        return times, pitch, loudness
+
+    def rasterize_notes(self, starts, ends, pitches, velocities, columns, fs):
+        """ Input : notes sorted by start time, frame (column) indexes
+        Output : pitch and velocity of the note covering each frame """
+
+        note_starts = (starts*fs).astype(int)
+        note_ends = (ends*fs).astype(int)
+
+        idx = np.searchsorted(note_starts, columns, side = "right") - 1
+        active = idx >= 0
+        active[active] = columns[active] < note_ends[idx[active]]
+
+        pitch = np.zeros(columns.shape[0], dtype = np.int64)
+        loudness = np.zeros(columns.shape[0])
+        pitch[active] = pitches[idx[active]]
+        loudness[active] = velocities[idx[active]]
 
-        return times, pitches, loudness
+        return pitch, loudness
 
     def extract_f0_loudness(self, notes):
         pitches = np.argmax(notes, axis = 0)
@@ -9,7 +9,10 @@ from unet import UNet
 from unet_dataset import UNet_Dataset
 
 from random import randint
-import pickle
+import sys
+
+sys.path.insert(0, "results")
+from results_store import ResultsStore
 
 list_transforms = [
     (MinMaxScaler, {}),
@@ -33,16 +36,7 @@ model = UNet.load_from_checkpoint(
 
 #model.ddsp = torch.jit.load("ddsp_violin_pretrained.ts").eval()
 
-# Initialize data :
-
-u_f0 = np.empty(0)
-u_lo = np.empty(0)
-e_f0 = np.empty(0)
-e_lo = np.empty(0)
-pred_f0 = np.empty(0)
-pred_lo = np.empty(0)
-onsets = np.empty(0)
-offsets = np.empty(0)
+store = ResultsStore("results/store", mode="a")
 
 # Prediction loops :
 
@@ -57,31 +51,16 @@ for i in range(N_EXAMPLE):
     midi_f0, midi_lo = dataset.inverse_transform(midi)
     target_f0, target_lo = dataset.inverse_transform(target)
 
-    # # add to results:
-
-    # f0, lo = out.split(1, -1)
-    # midi_f0, midi_lo = midi.split(1, -1)
-    # target_f0, target_lo = target.split(1, -1)
-
-    u_f0 = np.concatenate((u_f0, midi_f0.squeeze()))
-    u_lo = np.concatenate((u_lo, midi_lo.squeeze()))
-
-    e_f0 = np.concatenate((e_f0, target_f0.squeeze()))
-    e_lo = np.concatenate((e_lo, target_lo.squeeze()))
-
-    pred_f0 = np.concatenate((pred_f0, f0.squeeze()))
-    pred_lo = np.concatenate((pred_lo, lo.squeeze()))
-
-out = {
-    "u_f0": u_f0,
-    "u_lo": u_lo,
-    "e_f0": e_f0,
-    "e_lo": e_lo,
-    "pred_f0": pred_f0,
-    "pred_lo": pred_lo,
-    "onsets": onsets,
-    "offsets": offsets
-}
-
-with open("results/unet-rnn/data/results.pickle", "wb") as file_out:
-    pickle.dump(out, file_out)
+    # add to results:
+
+    store.append("unet",
+                 i,
+                 replace=True,
+                 u_f0=midi_f0,
+                 u_lo=midi_lo,
+                 e_f0=target_f0,
+                 e_lo=target_lo,
+                 pred_f0=f0,
+                 pred_lo=lo,
+                 onsets=ons.numpy(),
+                 offsets=offs.numpy())
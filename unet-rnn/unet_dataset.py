@@ -6,34 +6,56 @@ import pytorch_lightning as pl
 import pickle
 import numpy as np
 from random import randint
+import sys
+
+sys.path.insert(0, "dataset")
+from samplers import OnsetSampler
+from tensor_cache import TensorCache
+from torch_transforms import from_sklearn
+from make_dataset import load_dataset
 
 
 class UNet_Dataset(Dataset):
+
+    # preprocessed tensors kept in the TensorCache
+    CACHED = [
+        "u_f0", "e_f0", "e_lo", "u_lo", "onsets", "offsets"
+    ]
+
     def __init__(self,
                  instrument,
                  data_augmentation=False,
                  n_sample=2048,
                  list_transforms=None,
-                 eval=False):
+                 eval=False,
+                 aligned=False):
+        """ With aligned, items are indexed by their start frame, as drawn
+        by the sampler of get_sampler. """
 
         da = "-da" if data_augmentation else ""
         type_set = "test" if eval else "train"
         path = "dataset/{}-{}{}.pickle".format(instrument[0], type_set, da)
 
         print("Loading Dataset...")
-        with open(path, "rb") as dataset:
-            dataset = pickle.load(dataset)
+        dataset = load_dataset(path)
 
         self.dataset = dataset
         self.N = len(dataset["u_f0"])
         self.n_sample = n_sample
         self.list_transforms = list_transforms
 
-        self.scalers = self.fit_transforms()
-        self.transform()
+        TensorCache(path, list_transforms,
+                    type(self)).load_or_build(self, self.preprocess,
+                                              self.CACHED)
+        self.transforms = [from_sklearn(sc) for sc in self.scalers]
         self.eval = eval
+        self.aligned = aligned
         print("Dataset loaded. Length : {}min".format(self.N // 6000))
 
+    def preprocess(self):
+        self.scalers = self.fit_transforms()
+        self.transform()
+
     def fit_transforms(self):
         scalers = []
 
@@ -85,16 +107,15 @@ class UNet_Dataset(Dataset):
         return out
 
     def inverse_transform(self, x):
+        """ Output : f0, lo numpy arrays """
 
         f0, lo = torch.split(x, 1, -1)
-        f0 = f0.reshape(-1, 1).cpu().numpy()
-        lo = lo.reshape(-1, 1).cpu().numpy()
 
-        # Inverse transforms
-        f0 = self.scalers[0].inverse_transform(f0).reshape(-1)
-        lo = self.scalers[1].inverse_transform(lo).reshape(-1)
+        # Inverse transforms, on the device of x
+        f0 = self.transforms[0].to(x.device).inverse_transform(f0)
+        lo = self.transforms[1].to(x.device).inverse_transform(lo)
 
-        return f0, lo
+        return f0.reshape(-1).cpu().numpy(), lo.reshape(-1).cpu().numpy()
 
     def get_quantized_loudness(self, e_l0, onsets, offsets):
         e = torch.abs(onsets + offsets)
@@ -112,18 +133,38 @@ class UNet_Dataset(Dataset):
                 e_l0[indexes[i]:indexes[i + 1]])
         return u_l0
 
+    def get_sampler(self, epoch_size=None, stratify=False, lead=0, seed=None):
+        """ Sampler of windows starting at note onsets, epoch_size windows
+        per epoch. With stratify, windows are drawn uniformly over the
+        pitch ranges. It yields start frames : the dataset must be
+        aligned. """
+        if not self.aligned:
+            raise ValueError("get_sampler needs a dataset built with "
+                             "aligned=True (items indexed by start frame)")
+        pitch = np.log2(np.maximum(self.dataset["u_f0"], 1e-5))
+        return OnsetSampler(self.dataset["onsets"],
+                            self.n_sample,
+                            epoch_size,
+                            pitch=pitch if stratify else None,
+                            lead=lead,
+                            seed=seed)
+
     def __len__(self):
         return self.N // self.n_sample
 
     def __getitem__(self, idx):
         N = self.n_sample
-        idx *= N
-
-        # add jitter during training only
-        if not self.eval:
-            idx += randint(0, N // 10)
-        idx = max(idx, 0)
-        idx = min(idx, len(self) * self.n_sample - self.n_sample)
+        if self.aligned:
+            # window start given by the sampler
+            idx = int(idx)
+        else:
+            idx *= N
+
+            # add jitter during training only
+            if not self.eval:
+                idx += randint(0, N // 10)
+            idx = max(idx, 0)
+            idx = min(idx, len(self) * self.n_sample - self.n_sample)
 
         s_u_f0 = self.u_f0[idx:idx + self.n_sample]
         s_u_lo = self.u_lo[idx:idx + self.n_sample]
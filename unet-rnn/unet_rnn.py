@@ -10,6 +10,9 @@ from unet_dataset import UNet_Dataset
 import matplotlib.pyplot as plt
 import os, sys
 
+sys.path.insert(0, "dataset")
+from torch_transforms import from_sklearn
+
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -107,6 +110,7 @@ class UNet_RNN(pl.LightningModule):
         self.up_channels_out = up_channels[1:]
 
         self.scalers = scalers
+        self.transforms = [from_sklearn(sc) for sc in scalers or []]
         self.ddsp = None
         self.val_idx = 0
 
@@ -182,14 +186,10 @@ class UNet_RNN(pl.LightningModule):
 
         f0, l0 = torch.split(out, 1, -1)
 
-        f0 = f0.reshape(-1, 1).cpu().numpy()
-        l0 = l0.reshape(-1, 1).cpu().numpy()
-
-        # Inverse transforms
-        f0 = self.scalers[0].inverse_transform(f0).reshape(-1)
-        l0 = self.scalers[1].inverse_transform(l0).reshape(-1)
-
-        return f0, l0
+        # Inverse transforms, on the device of out
+        f0 = self.transforms[0].to(out.device).inverse_transform(f0)
+        l0 = self.transforms[1].to(out.device).inverse_transform(l0)
+        return f0.reshape(-1), l0.reshape(-1)
 
     def validation_epoch_end(self, inputs):
 
@@ -208,18 +208,18 @@ class UNet_RNN(pl.LightningModule):
         midi_f0, midi_lo = self.post_process(model_input)
         target_f0, target_lo = self.post_process(target)
 
-        plt.plot(f0)
-        plt.plot(midi_f0)
-        plt.plot(target_f0)
+        plt.plot(f0.cpu())
+        plt.plot(midi_f0.cpu())
+        plt.plot(target_f0.cpu())
         self.logger.experiment.add_figure("pitch", plt.gcf(), self.val_idx)
-        plt.plot(lo)
-        plt.plot(midi_lo)
-        plt.plot(target_lo)
+        plt.plot(lo.cpu())
+        plt.plot(midi_lo.cpu())
+        plt.plot(target_lo.cpu())
         self.logger.experiment.add_figure("loudness", plt.gcf(), self.val_idx)
 
         if self.ddsp is not None:
-            f0 = torch.from_numpy(f0).float().reshape(1, -1, 1).to("cuda")
-            lo = torch.from_numpy(lo).float().reshape(1, -1, 1).to("cuda")
+            f0 = f0.float().reshape(1, -1, 1)
+            lo = lo.float().reshape(1, -1, 1)
             signal = self.ddsp(f0, lo)
             signal = signal.reshape(-1).cpu().numpy()
 